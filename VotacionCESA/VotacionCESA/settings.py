@@ -54,6 +54,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'votaciones.deadlines.deadline_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -175,6 +176,118 @@ BLOCKCHAIN_REGISTERED_ADDRESSES = [a.strip() for a in os.environ.get('BLOCKCHAIN
 # Sender credentials for on-chain txs (use env vars or a secure secret store)
 # ALGORAND_SENDER_MNEMONIC is the easiest for local testing; in production use a key vault
 ALGORAND_SENDER_MNEMONIC = os.environ.get('ALGORAND_SENDER_MNEMONIC', '')
+# Optional pool of sender accounts (comma-separated mnemonics). Each submission uses the
+# account with the fewest outstanding transactions; accounts whose balance drops below
+# ALGORAND_SENDER_MIN_BALANCE microAlgos (checked every ALGORAND_SENDER_BALANCE_INTERVAL
+# seconds) are skipped until they are funded again.
+ALGORAND_SENDER_MNEMONICS = [m.strip() for m in os.environ.get('ALGORAND_SENDER_MNEMONICS', '').split(',') if m.strip()]
+ALGORAND_SENDER_MIN_BALANCE = int(os.environ.get('ALGORAND_SENDER_MIN_BALANCE', '1000000'))
+ALGORAND_SENDER_BALANCE_INTERVAL = float(os.environ.get('ALGORAND_SENDER_BALANCE_INTERVAL', '60'))
+# Suggested params are cached per process and refreshed in the background after
+# ALGOD_PARAMS_REFRESH_ROUNDS rounds (estimated with ALGORAND_ROUND_SECONDS per round).
+ALGORAND_ROUND_SECONDS = float(os.environ.get('ALGORAND_ROUND_SECONDS', '3.3'))
+ALGOD_PARAMS_REFRESH_ROUNDS = int(os.environ.get('ALGOD_PARAMS_REFRESH_ROUNDS', '50'))
+# Algod/Indexer clients are shared per process and keep up to ALGOD_POOL_SIZE idle
+# keep-alive connections per endpoint; timeouts are per call, in seconds.
+ALGOD_POOL_SIZE = int(os.environ.get('ALGOD_POOL_SIZE', '10'))
+ALGOD_TIMEOUT = float(os.environ.get('ALGOD_TIMEOUT', '10'))
+INDEXER_TIMEOUT = float(os.environ.get('INDEXER_TIMEOUT', '10'))
+# Circuit breaker per algod/indexer endpoint: after CIRCUIT_BREAKER_FAILURES consecutive
+# failures calls fail fast for CIRCUIT_BREAKER_COOLDOWN seconds, then CIRCUIT_BREAKER_PROBES
+# probe calls decide whether it closes again.
+CIRCUIT_BREAKER_FAILURES = int(os.environ.get('CIRCUIT_BREAKER_FAILURES', '5'))
+CIRCUIT_BREAKER_COOLDOWN = float(os.environ.get('CIRCUIT_BREAKER_COOLDOWN', '30'))
+CIRCUIT_BREAKER_PROBES = int(os.environ.get('CIRCUIT_BREAKER_PROBES', '1'))
+# Total seconds a web request may spend in algod/indexer calls (login check, reads).
+CHAIN_CALL_BUDGET = float(os.environ.get('CHAIN_CALL_BUDGET', '5'))
+
+# Vote outbox: votes are committed locally and submitted on-chain by
+# `python manage.py process_vote_outbox`, retrying failures with exponential backoff.
+VOTE_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('VOTE_OUTBOX_MAX_ATTEMPTS', '8'))
+VOTE_OUTBOX_BACKOFF_BASE = float(os.environ.get('VOTE_OUTBOX_BACKOFF_BASE', '2'))
+VOTE_OUTBOX_BACKOFF_MAX = float(os.environ.get('VOTE_OUTBOX_BACKOFF_MAX', '300'))
+# Votes are submitted as Algorand atomic groups of up to VOTE_BATCH_SIZE (max 16)
+# transactions; the worker waits at most VOTE_BATCH_WINDOW seconds for a group to fill.
+VOTE_BATCH_SIZE = int(os.environ.get('VOTE_BATCH_SIZE', '16'))
+VOTE_BATCH_WINDOW = float(os.environ.get('VOTE_BATCH_WINDOW', '0.5'))
+# VOTE_ANCHOR_MODE: 'tx' sends one transaction per vote; 'merkle' anchors batches of
+# VOTE_MERKLE_BATCH_SIZE votes with a single transaction holding their Merkle root.
+VOTE_ANCHOR_MODE = os.environ.get('VOTE_ANCHOR_MODE', 'tx')
+VOTE_MERKLE_BATCH_SIZE = int(os.environ.get('VOTE_MERKLE_BATCH_SIZE', '256'))
+# api_vote responses are stored per Idempotency-Key for IDEMPOTENCY_KEY_TTL seconds;
+# a concurrent duplicate waits up to IDEMPOTENCY_WAIT_TIMEOUT seconds for the first request.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', str(24 * 3600)))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', '10'))
+# /api/async/vote/status/<receipt>/?wait=N holds the request (at most VOTE_STATUS_MAX_WAIT
+# seconds) until the vote leaves the outbox, checking every VOTE_STATUS_POLL_INTERVAL seconds.
+VOTE_STATUS_MAX_WAIT = float(os.environ.get('VOTE_STATUS_MAX_WAIT', '30'))
+VOTE_STATUS_POLL_INTERVAL = float(os.environ.get('VOTE_STATUS_POLL_INTERVAL', '0.5'))
+
+# Cache of the public results payloads (see votaciones/results_cache.py), shared by all
+# workers: a directory (default, RESULTS_CACHE_LOCATION, per project) or a DB table with
+# RESULTS_CACHE_BACKEND=db (create it once with `python manage.py createcachetable`).
+# Only the DB backend makes the rebuild lock atomic; with files it is best-effort.
+RESULTS_CACHE_ENABLED = bool(int(os.environ.get('RESULTS_CACHE_ENABLED', '1')))
+RESULTS_CACHE_BACKEND = os.environ.get('RESULTS_CACHE_BACKEND', 'file')
+RESULTS_CACHE_LOCATION = os.environ.get('RESULTS_CACHE_LOCATION') or str(BASE_DIR / 'cache' / 'results')
+# seconds an entry is fresh, then seconds it may still be served while it is rebuilt
+RESULTS_CACHE_TTL = float(os.environ.get('RESULTS_CACHE_TTL', '5'))
+RESULTS_CACHE_STALE = float(os.environ.get('RESULTS_CACHE_STALE', '60'))
+# results bodies of at least this many bytes are also kept gzipped for clients that accept it
+RESULTS_GZIP_MIN_BYTES = int(os.environ.get('RESULTS_GZIP_MIN_BYTES', '1024'))
+
+# Closed elections are served from frozen final results (votaciones/final_results.py); with
+# FINAL_RESULTS_AUTO_FREEZE the first read after end_date freezes them, otherwise only
+# `python manage.py close_elections` does.
+FINAL_RESULTS_AUTO_FREEZE = bool(int(os.environ.get('FINAL_RESULTS_AUTO_FREEZE', '1')))
+
+# `python manage.py export_results` writes static results pages of closed elections here
+RESULTS_EXPORT_ROOT = os.environ.get('RESULTS_EXPORT_ROOT') or os.path.join(BASE_DIR, 'export')
+
+# /api/blockchain/records/ pages: default size, and the largest `limit` a client may ask for
+BLOCKCHAIN_RECORDS_PAGE_SIZE = int(os.environ.get('BLOCKCHAIN_RECORDS_PAGE_SIZE', '200'))
+BLOCKCHAIN_RECORDS_MAX_PAGE_SIZE = int(os.environ.get('BLOCKCHAIN_RECORDS_MAX_PAGE_SIZE', '1000'))
+# seconds before `since` that a delta re-sends: records are stamped at insert but show at commit,
+# so one committed after a newer record must still reach clients. The outbox inserts them in the
+# short transaction that records a confirmation, so a few seconds cover it
+BLOCKCHAIN_RECORDS_SINCE_OVERLAP = float(os.environ.get('BLOCKCHAIN_RECORDS_SINCE_OVERLAP', '5'))
+
+# Live results (/api/results/stream/, see votaciones/live_results.py): each worker checks the
+# results version every LIVE_RESULTS_INTERVAL seconds; a client more than LIVE_RESULTS_BUFFER
+# events behind is dropped (its browser reconnects); idle streams get a heartbeat comment.
+LIVE_RESULTS_INTERVAL = float(os.environ.get('LIVE_RESULTS_INTERVAL', '0.5'))
+LIVE_RESULTS_BUFFER = int(os.environ.get('LIVE_RESULTS_BUFFER', '16'))
+LIVE_RESULTS_HEARTBEAT = float(os.environ.get('LIVE_RESULTS_HEARTBEAT', '15'))
+LIVE_RESULTS_RETRY = float(os.environ.get('LIVE_RESULTS_RETRY', '3'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'results': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'votaciones_results_cache',
+    } if RESULTS_CACHE_BACKEND == 'db' else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': RESULTS_CACHE_LOCATION,
+    },
+}
+
+# Admission control for api_vote (see votaciones/admission.py). State is shared by the
+# workers of one host through ADMISSION_STATE_FILE (default: a file under BASE_DIR/cache).
+ADMISSION_ENABLED = bool(int(os.environ.get('ADMISSION_ENABLED', '1')))
+ADMISSION_STATE_FILE = os.environ.get('ADMISSION_STATE_FILE') or str(BASE_DIR / 'cache' / 'admission.json')
+# token bucket: sustained votes/second and burst size (429 when empty)
+ADMISSION_RATE = float(os.environ.get('ADMISSION_RATE', '25'))
+ADMISSION_BURST = int(os.environ.get('ADMISSION_BURST', '50'))
+# tokens a worker takes from the shared bucket at a time (one state-file write per chunk)
+ADMISSION_TOKEN_CHUNK = int(os.environ.get('ADMISSION_TOKEN_CHUNK', '5'))
+# outbox backpressure (503 when exceeded): pending votes, and seconds the oldest due vote
+# has waited to be sent; read from the database at most every ADMISSION_BACKLOG_INTERVAL s
+ADMISSION_MAX_BACKLOG = int(os.environ.get('ADMISSION_MAX_BACKLOG', '5000'))
+ADMISSION_MAX_LAG = float(os.environ.get('ADMISSION_MAX_LAG', '60'))
+ADMISSION_BACKLOG_INTERVAL = float(os.environ.get('ADMISSION_BACKLOG_INTERVAL', '1'))
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', '1'))
 
 # Email settings placeholder (configure for real email delivery when needed)
 EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
@@ -19,18 +19,18 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
-from django.views.generic import TemplateView
 from votaciones import views as vot_views
+from votaciones import async_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    # Servir homepage en la raíz usando una TemplateView
-    path('', TemplateView.as_view(template_name='home.html'), name='home'),
+    # Servir homepage en la raíz; las páginas públicas llevan el estado inicial embebido
+    path('', vot_views.PublicPageView.as_view(template_name='home.html'), name='home'),
 
     # Página de resultados
-    path('resultados/', TemplateView.as_view(template_name='resultados.html'), name='resultados'),
+    path('resultados/', vot_views.PublicPageView.as_view(template_name='resultados.html'), name='resultados'),
     # Página del explorador de blockchain
-    path('blockchain/', TemplateView.as_view(template_name='blockchain.html'), name='blockchain'),
+    path('blockchain/', vot_views.PublicPageView.as_view(template_name='blockchain.html'), name='blockchain'),
 
     # Página de login
     # Página de login (usar vista estándar de Django)
@@ -43,11 +43,26 @@ urlpatterns = [
     # API endpoints (candidates + vote)
     path('api/candidates/', vot_views.api_candidates, name='api_candidates'),
     path('api/vote/', vot_views.api_vote, name='api_vote'),
+    path('api/ballot/', vot_views.api_ballot, name='api_ballot'),
+    path('api/vote/status/<uuid:receipt_id>/', vot_views.api_vote_status, name='api_vote_status'),
+    path('api/receipts/verify/', vot_views.api_verify_receipt, name='api_verify_receipt'),
     # Elections listing
     path('api/elections/', vot_views.api_elections, name='api_elections'),
     path('api/stats/', vot_views.api_stats, name='api_stats'),
+    # Initial state of the public pages in one request (also embedded in their HTML)
+    path('api/bootstrap/', vot_views.api_bootstrap, name='api_bootstrap'),
     # Blockchain records (used by blockchain explorer)
     path('api/blockchain/records/', vot_views.api_blockchain_records, name='api_blockchain_records'),
+    # Async (ASGI) tier of the public API, see votaciones/async_views.py
+    path('api/async/candidates/', async_views.api_candidates, name='async_api_candidates'),
+    path('api/async/vote/', async_views.api_vote, name='async_api_vote'),
+    path('api/async/vote/status/<uuid:receipt_id>/', async_views.api_vote_status, name='async_api_vote_status'),
+    path('api/async/elections/', async_views.api_elections, name='async_api_elections'),
+    path('api/async/stats/', async_views.api_stats, name='async_api_stats'),
+    path('api/async/blockchain/records/', async_views.api_blockchain_records, name='async_api_blockchain_records'),
+    path('api/results/stream/', async_views.api_results_stream, name='api_results_stream'),
+    # Process metrics (staff only)
+    path('api/metrics/', vot_views.api_metrics, name='api_metrics'),
     # Include app-level management pages under /manage/
     path('manage/', include('votaciones.urls')),
 ]
@@ -0,0 +1,110 @@
+"""Compare concurrent-request capacity of the WSGI API with the async (ASGI) tier.
+
+Both tiers are driven in-process against a throwaway test database:
+
+ - "wsgi" sends requests through Django's WSGI handler from a pool of
+   `--wsgi-threads` threads, i.e. the number of requests a gunicorn deployment
+   (workers x threads) can serve at the same time;
+ - "asgi" sends the same requests through the ASGI handler from one event loop.
+
+Two workloads are measured: `--clients` concurrent voters long-polling their
+vote status for `--wait` seconds (the vote is still in the outbox, so every
+request waits the full time, as it would while the worker waits on algod), and
+`--reads` concurrent reads of /candidates/ and /stats/.
+
+Usage (from the directory that contains manage.py):
+    python scripts/bench_asgi_vs_wsgi.py --clients 200 --wait 1 --wsgi-threads 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'VotacionCESA.settings')
+
+from django import setup
+setup()
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+from votaciones.models import Candidate, Election, Voter
+from votaciones.views import _record_vote
+
+
+def create_fixture(voters):
+    User = get_user_model()
+    now = timezone.now()
+    election = Election.objects.create(name='Bench', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+    candidates = [Candidate.objects.create(name=f'C{i}', election=election) for i in range(4)]
+    receipts = []
+    for i in range(voters):
+        voter = Voter.objects.create(user=User.objects.create_user(username=f'bench{i}'), control_number=f'B{i}')
+        receipts.append(str(_record_vote(voter, candidates[i % 4], election).receipt_id))
+    return receipts
+
+
+def run_wsgi(paths, threads):
+    def fetch(path):
+        return Client().get(path).status_code
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        statuses = list(pool.map(fetch, paths))
+    return time.perf_counter() - start, statuses
+
+
+def run_asgi(paths):
+    async def main():
+        client = AsyncClient()
+        return await asyncio.gather(*(client.get(path) for path in paths))
+    start = time.perf_counter()
+    responses = asyncio.run(main())
+    return time.perf_counter() - start, [r.status_code for r in responses]
+
+
+def report(label, paths, elapsed, statuses):
+    ok = sum(1 for s in statuses if s == 200)
+    print(f"{label:<22} requests={len(paths):>5}  ok={ok:>5}  {elapsed:7.2f} s  {len(paths) / elapsed:8.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=200, help='concurrent voters waiting on their vote status')
+    parser.add_argument('--wait', type=float, default=1.0, help='seconds each status request waits')
+    parser.add_argument('--reads', type=int, default=400, help='concurrent results reads')
+    parser.add_argument('--wsgi-threads', type=int, default=8, help='WSGI capacity (gunicorn workers x threads)')
+    args = parser.parse_args()
+
+    settings.VOTE_STATUS_MAX_WAIT = args.wait
+    settings.ALLOWED_HOSTS = ['*']
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        receipts = create_fixture(args.clients)
+
+        # the WSGI tier waits with the same async view, run to completion on its worker thread
+        waits = [f'/api/async/vote/status/{r}/?wait={args.wait}' for r in receipts]
+        elapsed, statuses = run_wsgi(waits, args.wsgi_threads)
+        report('wsgi  status wait', waits, elapsed, statuses)
+        elapsed, statuses = run_asgi(waits)
+        report('asgi  status wait', waits, elapsed, statuses)
+
+        reads = ['/api/candidates/', '/api/stats/'] * (args.reads // 2)
+        elapsed, statuses = run_wsgi(reads, args.wsgi_threads)
+        report('wsgi  results reads', reads, elapsed, statuses)
+        reads = [p.replace('/api/', '/api/async/') for p in reads]
+        elapsed, statuses = run_asgi(reads)
+        report('asgi  results reads', reads, elapsed, statuses)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
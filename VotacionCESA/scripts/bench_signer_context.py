@@ -0,0 +1,80 @@
+"""Measure the per-vote preparation cost removed by the cached SignerContext.
+
+"uncached" reproduces what `send_vote_tx` used to do before signing every vote:
+build a new AlgodClient, decode the sender mnemonic twice (key and address) and
+fetch suggested params over the network. "cached" uses one `SignerContext` for the whole run.
+Network latency of `suggested_params` is simulated with `--latency-ms`.
+
+Usage (from the directory that contains manage.py):
+    python scripts/bench_signer_context.py --votes 500 --latency-ms 20
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'VotacionCESA.settings')
+
+from django import setup
+setup()
+
+from algosdk import account, mnemonic, transaction
+from algosdk.v2client import algod
+from votaciones import algorand_integration as algointeg
+
+
+PARAMS = transaction.SuggestedParams(fee=1000, first=1, last=1001, gen='sandnet-v1',
+                                     gh='SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=', flat_fee=True)
+
+
+class FakeParamsClient(algod.AlgodClient):
+    """Real AlgodClient construction, simulated network latency for suggested_params."""
+
+    latency = 0.0
+
+    def suggested_params(self, **kwargs):
+        time.sleep(self.latency)
+        return PARAMS
+
+
+def uncached(votes, sender_mnemonic):
+    for i in range(votes):
+        client = FakeParamsClient('a' * 64, 'http://localhost:4001')
+        private_key = mnemonic.to_private_key(sender_mnemonic)
+        address = account.address_from_private_key(mnemonic.to_private_key(sender_mnemonic))
+        params = client.suggested_params()
+        transaction.PaymentTxn(address, params, address, 0, None, note=b'vote').sign(private_key)
+
+
+def cached(votes, sender_mnemonic):
+    private_key = mnemonic.to_private_key(sender_mnemonic)
+    ctx = algointeg.SignerContext(FakeParamsClient('a' * 64, 'http://localhost:4001'),
+                                  [(account.address_from_private_key(private_key), private_key)])
+    sender = ctx.accounts[0]
+    for i in range(votes):
+        ctx.payment(b'vote', sender).sign(sender.private_key)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--votes', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore', DeprecationWarning)
+    FakeParamsClient.latency = args.latency_ms / 1000.0
+    sender_mnemonic = mnemonic.from_private_key(account.generate_account()[0])
+
+    results = {}
+    for label, fn in (('uncached', uncached), ('cached', cached)):
+        start = time.perf_counter()
+        fn(args.votes, sender_mnemonic)
+        results[label] = (time.perf_counter() - start) / args.votes * 1000
+        print(f"{label:<10} {results[label]:8.3f} ms/vote")
+    print(f"removed    {results['uncached'] - results['cached']:8.3f} ms/vote")
+
+
+if __name__ == '__main__':
+    main()
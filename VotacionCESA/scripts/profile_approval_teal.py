@@ -0,0 +1,70 @@
+"""Profile approval.teal with the offline TEAL interpreter (no sandbox needed).
+
+Creates the app on an in-memory ledger, opts `--voters` accounts in and has each
+cast a vote, then reports the opcode cost of every call type, the most used
+opcodes, and how many simulated calls per second the interpreter sustains.
+
+Usage (from the directory that contains manage.py):
+    python scripts/profile_approval_teal.py --voters 5000
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'VotacionCESA.settings')
+
+from django import setup
+setup()
+
+from votaciones import teal
+from votaciones.teal import itob
+
+
+def address(i):
+    return base64.b32encode(i.to_bytes(36, 'big')).decode().rstrip('=')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--voters', type=int, default=5000)
+    parser.add_argument('--program', default=None, help='TEAL file (default: approval.teal)')
+    args = parser.parse_args()
+
+    program = teal.load_program(args.program)
+    now = int(time.time())
+    ledger = teal.Ledger(latest_timestamp=now)
+    creator = address(0)
+    period = [itob(now - 60), itob(now + 3600)]
+    create = ledger.call(program, creator, args=period + period)
+    app_id = create.app_id
+
+    costs = {'create': [create.cost], 'opt_in': [], 'vote': [], 'close_out': []}
+    opcodes = Counter()
+    start = time.perf_counter()
+    for i in range(1, args.voters + 1):
+        voter = address(i)
+        for name, result in (('opt_in', ledger.call(program, voter, app_id, teal.OPT_IN)),
+                             ('vote', ledger.call(program, voter, app_id, args=[b'vote', itob(i % 5)]))):
+            if not result.approved:
+                raise SystemExit(f'{name} rejected for voter {i}: {result.error}')
+            costs[name].append(result.cost)
+            opcodes.update(result.opcodes)
+    elapsed = time.perf_counter() - start
+    costs['close_out'].append(ledger.call(program, address(1), app_id, teal.CLOSE_OUT).cost)
+
+    print(f"{'call':<10} {'cost':>6}   (budget {teal.MAX_COST})")
+    for name, values in costs.items():
+        print(f'{name:<10} {max(values):>6}')
+    print('\nopcodes executed (opt-in + vote):')
+    for op, n in opcodes.most_common(10):
+        print(f'  {op:<16} {n:>9}')
+    calls = 2 * args.voters
+    print(f'\n{calls} calls in {elapsed:.2f} s: {calls / elapsed:,.0f} calls/s, {args.voters / elapsed:,.0f} votes/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -42,6 +42,12 @@ except ImportError:
     print("Instalar con: pip install py-algorand-sdk")
     sys.exit(1)
 
+try:
+    from votaciones.confirmation import wait_for_confirmation as shared_wait_for_confirmation
+except ImportError:
+    # ejecutado como script desde este mismo directorio
+    from confirmation import wait_for_confirmation as shared_wait_for_confirmation
+
 try:
     from dotenv import load_dotenv
     load_dotenv()
@@ -136,25 +142,15 @@ def compile_teal(filepath: str, client: algod.AlgodClient) -> bytes:
 
 
 def wait_for_confirmation(client: algod.AlgodClient, txid: str, timeout: int = 4):
-    """Espera confirmación de transacción."""
-    start_round = client.status()["last-round"] + 1
-    current_round = start_round
+    """Espera confirmación de transacción.
 
-    while current_round < start_round + timeout:
-        try:
-            pending_txn = client.pending_transaction_info(txid)
-        except Exception:
-            return None
-        
-        if pending_txn.get("confirmed-round", 0) > 0:
-            return pending_txn
-        elif pending_txn.get("pool-error"):
-            raise Exception(f'Pool error: {pending_txn["pool-error"]}')
-        
-        client.status_after_block(current_round)
-        current_round += 1
-    
-    raise Exception(f"Transacción no confirmada después de {timeout} rondas")
+    Usa el servicio de confirmación compartido, que revisa todas las transacciones
+    pendientes una vez por ronda siguiendo `status_after_block`.
+    """
+    try:
+        return shared_wait_for_confirmation(client, txid, timeout)
+    except TimeoutError:
+        raise Exception(f"Transacción no confirmada después de {timeout} rondas")
 
 
 def decode_state(state_array) -> Dict[str, Any]:
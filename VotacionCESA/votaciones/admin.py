@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Candidate, Voter, Vote, CandidateMember, Election, PDFReport
+from .models import Candidate, Voter, Vote, CandidateMember, Election, PDFReport, VoteOutbox, MerkleBatch, FinalResult
 from django.urls import path, reverse
 from django.shortcuts import render, redirect
 from django import forms
@@ -10,9 +10,15 @@ from .utils import import_voters_from_file
 
 @admin.register(Candidate)
 class CandidateAdmin(admin.ModelAdmin):
-    list_display = ('list_name', 'name', 'votes_count', 'election')
+    list_display = ('list_name', 'name', 'tally_votes', 'election')
     list_filter = ('election',)
     inlines = []
+    list_select_related = ('tally', 'election')
+
+    def tally_votes(self, obj):
+        tally = getattr(obj, 'tally', None)
+        return tally.votes if tally else 0
+    tally_votes.short_description = 'Votos'
 
 
 class CandidateMemberInline(admin.TabularInline):
@@ -118,3 +124,29 @@ class VoterAdmin(admin.ModelAdmin):
 @admin.register(Vote)
 class VoteAdmin(admin.ModelAdmin):
     list_display = ('voter', 'candidate', 'timestamp', 'hash_block', 'valid')
+
+
+@admin.register(VoteOutbox)
+class VoteOutboxAdmin(admin.ModelAdmin):
+    list_display = ('receipt_id', 'election', 'status', 'attempts', 'next_attempt_at', 'txid')
+    list_filter = ('status', 'election')
+    readonly_fields = ('receipt_id', 'vote', 'txid', 'attempts', 'last_error', 'created_at', 'updated_at')
+
+
+@admin.register(MerkleBatch)
+class MerkleBatchAdmin(admin.ModelAdmin):
+    list_display = ('root', 'election', 'leaf_count', 'txid', 'anchored_at')
+    list_filter = ('election',)
+    readonly_fields = ('root', 'election', 'leaf_count', 'txid', 'anchored_at')
+
+
+@admin.register(FinalResult)
+class FinalResultAdmin(admin.ModelAdmin):
+    list_display = ('election', 'total_votes', 'eligible_voters', 'record_count', 'frozen_at')
+
+    # immutable: frozen by `close_elections` or on the first read after the election ends
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
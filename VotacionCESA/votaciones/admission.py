@@ -0,0 +1,228 @@
+"""Admission control and backpressure for the vote path.
+
+`admit` wraps a view (sync or async) with two checks made before the view runs,
+so an overloaded algod or outbox turns into fast rejections instead of a
+pile-up that starves login and results:
+
+ - a token bucket of `ADMISSION_RATE` requests/second with bursts of
+   `ADMISSION_BURST`, shared by every worker process on the host through a
+   small JSON file guarded by `flock` (`ADMISSION_STATE_FILE`, by default
+   `cache/admission.json` under the project). Each process takes up to
+   `ADMISSION_TOKEN_CHUNK` tokens at a time and spends them in memory, so the
+   file is rewritten once per chunk rather than on every vote. An empty bucket
+   answers 429 with `Retry-After` set to the time until the next token;
+ - backpressure from the vote outbox: when more than `ADMISSION_MAX_BACKLOG`
+   votes are pending, or the oldest due entry has waited more than
+   `ADMISSION_MAX_LAG` seconds to be sent, the worker is not keeping up with
+   the chain and new votes get 503 with `Retry-After: ADMISSION_RETRY_AFTER`.
+   Each process reads the backlog from the database at most once every
+   `ADMISSION_BACKLOG_INTERVAL` seconds.
+
+The current state of this process (local tokens, shed counts, last backlog
+reading) is published as the `admission` metric.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: the bucket is shared by the threads of one process only
+    fcntl = None
+
+_thread_lock = threading.Lock()
+_local_lock = threading.Lock()
+# this process's share of the bucket, its counters and the last backlog reading
+_local = {
+    'tokens': 0,
+    'admitted': 0,
+    'shed_rate': 0,
+    'shed_backlog': 0,
+    'backlog': 0,
+    'lag': 0.0,
+    'backlog_read_at': None,
+}
+
+
+def _setting(name, default):
+    return type(default)(getattr(settings, name, default))
+
+
+def _state_path() -> str:
+    # per project, so two checkouts (or a test run) on one host never share limits
+    return getattr(settings, 'ADMISSION_STATE_FILE', None) or os.path.join(settings.BASE_DIR, 'cache', 'admission.json')
+
+
+def _initial_state() -> dict:
+    return {
+        'tokens': float(_setting('ADMISSION_BURST', 50)),
+        'refilled_at': time.time(),
+    }
+
+
+@contextmanager
+def _locked_state():
+    """Yield the shared state dict under an exclusive lock and write it back."""
+    path = _state_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _thread_lock, open(path, 'a+') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or '{}')
+            except ValueError:
+                state = {}
+            if 'tokens' not in state:
+                state = _initial_state()
+            yield state
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+            f.flush()
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _take_tokens(wanted: int):
+    """Move up to `wanted` whole tokens from the shared bucket; returns (granted, seconds to the next token)."""
+    rate = _setting('ADMISSION_RATE', 25.0)
+    burst = _setting('ADMISSION_BURST', 50)
+    now = time.time()
+    with _locked_state() as state:
+        state['tokens'] = min(float(burst), state['tokens'] + (now - state['refilled_at']) * rate)
+        state['refilled_at'] = now
+        granted = max(0, min(wanted, int(state['tokens'])))
+        state['tokens'] -= granted
+        retry_after = math.ceil((1 - state['tokens']) / rate) if rate > 0 else _setting('ADMISSION_RETRY_AFTER', 1)
+    return granted, retry_after
+
+
+def _read_backlog():
+    """Return (pending entries, seconds the oldest due entry has waited) from the outbox."""
+    from .models import VoteOutbox
+
+    now = timezone.now()
+    pending = VoteOutbox.objects.filter(status=VoteOutbox.STATUS_PENDING)
+    # counting stops just past the limit, so a huge backlog costs no more than a full one
+    depth = pending[:_setting('ADMISSION_MAX_BACKLOG', 5000) + 1].count()
+    oldest_due = (pending.filter(next_attempt_at__lte=now)
+                  .order_by('next_attempt_at')
+                  .values_list('next_attempt_at', flat=True)
+                  .first())
+    return depth, (now - oldest_due).total_seconds() if oldest_due else 0.0
+
+
+def _backlog_ok() -> bool:
+    interval = _setting('ADMISSION_BACKLOG_INTERVAL', 1.0)
+    now = time.monotonic()
+    with _local_lock:
+        stale = _local['backlog_read_at'] is None or now - _local['backlog_read_at'] >= interval
+        if stale:
+            # one reader per interval; the other threads use the previous reading meanwhile
+            _local['backlog_read_at'] = now
+    if stale:
+        depth, lag = _read_backlog()
+        with _local_lock:
+            _local['backlog'], _local['lag'] = depth, lag
+    with _local_lock:
+        return (_local['backlog'] <= _setting('ADMISSION_MAX_BACKLOG', 5000)
+                and _local['lag'] <= _setting('ADMISSION_MAX_LAG', 60.0))
+
+
+def _spend_local_token() -> bool:
+    with _local_lock:
+        if _local['tokens'] < 1:
+            return False
+        _local['tokens'] -= 1
+        _local['admitted'] += 1
+        return True
+
+
+def try_acquire():
+    """Try to admit one request. Returns None when admitted, or the 429/503 response to send back."""
+    if not _backlog_ok():
+        with _local_lock:
+            _local['shed_backlog'] += 1
+        return _shed(503, 'vote service busy, please retry', _setting('ADMISSION_RETRY_AFTER', 1))
+    if _spend_local_token():
+        return None
+
+    granted, retry_after = _take_tokens(_setting('ADMISSION_TOKEN_CHUNK', 5))
+    with _local_lock:
+        _local['tokens'] += granted
+    if _spend_local_token():
+        return None
+    with _local_lock:
+        _local['shed_rate'] += 1
+    return _shed(429, 'too many votes right now, please retry', retry_after)
+
+
+def _shed(status: int, message: str, retry_after: int):
+    response = JsonResponse({'error': message}, status=status)
+    response['Retry-After'] = str(max(1, int(retry_after)))
+    return response
+
+
+def _enabled() -> bool:
+    return bool(getattr(settings, 'ADMISSION_ENABLED', True))
+
+
+def admit(view_func):
+    """Shed requests over the shared rate limit or outbox backlog before running `view_func`."""
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if _enabled():
+                response = await sync_to_async(try_acquire)()
+                if response is not None:
+                    return response
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if _enabled():
+            response = try_acquire()
+            if response is not None:
+                return response
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def stats() -> dict:
+    with _local_lock:
+        return {
+            'tokens': round(_local['tokens'], 2),
+            'admitted': _local['admitted'],
+            'shed_rate': _local['shed_rate'],
+            'shed_backlog': _local['shed_backlog'],
+            'outbox_backlog': _local['backlog'],
+            'outbox_lag': round(_local['lag'], 2),
+        }
+
+
+def reset():
+    """Start over from the configured limits (tests, or after changing settings)."""
+    with _locked_state() as state:
+        state.clear()
+        state.update(_initial_state())
+    with _local_lock:
+        _local.update(tokens=0, admitted=0, shed_rate=0, shed_backlog=0, backlog=0, lag=0.0, backlog_read_at=None)
+
+
+metrics.register('admission', stats)
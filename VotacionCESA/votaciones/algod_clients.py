@@ -0,0 +1,258 @@
+"""Shared Algod/Indexer clients with a pooled keep-alive HTTP transport.
+
+`algosdk` opens a new connection (TCP and usually TLS handshake) for every
+request through `urllib`. The clients returned by `get_algod_client` and
+`get_indexer_client` are shared per process and per endpoint, and send their
+requests over a small pool of persistent `http.client` connections instead.
+
+Configuration (Django settings, all optional):
+ - ALGOD_POOL_SIZE: idle connections kept per endpoint (default 10)
+ - ALGOD_TIMEOUT: default per-call timeout in seconds for algod (default 10)
+ - INDEXER_TIMEOUT: default per-call timeout in seconds for the indexer (default 10)
+
+Each call goes through the circuit breaker of its endpoint (`circuit_breaker`)
+and its timeout is capped to the request's remaining chain-call budget
+(`deadlines`), so an unreachable node fails fast instead of timing out on every
+request.
+
+Connection counters (opened, requests, reused) are published through
+`votaciones.metrics` under ``algod_http``.
+"""
+from typing import Dict, Optional, Tuple
+from urllib import parse
+import http.client
+import json
+import threading
+
+from django.conf import settings
+
+try:
+    from algosdk import constants, error
+    from algosdk.v2client import algod, indexer
+    ALGOSDK_AVAILABLE = True
+except Exception:
+    ALGOSDK_AVAILABLE = False
+
+from . import circuit_breaker
+from . import deadlines
+from . import metrics
+
+API_VERSION_PREFIX = '/v2'
+
+# Errors raised when a kept-alive connection was closed by the server while idle.
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class ConnectionPool:
+    """A bounded LIFO pool of persistent HTTP(S) connections to one endpoint."""
+
+    def __init__(self, base_url: str, maxsize: int = 10):
+        parts = parse.urlsplit(base_url)
+        self.base_url = base_url
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.maxsize = maxsize
+        self._idle = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.requests = 0
+        self.reused = 0
+
+    def _new_connection(self, timeout: float):
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        with self._lock:
+            self.opened += 1
+        return cls(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, timeout: float):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            return self._new_connection(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str], timeout: float) -> Tuple[int, bytes]:
+        """Send one request and return (status, body), reusing an idle connection when possible."""
+        conn, reused = self._acquire(timeout)
+        with self._lock:
+            self.requests += 1
+            if reused:
+                self.reused += 1
+        try:
+            conn.request(method, self.base_path + path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except _STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            # the server dropped the idle connection before reading the request: retry once
+            conn = self._new_connection(timeout)
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return resp.status, data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'opened': self.opened, 'requests': self.requests, 'reused': self.reused, 'idle': len(self._idle)}
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_for(base_url: str) -> ConnectionPool:
+    with _pools_lock:
+        pool = _pools.get(base_url)
+        if pool is None:
+            pool = _pools[base_url] = ConnectionPool(base_url, int(getattr(settings, 'ALGOD_POOL_SIZE', 10)))
+        return pool
+
+
+def _send(base_url: str, method: str, path: str, body: Optional[bytes], headers: Dict[str, str], timeout: float) -> Tuple[int, bytes]:
+    """Send one request to `base_url` through its circuit breaker, within the deadline budget."""
+    timeout = deadlines.cap_timeout(timeout)
+    breaker = circuit_breaker.breaker_for(base_url)
+    breaker.before_call()
+    try:
+        status, data = _pool_for(base_url).request(method, path, body, headers, timeout)
+    except Exception:
+        breaker.record_failure()
+        raise
+    if status >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return status, data
+
+
+def _build_path(requrl: str, params) -> str:
+    if requrl not in constants.unversioned_paths:
+        requrl = API_VERSION_PREFIX + requrl
+    if params:
+        requrl = requrl + '?' + parse.urlencode(params)
+    return requrl
+
+
+if ALGOSDK_AVAILABLE:
+
+    class PooledAlgodClient(algod.AlgodClient):
+        """`AlgodClient` whose requests go through a shared `ConnectionPool`."""
+
+        def algod_request(self, method, requrl, params=None, data=None, headers=None,
+                          response_format='json', timeout=None):
+            header = {'User-Agent': 'py-algorand-sdk'}
+            if self.headers:
+                header.update(self.headers)
+            if headers:
+                header.update(headers)
+            if requrl not in constants.no_auth:
+                header.update({constants.algod_auth_header: self.algod_token})
+
+            if timeout is None:
+                timeout = float(getattr(settings, 'ALGOD_TIMEOUT', 10))
+            status, body = _send(self.algod_address, method, _build_path(requrl, params), data, header, timeout)
+
+            if status >= 400:
+                message, payload = body.decode('utf-8', 'replace'), {}
+                try:
+                    payload = json.loads(message)
+                    message = payload['message']
+                except Exception:
+                    pass
+                raise error.AlgodHTTPError(message, status, payload.get('data') if isinstance(payload, dict) else None)
+            if response_format != 'json':
+                return body
+            if not body:
+                # some algod responses are a 200 OK with an empty body
+                return {}
+            try:
+                return json.loads(body)
+            except Exception as e:
+                raise error.AlgodResponseError('Failed to parse JSON response from algod') from e
+
+    class PooledIndexerClient(indexer.IndexerClient):
+        """`IndexerClient` whose requests go through a shared `ConnectionPool`."""
+
+        def indexer_request(self, method, requrl, params=None, data=None, headers=None, timeout=None):
+            header = {'User-Agent': 'py-algorand-sdk'}
+            if self.headers:
+                header.update(self.headers)
+            if headers:
+                header.update(headers)
+            if requrl not in constants.no_auth and self.indexer_token:
+                header.update({constants.indexer_auth_header: self.indexer_token})
+
+            if timeout is None:
+                timeout = float(getattr(settings, 'INDEXER_TIMEOUT', 10))
+            status, body = _send(self.indexer_address, method, _build_path(requrl, params), data, header, timeout)
+
+            if status >= 400:
+                message = body.decode('utf-8', 'replace')
+                try:
+                    message = json.loads(message)['message']
+                except Exception:
+                    pass
+                raise error.IndexerHTTPError(message)
+            return json.loads(body.decode('utf-8'))
+
+
+_clients: Dict[tuple, object] = {}
+_clients_lock = threading.Lock()
+
+
+def _shared(kind: str, cls, token: str, address: str, headers: Optional[dict]):
+    key = (kind, address, token, tuple(sorted((headers or {}).items())))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = cls(token, address, headers=headers)
+        return client
+
+
+def get_algod_client(token: str, address: str, headers: Optional[dict] = None):
+    """Return the shared pooled Algod client for this endpoint (same arguments as `AlgodClient`)."""
+    if not ALGOSDK_AVAILABLE:
+        raise RuntimeError('algosdk is not installed')
+    return _shared('algod', PooledAlgodClient, token, address, headers)
+
+
+def get_indexer_client(token: str, address: str, headers: Optional[dict] = None):
+    """Return the shared pooled Indexer client for this endpoint (same arguments as `IndexerClient`)."""
+    if not ALGOSDK_AVAILABLE:
+        raise RuntimeError('algosdk is not installed')
+    return _shared('indexer', PooledIndexerClient, token, address, headers)
+
+
+def connection_stats() -> dict:
+    """Per-endpoint connection counters: opened, requests, reused, idle."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.base_url: pool.stats() for pool in pools}
+
+
+metrics.register('algod_http', connection_stats)
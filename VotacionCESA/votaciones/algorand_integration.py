@@ -8,26 +8,36 @@ Configuration expected via Django settings or environment variables:
  - ALGOD_TOKEN
  - ALGOD_HEADERS (optional)
  - ALGORAND_SENDER_MNEMONIC (or ALGORAND_SENDER_ADDRESS + ALGORAND_SENDER_PRIVATE_KEY)
+ - ALGORAND_SENDER_MNEMONICS (optional): pool of sender accounts used instead of the single one
+ - ALGORAND_SENDER_MIN_BALANCE / ALGORAND_SENDER_BALANCE_INTERVAL (optional): balance monitoring
 
 Note: this file deliberately keeps operations simple and synchronous. For production
 you'll want proper key management, secure storage, retries and asynchronous handling.
 """
-from typing import Optional
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 import base64
 import os
-import json
-import time
+import logging
 import secrets
+import threading
+import time
 
 try:
     from algosdk.v2client import algod
-    from algosdk import account, transaction
+    from algosdk import account, encoding, transaction
     from algosdk import mnemonic as algo_mnemonic
     ALGOSDK_AVAILABLE = True
 except Exception:
     ALGOSDK_AVAILABLE = False
 
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import algod_clients, confirmation, metrics, vote_notes
+
+logger = logging.getLogger(__name__)
 
 
 def _simulate_send(note_bytes: bytes) -> str:
@@ -35,65 +45,403 @@ def _simulate_send(note_bytes: bytes) -> str:
     return base64.b32encode(pseudo_bytes).decode('ascii').rstrip('=').upper()
 
 
-def send_vote_tx(election_id: int, candidate_id: int, note: Optional[bytes] = None, wait_for_confirmation: bool = True) -> str:
-    """Envía una representación de voto a Algorand y devuelve el txid.
+# Algorand rejects atomic groups larger than this.
+MAX_GROUP_SIZE = 16
+
+# Called by the send functions with (txids, signed_txns) once the transactions are
+# signed and before they are broadcast; `signed_txns` is the base64 `resend_signed`
+# takes ('' when simulated). If it raises, nothing is sent.
+OnSigned = Callable[[List[str], str], None]
+
+_rng = secrets.SystemRandom()
 
-    la transacción no debe incluir información que identifique al votante.
-    """
-    note = note or json.dumps({'election_id': election_id, 'candidate_id': candidate_id}).encode('utf-8')
 
-    # If algosdk isn't installed or settings not provided, simulate
+def _vote_note(election_id: Optional[int], candidate_id: int) -> bytes:
+    return vote_notes.encode_vote(election_id, candidate_id)
+
+
+def _get_algod_client() -> Optional['algod.AlgodClient']:
+    """Return an Algod client, or None when algosdk or its settings are missing."""
     if not ALGOSDK_AVAILABLE:
-        return _simulate_send(note)
+        return None
 
     algod_address = getattr(settings, 'ALGOD_ADDRESS', os.environ.get('ALGOD_ADDRESS'))
     algod_token = getattr(settings, 'ALGOD_TOKEN', os.environ.get('ALGOD_TOKEN'))
     algod_headers = getattr(settings, 'ALGOD_HEADERS', None)
 
     if not algod_address or not algod_token:
-        # missing config — simulate
-        return _simulate_send(note)
+        return None
+
+    return algod_clients.get_algod_client(algod_token, algod_address, algod_headers)
 
-    client = algod.AlgodClient(algod_token, algod_address, headers=algod_headers)
 
+def _get_sender_credentials() -> List[Tuple[str, str]]:
+    """Return the (address, private_key) pairs of the vote sender accounts.
+
+    `ALGORAND_SENDER_MNEMONICS` (a list, or a comma-separated string) configures a
+    pool of senders; otherwise the single `ALGORAND_SENDER_MNEMONIC` account is used.
+    """
     # Sender credentials (mnemonic) — prefer settings, then env
-    sender_mnemonic = getattr(settings, 'ALGORAND_SENDER_MNEMONIC', os.environ.get('ALGORAND_SENDER_MNEMONIC'))
-    if sender_mnemonic:
-        sender_private_key = algo_mnemonic.to_private_key(sender_mnemonic)
-        sender_address = algo_mnemonic.to_public_key(sender_mnemonic)
-    else:
-        # allow explicit key pair via env (not recommended)
-        sender_address = os.environ.get('ALGORAND_SENDER_ADDRESS')
-        sender_private_key = os.environ.get('ALGORAND_SENDER_PRIVATE_KEY')
+    mnemonics = getattr(settings, 'ALGORAND_SENDER_MNEMONICS', os.environ.get('ALGORAND_SENDER_MNEMONICS'))
+    if isinstance(mnemonics, str):
+        mnemonics = [m.strip() for m in mnemonics.split(',')]
+    mnemonics = [m for m in (mnemonics or []) if m]
+    if not mnemonics:
+        sender_mnemonic = getattr(settings, 'ALGORAND_SENDER_MNEMONIC', os.environ.get('ALGORAND_SENDER_MNEMONIC'))
+        if sender_mnemonic:
+            mnemonics = [sender_mnemonic]
+    if mnemonics:
+        credentials = []
+        for sender_mnemonic in mnemonics:
+            private_key = algo_mnemonic.to_private_key(sender_mnemonic)
+            credentials.append((account.address_from_private_key(private_key), private_key))
+        return credentials
+    # allow explicit key pair via env (not recommended)
+    address, private_key = os.environ.get('ALGORAND_SENDER_ADDRESS'), os.environ.get('ALGORAND_SENDER_PRIVATE_KEY')
+    return [(address, private_key)] if address and private_key else []
 
-    if not sender_address or not sender_private_key:
-        # No credentials available — simulate
-        return _simulate_send(note)
 
-    # Build a minimal payment transaction with zero value and note payload
-    params = client.suggested_params()
-    unsigned_txn = transaction.PaymentTxn(sender_address, params, sender_address, 0, None, note=note)
-    signed_txn = unsigned_txn.sign(sender_private_key)
+class SenderAccount:
+    """One sender of the pool with its in-flight count, counters and last known balance."""
 
-    txid = client.send_transaction(signed_txn)
+    def __init__(self, address: str, private_key: str):
+        self.address = address
+        self.private_key = private_key
+        self.outstanding = 0
+        self.submitted = 0
+        self.failed = 0
+        self.balance: Optional[int] = None
+        self.active = True
 
-    if wait_for_confirmation:
-        _wait_for_confirmation(client, txid)
+    def stats(self) -> dict:
+        return {'outstanding': self.outstanding, 'submitted': self.submitted, 'failed': self.failed,
+                'balance': self.balance, 'active': self.active}
 
-    return txid
 
+class SignerContext:
+    """Per-process signing state: one Algod client, the decoded sender keys and cached params.
+
+    Senders are handed out by `sender()`, which picks the active account with the
+    fewest outstanding (sent, not yet confirmed) transactions. A background thread
+    reads every account's balance each `ALGORAND_SENDER_BALANCE_INTERVAL` seconds and
+    deactivates the accounts below `ALGORAND_SENDER_MIN_BALANCE` microAlgos until
+    they are funded again.
+
+    Suggested params are reused across transactions. Their age is tracked in rounds
+    (estimated from `ALGORAND_ROUND_SECONDS`): after `ALGOD_PARAMS_REFRESH_ROUNDS`
+    they are refreshed in a background thread, and if they ever get within
+    `PARAMS_EXPIRY_MARGIN` rounds of their `last` valid round they are refreshed
+    synchronously before use, so a signed transaction is never already expired.
+    """
+    PARAMS_EXPIRY_MARGIN = 10
 
-def _wait_for_confirmation(client: 'algod.AlgodClient', txid: str, timeout: int = 10):
-    """Wait for a transaction to be confirmed. Raises on timeout."""
-    start = time.time()
-    while True:
+    def __init__(self, client: 'algod.AlgodClient', senders: Sequence[Tuple[str, str]]):
+        if not senders:
+            raise ValueError('at least one sender account is required')
+        self.client = client
+        self.accounts = [SenderAccount(address, private_key) for address, private_key in senders]
+        self._params = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._monitor: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    def _rounds_elapsed(self) -> float:
+        round_seconds = float(getattr(settings, 'ALGORAND_ROUND_SECONDS', 3.3))
+        return (time.monotonic() - self._fetched_at) / round_seconds
+
+    def _refresh(self):
+        params = self.client.suggested_params()
+        with self._lock:
+            self._params = params
+            self._fetched_at = time.monotonic()
+
+    def _refresh_in_background(self):
         try:
-            pending = client.pending_transaction_info(txid)
-            if pending.get('confirmed-round', 0) > 0:
-                return pending
+            self._refresh()
         except Exception:
-            # continue trying until timeout
+            # keep serving the cached params; the next call will retry
             pass
-        if time.time() - start > timeout:
-            raise TimeoutError(f"tx {txid} not confirmed after {timeout}s")
-        time.sleep(1)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def suggested_params(self):
+        with self._lock:
+            params = self._params
+            elapsed = self._rounds_elapsed() if params is not None else 0
+        if params is None or params.first + elapsed >= params.last - self.PARAMS_EXPIRY_MARGIN:
+            self._refresh()
+            return self._params
+        if elapsed >= int(getattr(settings, 'ALGOD_PARAMS_REFRESH_ROUNDS', 50)):
+            with self._lock:
+                start = not self._refreshing
+                self._refreshing = True
+            if start:
+                threading.Thread(target=self._refresh_in_background, name='algod-params-refresh', daemon=True).start()
+        return params
+
+    @contextmanager
+    def sender(self, txn_count: int = 1) -> Iterator[SenderAccount]:
+        """Reserve the least busy active account for `txn_count` transactions.
+
+        The transactions count as outstanding for that account until the block
+        exits, so callers should send and wait for confirmation inside it.
+        """
+        self._ensure_monitor()
+        with self._lock:
+            candidates = [a for a in self.accounts if a.active]
+            if not candidates:
+                raise RuntimeError('no Algorand sender account has a balance above ALGORAND_SENDER_MIN_BALANCE')
+            chosen = min(candidates, key=lambda a: a.outstanding)
+            chosen.outstanding += txn_count
+        try:
+            yield chosen
+        except Exception:
+            with self._lock:
+                chosen.failed += txn_count
+            raise
+        else:
+            with self._lock:
+                chosen.submitted += txn_count
+        finally:
+            with self._lock:
+                chosen.outstanding -= txn_count
+
+    def payment(self, note: bytes, sender: SenderAccount):
+        """Build an unsigned zero-value self-payment from `sender` carrying `note`."""
+        return transaction.PaymentTxn(sender.address, self.suggested_params(), sender.address, 0, None, note=note)
+
+    def check_balances(self):
+        """Read every sender's balance and (de)activate it against the minimum."""
+        min_balance = int(getattr(settings, 'ALGORAND_SENDER_MIN_BALANCE', 1_000_000))
+        for sender in self.accounts:
+            try:
+                balance = int(self.client.account_info(sender.address).get('amount', 0))
+            except Exception as e:
+                logger.warning('could not read the balance of sender %s: %s', sender.address, e)
+                continue
+            active = balance >= min_balance
+            with self._lock:
+                if sender.active and not active:
+                    logger.warning('sender %s balance %s below minimum %s: disabled', sender.address, balance, min_balance)
+                sender.balance = balance
+                sender.active = active
+
+    def _ensure_monitor(self):
+        if self._monitor is not None:
+            return
+        with self._lock:
+            if self._monitor is not None:
+                return
+            self._monitor = threading.Thread(target=self._monitor_balances, name='algod-sender-balances', daemon=True)
+        self._monitor.start()
+
+    def _monitor_balances(self):
+        while not self._closed.is_set():
+            self.check_balances()
+            self._closed.wait(float(getattr(settings, 'ALGORAND_SENDER_BALANCE_INTERVAL', 60)))
+
+    def close(self):
+        """Stop the balance monitor."""
+        self._closed.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {sender.address: sender.stats() for sender in self.accounts}
+
+
+_signer_context: Optional[SignerContext] = None
+_signer_lock = threading.Lock()
+
+
+def get_signer_context() -> Optional[SignerContext]:
+    """Return the process-wide signer context, building it on first use.
+
+    Returns None (and callers simulate) when algosdk, the Algod settings or the
+    sender credentials are missing.
+    """
+    global _signer_context
+    with _signer_lock:
+        if _signer_context is None:
+            client = _get_algod_client()
+            if client is None:
+                return None
+            senders = _get_sender_credentials()
+            if not senders:
+                return None
+            _signer_context = SignerContext(client, senders)
+        return _signer_context
+
+
+def reset_signer_context():
+    """Drop the cached signer context (e.g. after the Algorand settings changed)."""
+    global _signer_context
+    with _signer_lock:
+        if _signer_context is not None:
+            _signer_context.close()
+        _signer_context = None
+
+
+def sender_stats() -> dict:
+    """Per-sender counters of the current signer context (empty when not built yet)."""
+    ctx = _signer_context
+    return ctx.stats() if ctx is not None else {}
+
+
+metrics.register('algorand_senders', sender_stats)
+
+
+@receiver(setting_changed)
+def _on_setting_changed(setting, **kwargs):
+    if setting.startswith(('ALGOD_', 'ALGORAND_SENDER_')):
+        reset_signer_context()
+
+
+def _encode_signed(signed: Sequence) -> str:
+    """Base64 of the signed transactions, as `send_raw_transaction` takes them back."""
+    return base64.b64encode(b''.join(base64.b64decode(encoding.msgpack_encode(stx)) for stx in signed)).decode('ascii')
+
+
+def send_vote_tx(election_id: int, candidate_id: int, note: Optional[bytes] = None, wait_for_confirmation: bool = True,
+                 on_signed: Optional[OnSigned] = None) -> str:
+    """Envía una representación de voto a Algorand y devuelve el txid.
+
+    la transacción no debe incluir información que identifique al votante.
+    `on_signed(txids, signed_txns)` se llama antes de difundirla (ver `OnSigned`).
+    """
+    note = note or _vote_note(election_id, candidate_id)
+
+    # If algosdk isn't installed, settings or credentials not provided, simulate
+    ctx = get_signer_context()
+    if ctx is None:
+        txid = _simulate_send(note)
+        if on_signed:
+            on_signed([txid], '')
+        return txid
+
+    with ctx.sender() as sender:
+        # Build a minimal payment transaction with zero value and note payload
+        signed_txn = ctx.payment(note, sender).sign(sender.private_key)
+        txid = signed_txn.get_txid()
+        if on_signed:
+            on_signed([txid], _encode_signed([signed_txn]))
+
+        ctx.client.send_transaction(signed_txn)
+
+        if wait_for_confirmation:
+            _wait_for_confirmation(ctx.client, txid)
+
+    return txid
+
+
+def send_vote_group(votes: Sequence[Tuple[int, int]], wait_for_confirmation: bool = True,
+                    on_signed: Optional[OnSigned] = None) -> List[str]:
+    """Envía varios votos como un único grupo atómico y devuelve un txid por voto.
+
+    `votes` es una secuencia de pares (election_id, candidate_id) de como máximo
+    `MAX_GROUP_SIZE` elementos. El orden dentro del grupo se baraja para que no
+    refleje el orden de llegada; la lista devuelta sigue el orden de `votes`.
+    Todo el grupo paga una sola ida y vuelta de envío y se confirma en la misma ronda.
+    """
+    if not votes:
+        return []
+    if len(votes) > MAX_GROUP_SIZE:
+        raise ValueError(f'atomic groups hold at most {MAX_GROUP_SIZE} transactions, got {len(votes)}')
+
+    notes = [_vote_note(election_id, candidate_id) for election_id, candidate_id in votes]
+
+    ctx = get_signer_context()
+    if ctx is None:
+        txids = [_simulate_send(note) for note in notes]
+        if on_signed:
+            on_signed(txids, '')
+        return txids
+
+    order = list(range(len(notes)))
+    _rng.shuffle(order)
+
+    with ctx.sender(len(notes)) as sender:
+        txns = [ctx.payment(notes[i], sender) for i in order]
+        if len(txns) > 1:
+            transaction.assign_group_id(txns)
+        signed = [txn.sign(sender.private_key) for txn in txns]
+        group_txids = [txn.get_txid() for txn in txns]
+        if on_signed:
+            on_signed([group_txids[order.index(i)] for i in range(len(votes))], _encode_signed(signed))
+
+        ctx.client.send_transactions(signed)
+
+        if wait_for_confirmation:
+            # every transaction of a group is confirmed in the same round
+            _wait_for_confirmation(ctx.client, group_txids[0])
+
+    txids = [None] * len(votes)
+    for position, index in enumerate(order):
+        txids[index] = group_txids[position]
+    return txids
+
+
+def send_anchor_tx(election_id: int, merkle_root: str, counts: Dict[int, int], wait_for_confirmation: bool = True,
+                   on_signed: Optional[OnSigned] = None) -> str:
+    """Ancla la raíz Merkle de un lote de votos con una sola transacción y devuelve el txid.
+
+    La nota incluye el conteo por candidato del lote para que los lectores del
+    indexer puedan sumar resultados sin conocer cada voto individual.
+    """
+    note = vote_notes.encode_anchor(election_id, merkle_root, counts)
+    return send_vote_tx(election_id, None, note=note, wait_for_confirmation=wait_for_confirmation, on_signed=on_signed)
+
+
+RESENT = 'sent'
+IN_LEDGER = 'in_ledger'
+EXPIRED = 'expired'
+
+
+def resend_signed(signed_txns: str) -> str:
+    """Re-send transactions signed earlier (the `signed_txns` given to `on_signed`).
+
+    Re-sending the same bytes is idempotent on chain, so a send whose outcome is
+    unknown (a confirmation timeout, a dropped connection) is retried this way
+    instead of building a new transaction that would count the vote twice.
+    Returns `RESENT` (accepted, or already in the pool), `IN_LEDGER` (already
+    confirmed) or `EXPIRED` (past its last valid round and never confirmed, or
+    never sent for real: build a new one). Other errors propagate.
+    """
+    ctx = get_signer_context()
+    if not signed_txns or ctx is None:
+        return EXPIRED
+    try:
+        ctx.client.send_raw_transaction(signed_txns)
+    except Exception as e:
+        message = str(e).lower()
+        if 'already in ledger' in message:
+            return IN_LEDGER
+        if 'already in pool' in message:
+            return RESENT
+        if 'txn dead' in message:
+            return EXPIRED
+        raise
+    return RESENT
+
+
+def wait_for_confirmations(txids: Sequence[str]) -> Dict[str, Exception]:
+    """Wait for transactions that are all already broadcast; returns the error of each one that failed.
+
+    All of them go to the shared confirmation service at once, so this takes
+    about as long as the slowest one.
+    """
+    ctx = get_signer_context()
+    if ctx is None or not txids:
+        return {}
+    return confirmation.wait_for_confirmations(ctx.client, txids)
+
+
+def _wait_for_confirmation(client: 'algod.AlgodClient', txid: str, timeout_rounds: Optional[int] = None):
+    """Wait for a transaction to be confirmed. Raises on timeout.
+
+    The wait is delegated to the process-wide `confirmation` service, which checks
+    all outstanding txids once per round instead of one sleep loop per caller.
+    """
+    return confirmation.wait_for_confirmation(client, txid, timeout_rounds)
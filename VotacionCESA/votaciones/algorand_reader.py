@@ -1,7 +1,7 @@
 """Reader utilities to fetch on-chain vote counts from Algorand Indexer.
 
 This module attempts to use an Algorand Indexer (if configured) to retrieve
-transactions that contain vote notes (the same format used when sending votes).
+transactions that contain vote notes (see `vote_notes` for the format).
 If the indexer is not configured or unavailable, functions return None so callers
 can fallback to local `OnChainRecord` data.
 
@@ -9,8 +9,8 @@ Notes:
 - Expects INDEXER_ADDRESS and INDEXER_TOKEN in Django settings or environment.
 """
 from typing import Optional, Dict
+import base64
 import os
-import json
 
 try:
     from algosdk.v2client import indexer
@@ -19,21 +19,50 @@ except Exception:
     ALGOSDK_INDEXER = False
 
 from django.conf import settings
+from . import algod_clients, vote_notes
 from .models import Candidate, Election
 
+# Transactions requested per indexer page.
+PAGE_SIZE = 1000
+
 
 def _decode_note(note_b64: str) -> Optional[dict]:
     try:
-        import base64
-        b = base64.b64decode(note_b64)
-        return json.loads(b.decode('utf-8'))
+        return vote_notes.decode(base64.b64decode(note_b64))
     except Exception:
         return None
 
 
+def _add_counts(counts: Dict[int, int], client, note_prefix: bytes, election_id: int):
+    """Add the votes of every transaction whose note starts with `note_prefix`."""
+    next_page = None
+    while True:
+        response = client.search_transactions(limit=PAGE_SIZE, next_page=next_page, note_prefix=note_prefix)
+        for tx in response.get('transactions', []):
+            note_b64 = tx.get('note')
+            if not note_b64:
+                continue
+            decoded = _decode_note(note_b64)
+            if not decoded or decoded.get('election_id') != election_id:
+                continue
+            if 'merkle_root' in decoded:
+                # Merkle anchor: one transaction carries the counts of a whole batch
+                for cid, n in decoded['counts'].items():
+                    counts[cid] = counts.get(cid, 0) + n
+                continue
+            cid = decoded.get('candidate_id')
+            if cid:
+                counts[cid] = counts.get(cid, 0) + 1
+        next_page = response.get('next-token')
+        if not next_page or not response.get('transactions'):
+            return
+
+
 def get_counts_from_indexer(election_id: int) -> Optional[Dict[int, int]]:
     """Return a mapping candidate_id -> count for a given election from the indexer.
 
+    Only the election's notes are fetched: the indexer filters them by note
+    prefix (binary notes, then the JSON notes written by earlier versions).
     Returns None if indexer not configured or an error occurs.
     """
     if not ALGOSDK_INDEXER:
@@ -45,24 +74,10 @@ def get_counts_from_indexer(election_id: int) -> Optional[Dict[int, int]]:
         return None
 
     try:
-        client = indexer.IndexerClient(indexer_token, indexer_address)
-        # Basic approach: search transactions with note-prefix that include the election_id
-        # Note: this is a heuristic and depends on how notes were encoded.
-        # We perform a transactions search and decode notes that parse as JSON.
-        response = client.search_transactions(limit=1000)
+        client = algod_clients.get_indexer_client(indexer_token, indexer_address)
         counts = {}
-        txs = response.get('transactions', [])
-        for tx in txs:
-            note_b64 = tx.get('note')
-            if not note_b64:
-                continue
-            decoded = _decode_note(note_b64)
-            if not decoded:
-                continue
-            if decoded.get('election_id') == election_id:
-                cid = decoded.get('candidate_id')
-                if cid:
-                    counts[cid] = counts.get(cid, 0) + 1
+        _add_counts(counts, client, vote_notes.election_prefix(election_id), election_id)
+        _add_counts(counts, client, vote_notes.legacy_prefix(election_id), election_id)
         return counts
     except Exception:
         return None
@@ -28,6 +28,8 @@ except Exception:
 
 from django.conf import settings
 
+from . import algod_clients, confirmation, teal
+
 
 def _get_algod_client():
     """Get configured Algod client or None if not available."""
@@ -41,22 +43,18 @@ def _get_algod_client():
     if not algod_address or not algod_token:
         return None
     
-    return algod.AlgodClient(algod_token, algod_address, headers=algod_headers)
+    return algod_clients.get_algod_client(algod_token, algod_address, algod_headers)
 
 
-def _wait_for_confirmation(client: 'algod.AlgodClient', txid: str, timeout: int = 10):
-    """Wait for a transaction to be confirmed."""
-    start = time.time()
-    while True:
-        try:
-            pending = client.pending_transaction_info(txid)
-            if pending.get('confirmed-round', 0) > 0:
-                return pending
-        except Exception:
-            pass
-        if time.time() - start > timeout:
-            raise TimeoutError(f"tx {txid} not confirmed after {timeout}s")
-        time.sleep(1)
+def _wait_for_confirmation(client: 'algod.AlgodClient', txid: str, timeout_rounds: Optional[int] = None):
+    """Wait for a transaction to be confirmed (shared per-round confirmation service)."""
+    return confirmation.wait_for_confirmation(client, txid, timeout_rounds)
+
+
+def _account_from_mnemonic(phrase: str):
+    """Return (private_key, address) for a 25-word mnemonic."""
+    private_key = algo_mnemonic.to_private_key(phrase)
+    return private_key, account.address_from_private_key(private_key)
 
 
 def compile_program(client, source_code):
@@ -95,8 +93,7 @@ def create_voting_app(
         return None
     
     # Get creator credentials
-    creator_private_key = algo_mnemonic.to_private_key(creator_mnemonic)
-    creator_address = algo_mnemonic.to_public_key(creator_mnemonic)
+    creator_private_key, creator_address = _account_from_mnemonic(creator_mnemonic)
     
     # Read and compile TEAL programs
     with open(approval_teal_path, "r") as f:
@@ -168,8 +165,7 @@ def voter_optin(voter_mnemonic: str, app_id: int) -> Optional[str]:
         return None
     
     # Get voter credentials
-    voter_private_key = algo_mnemonic.to_private_key(voter_mnemonic)
-    voter_address = algo_mnemonic.to_public_key(voter_mnemonic)
+    voter_private_key, voter_address = _account_from_mnemonic(voter_mnemonic)
     
     # Get suggested params
     params = client.suggested_params()
@@ -192,6 +188,32 @@ def voter_optin(voter_mnemonic: str, app_id: int) -> Optional[str]:
     return txid
 
 
+def check_vote_locally(client, voter_address: str, app_id: int, candidate_id: int) -> Optional['teal.Result']:
+    """Run the vote call through the offline TEAL interpreter against the app's current state.
+
+    Returns the interpreter result, or None when the state or the program could
+    not be loaded (the check is then skipped). `LatestTimestamp` is approximated
+    with the local clock.
+    """
+    try:
+        program = teal.load_program()
+        app = client.application_info(app_id)
+        global_state = teal.state_from_api(app.get('params', {}).get('global-state'))
+        try:
+            local = client.account_application_info(voter_address, app_id).get('app-local-state')
+        except Exception:
+            local = None  # not opted in
+    except Exception as e:
+        print(f"Local vote check skipped: {e}")
+        return None
+
+    ledger = teal.Ledger(latest_timestamp=int(time.time()))
+    ledger.globals[app_id] = global_state
+    if local is not None:
+        ledger.locals[(voter_address, app_id)] = teal.state_from_api(local.get('key-value'))
+    return ledger.call(program, voter_address, app_id, teal.NO_OP, ['vote'.encode('utf-8'), candidate_id.to_bytes(8, 'big')])
+
+
 def submit_vote(voter_mnemonic: str, app_id: int, candidate_id: int) -> Optional[str]:
     """
     Submit a vote for a candidate.
@@ -210,8 +232,13 @@ def submit_vote(voter_mnemonic: str, app_id: int, candidate_id: int) -> Optional
         return None
     
     # Get voter credentials
-    voter_private_key = algo_mnemonic.to_private_key(voter_mnemonic)
-    voter_address = algo_mnemonic.to_public_key(voter_mnemonic)
+    voter_private_key, voter_address = _account_from_mnemonic(voter_mnemonic)
+    
+    # Don't send a transaction the contract is going to reject
+    check = check_vote_locally(client, voter_address, app_id, candidate_id)
+    if check is not None and not check.approved:
+        print(f"Vote rejected by local contract check: {check.error}")
+        return None
     
     # Get suggested params
     params = client.suggested_params()
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class VotacionesConfig(AppConfig):
+    name = 'votaciones'
+
+    def ready(self):
+        # connect the signal receivers that invalidate cached results
+        from . import reference_data, results_cache  # noqa: F401
@@ -0,0 +1,184 @@
+"""Async (ASGI) versions of the public vote and results API.
+
+Served under `/api/async/` next to the synchronous views. Under an ASGI server
+(`uvicorn VotacionCESA.asgi:application`) they run on the event loop with
+Django's async ORM, so a worker is not tied up per request. The reference data
+comes from the async accessors of `reference_data`. The vote write path still
+runs as one short transaction (the ORM has no async transactions), in a thread
+via `sync_to_async`.
+
+`api_vote_status` accepts `?wait=<seconds>` (up to `VOTE_STATUS_MAX_WAIT`) and
+holds the request open until the vote leaves the outbox, so clients can wait for
+the on-chain confirmation without polling; each waiting client costs one
+coroutine instead of one worker thread.
+
+`api_results_stream` pushes live tally deltas as server-sent events (see
+`live_results`); it is only served under ASGI.
+
+Responses are built with the same helpers as `views`, so both tiers return the
+same JSON.
+"""
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+
+from . import admission
+from . import final_results
+from . import idempotency
+from . import live_results
+from . import reference_data
+from .models import Candidate, Election, ElectionTally, Voter, VoteOutbox
+from .views import (_candidate_votes, _election_param, _elections_payload, _ranked_candidates_payload, _record_vote,
+                    _records_payload, _records_query, _stats_data, _vote_accepted_data, _vote_status_data)
+
+logger = logging.getLogger(__name__)
+
+
+@require_GET
+async def api_candidates(request):
+    election_id = _election_param(request)
+    if election_id is False:
+        return JsonResponse({'error': 'invalid election_id'}, status=400)
+    final = await final_results.afor_election(election_id) if election_id else None
+    if final is not None:
+        return JsonResponse({'candidates': final.candidates})
+    # candidates and members come from the in-process reference cache, tallies from one query
+    if election_id:
+        candidates = await reference_data.acandidates(election_id, include_unassigned=True)
+    else:
+        active = await reference_data.aactive_election()
+        candidates = await reference_data.acandidates(active.id if active else None)
+    votes = {candidate_id: count async for candidate_id, count in _candidate_votes(candidates)}
+    return JsonResponse(_ranked_candidates_payload(candidates, votes))
+
+
+@require_POST
+@admission.admit
+@idempotency.idempotent
+async def api_vote(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        logger.warning('api_vote: unauthenticated request')
+        return JsonResponse({'error': 'authentication required'}, status=403)
+
+    candidate_id = request.POST.get('candidate_id')
+    if not candidate_id:
+        logger.warning('api_vote: candidate_id missing in POST data')
+        return JsonResponse({'error': 'candidate_id required'}, status=400)
+
+    candidate = await Candidate.objects.select_related('election__tally', 'tally').filter(pk=candidate_id).afirst()
+    if candidate is None:
+        raise Http404('candidate not found')
+    election_id = request.POST.get('election_id')
+    election = candidate.election
+    if election_id and str(election_id) != str(candidate.election_id):
+        election = await Election.objects.select_related('tally').filter(pk=election_id).afirst()
+        if election is None:
+            raise Http404('election not found')
+
+    voter = await Voter.objects.filter(user=user).afirst()
+    if voter is None:
+        logger.warning('api_vote: user %s not registered as voter', user.username)
+        return JsonResponse({'error': 'user not registered as voter'}, status=400)
+
+    now = timezone.now()
+    if election and not (election.start_date <= now <= election.end_date):
+        logger.info('api_vote: election not active for election %s', election.id)
+        return JsonResponse({'error': 'election not active'}, status=400)
+
+    try:
+        entry = await sync_to_async(_record_vote)(voter, candidate, election)
+    except IntegrityError:
+        logger.info('api_vote: user %s already voted in election %s', user.username, getattr(election, 'id', None))
+        return JsonResponse({'error': 'user already voted in this election'}, status=400)
+
+    return JsonResponse(_vote_accepted_data(entry, candidate, election, 'async_api_vote_status'), status=202)
+
+
+@require_GET
+async def api_vote_status(request, receipt_id):
+    """Report the on-chain status of a vote receipt, optionally waiting for it to settle."""
+    try:
+        wait = min(float(request.GET.get('wait', 0)), float(getattr(settings, 'VOTE_STATUS_MAX_WAIT', 30)))
+    except ValueError:
+        wait = 0
+    poll = float(getattr(settings, 'VOTE_STATUS_POLL_INTERVAL', 0.5))
+    deadline = time.monotonic() + wait
+
+    qs = VoteOutbox.objects.select_related('vote').filter(receipt_id=receipt_id)
+    while True:
+        entry = await qs.afirst()
+        if entry is None:
+            raise Http404('receipt not found')
+        if entry.status != VoteOutbox.STATUS_PENDING or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(poll)
+    return JsonResponse(await sync_to_async(_vote_status_data)(entry))
+
+
+@require_GET
+async def api_elections(request):
+    return JsonResponse(_elections_payload(await reference_data.aelections()))
+
+
+@require_GET
+async def api_stats(request):
+    election_id = _election_param(request)
+    if election_id is False:
+        return JsonResponse({'error': 'invalid election_id'}, status=400)
+    final = await final_results.afor_election(election_id) if election_id else None
+    if final is not None:
+        return JsonResponse(_stats_data(final.total_votes, final.eligible_voters))
+    now = timezone.now()
+    eligible = await Voter.objects.filter(is_eligible=True).acount()
+    if election_id:
+        total_votes = await ElectionTally.objects.filter(election_id=election_id).values_list('total_votes', flat=True).afirst() or 0
+    else:
+        active = await reference_data.aactive_election(now)
+        if active:
+            total_votes = await ElectionTally.objects.filter(election_id=active.id).values_list('total_votes', flat=True).afirst() or 0
+        else:
+            total_votes = (await ElectionTally.objects.aaggregate(total=Sum('total_votes')))['total'] or 0
+    return JsonResponse(_stats_data(total_votes, eligible))
+
+
+@require_GET
+async def api_blockchain_records(request):
+    try:
+        qs, limit, since = _records_query(request)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(_records_payload([r async for r in qs], limit, since))
+
+
+@require_GET
+async def api_results_stream(request):
+    """Server-sent events with the tally deltas of an election (the active one by default)."""
+    if not isinstance(request, ASGIRequest):
+        # a WSGI worker would be tied up by every open stream
+        return JsonResponse({'error': 'live results require the ASGI server'}, status=503)
+    election_id = _election_param(request)
+    if election_id is False:
+        return JsonResponse({'error': 'invalid election_id'}, status=400)
+    if election_id is None:
+        active = await reference_data.aactive_election()
+        if active is None:
+            raise Http404('no active election')
+        election_id = active.id
+    elif await reference_data.aelection(election_id) is None:
+        raise Http404('election not found')
+
+    response = StreamingHttpResponse(live_results.stream(election_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # keep nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -48,10 +48,9 @@ def is_address_registered(address: str) -> bool:
     if app_id is None:
         raise RuntimeError('ALGORAND_APP_ID not configured')
 
-    try:
-        from algosdk.v2client import algod
-    except Exception as e:
-        raise RuntimeError('algosdk is required for blockchain verification: ' + str(e))
+    from . import algod_clients
+    if not algod_clients.ALGOSDK_AVAILABLE:
+        raise RuntimeError('algosdk is required for blockchain verification')
 
     algod_address = getattr(settings, 'ALGOD_ADDRESS', None) or getattr(settings, 'ALGORAND_ALGOD_ADDRESS', None)
     algod_token = getattr(settings, 'ALGOD_TOKEN', None) or getattr(settings, 'ALGORAND_ALGOD_TOKEN', None)
@@ -61,7 +60,7 @@ def is_address_registered(address: str) -> bool:
         raise RuntimeError('ALGOD_ADDRESS not configured in settings')
 
     try:
-        client = algod.AlgodClient(algod_token or '', algod_address, headers=algod_headers)
+        client = algod_clients.get_algod_client(algod_token or '', algod_address, algod_headers)
     except Exception as e:
         raise RuntimeError('Could not create Algod client: ' + str(e))
 
@@ -0,0 +1,117 @@
+"""Circuit breakers for the external Algorand endpoints (algod, indexer).
+
+Every request sent through the pooled clients in `algod_clients` goes through
+the breaker of its endpoint (keyed by base URL):
+
+ - closed: calls go through; `CIRCUIT_BREAKER_FAILURES` consecutive failures
+   (connection errors, timeouts, 5xx) open the breaker;
+ - open: calls fail immediately with `CircuitOpenError` for
+   `CIRCUIT_BREAKER_COOLDOWN` seconds instead of waiting for a timeout;
+ - half-open: after the cool-off up to `CIRCUIT_BREAKER_PROBES` calls are let
+   through as probes; a success closes the breaker, a failure opens it again.
+
+Breakers are kept per process. Their state is published through
+`votaciones.metrics` under ``circuit_breakers``.
+"""
+from typing import Dict
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an endpoint whose breaker is open."""
+
+
+class CircuitBreaker:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _threshold() -> int:
+        return int(getattr(settings, 'CIRCUIT_BREAKER_FAILURES', 5))
+
+    @staticmethod
+    def _cooldown() -> float:
+        return float(getattr(settings, 'CIRCUIT_BREAKER_COOLDOWN', 30))
+
+    def before_call(self):
+        """Raise `CircuitOpenError` unless a call may be sent now."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self._cooldown():
+                self.state = HALF_OPEN
+                self.probes = 0
+            if self.state == HALF_OPEN and self.probes < int(getattr(settings, 'CIRCUIT_BREAKER_PROBES', 1)):
+                self.probes += 1
+                return
+            if self.state == CLOSED:
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self._cooldown() - (time.monotonic() - self.opened_at))
+        raise CircuitOpenError(f'{self.name} unavailable (circuit open, retry in {retry_in:.0f}s)')
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self._threshold():
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures, 'rejected': self.rejected}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def is_open(name: str) -> bool:
+    """True while calls to `name` would be rejected without trying (open and cooling off)."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+    if breaker is None:
+        return False
+    with breaker._lock:
+        return breaker.state == OPEN and time.monotonic() - breaker.opened_at < breaker._cooldown()
+
+
+def reset():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def breaker_stats() -> dict:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.stats() for b in breakers}
+
+
+metrics.register('circuit_breakers', breaker_stats)
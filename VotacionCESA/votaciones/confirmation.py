@@ -0,0 +1,205 @@
+"""Shared, round-based confirmation waiter for Algorand transactions.
+
+Instead of every caller polling `pending_transaction_info` for its own txid in a
+sleep loop, a single background thread per algod endpoint follows new rounds with
+`status_after_block` and checks every outstanding txid once per round. Callers
+get a `concurrent.futures.Future` that resolves to the pending-transaction info
+once the transaction is confirmed (or fails with `TimeoutError` /
+`TransactionRejected` for a pool error), so they can block on it or attach a callback.
+
+Waits are also bounded in wall-clock time: a txid fails with `TimeoutError` once
+`timeout_rounds * ROUND_SECONDS` seconds have passed, and every pending txid
+fails after `MAX_STATUS_FAILURES` consecutive algod errors. So callers (such as
+the outbox worker holding leased entries) do not block forever while algod is
+down or the circuit breaker is open.
+
+This module has no Django dependency so standalone scripts such as
+`SmartContract1.py` can use it too.
+"""
+from concurrent.futures import Future, wait as wait_futures
+from typing import Dict, Iterable, Optional
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Rounds to wait for a confirmation before failing the future.
+DEFAULT_TIMEOUT_ROUNDS = 10
+# Wall-clock allowance per round (blocks take ~3 s), for when rounds stop advancing.
+ROUND_SECONDS = 5.0
+# Consecutive failed algod status reads before every pending txid is failed.
+MAX_STATUS_FAILURES = 5
+
+
+class TransactionRejected(RuntimeError):
+    """algod dropped the transaction from its pool; it will never be confirmed."""
+
+
+class ConfirmationService:
+    """Tracks outstanding txids for one algod client and resolves them round by round."""
+
+    def __init__(self, client, timeout_rounds: int = DEFAULT_TIMEOUT_ROUNDS, round_seconds: float = ROUND_SECONDS,
+                 max_status_failures: int = MAX_STATUS_FAILURES):
+        self._client = client
+        self._timeout_rounds = timeout_rounds
+        self._round_seconds = round_seconds
+        self._max_status_failures = max_status_failures
+        self._lock = threading.Lock()
+        # txid -> [future, timeout_rounds, deadline_round or None, monotonic deadline]
+        self._pending: Dict[str, list] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, txid: str, timeout_rounds: Optional[int] = None) -> Future:
+        """Start tracking `txid` and return a future for its confirmation."""
+        with self._lock:
+            if txid in self._pending:
+                return self._pending[txid][0]
+            future = Future()
+            timeout_rounds = timeout_rounds or self._timeout_rounds
+            self._pending[txid] = [future, timeout_rounds, None, time.monotonic() + self._seconds(timeout_rounds)]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='algod-confirmations', daemon=True)
+                self._thread.start()
+        return future
+
+    def wait(self, txid: str, timeout_rounds: Optional[int] = None) -> dict:
+        """Block until `txid` is confirmed and return its pending-transaction info.
+
+        Raises `TimeoutError` after at most the txid's wall-clock deadline (plus a
+        short grace for the poll thread to notice it).
+        """
+        future = self.submit(txid, timeout_rounds)
+        try:
+            return future.result(timeout=self._seconds(timeout_rounds or self._timeout_rounds) + self._round_seconds)
+        except TimeoutError:
+            if not future.done():
+                self._resolve(txid, error=TimeoutError(f'tx {txid} not confirmed in time'))
+            raise
+
+    def wait_all(self, txids: Iterable[str], timeout_rounds: Optional[int] = None) -> Dict[str, BaseException]:
+        """Track every txid at once and block until all are resolved; returns the error of each that failed.
+
+        The same per-round poll serves them all, so this takes about as long as
+        the slowest txid rather than the sum of their waits.
+        """
+        futures = {txid: self.submit(txid, timeout_rounds) for txid in txids}
+        wait_futures(futures.values(), timeout=self._seconds(timeout_rounds or self._timeout_rounds) + self._round_seconds)
+        errors = {}
+        for txid, future in futures.items():
+            if not future.done():
+                self._resolve(txid, error=TimeoutError(f'tx {txid} not confirmed in time'))
+            error = future.exception(timeout=self._round_seconds)
+            if error is not None:
+                errors[txid] = error
+        return errors
+
+    def _seconds(self, timeout_rounds: int) -> float:
+        return timeout_rounds * self._round_seconds
+
+    def outstanding(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+            self._expire(time.monotonic())
+            try:
+                current_round = self._client.status()['last-round']
+            except Exception as e:
+                failures += 1
+                logger.warning('confirmation service: could not read algod status (%s in a row): %s', failures, e)
+                if failures >= self._max_status_failures:
+                    self._fail_all(TimeoutError(f'algod unavailable: {e}'))
+                    failures = 0
+                else:
+                    time.sleep(1)
+                continue
+            failures = 0
+
+            self._check_round(current_round)
+
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+            try:
+                self._client.status_after_block(current_round)
+            except Exception as e:
+                logger.warning('confirmation service: status_after_block(%s) failed: %s', current_round, e)
+                time.sleep(1)
+
+    def _check_round(self, current_round: int):
+        """Check every outstanding txid once against `current_round`."""
+        with self._lock:
+            snapshot = list(self._pending.items())
+
+        for txid, entry in snapshot:
+            future, timeout_rounds, deadline, _ = entry
+            if deadline is None:
+                deadline = entry[2] = current_round + timeout_rounds
+            try:
+                info = self._client.pending_transaction_info(txid)
+            except Exception:
+                # transient algod error: try again next round
+                info = {}
+
+            if info.get('confirmed-round', 0) > 0:
+                self._resolve(txid, result=info)
+            elif info.get('pool-error'):
+                self._resolve(txid, error=TransactionRejected(f"tx {txid} rejected: {info['pool-error']}"))
+            elif current_round >= deadline:
+                self._resolve(txid, error=TimeoutError(f'tx {txid} not confirmed after {timeout_rounds} rounds'))
+
+    def _expire(self, now: float):
+        """Fail the txids whose wall-clock deadline has passed."""
+        with self._lock:
+            expired = [(txid, entry[1]) for txid, entry in self._pending.items() if now >= entry[3]]
+        for txid, timeout_rounds in expired:
+            self._resolve(txid, error=TimeoutError(f'tx {txid} not confirmed after {self._seconds(timeout_rounds):g} s'))
+
+    def _fail_all(self, error: BaseException):
+        with self._lock:
+            txids = list(self._pending)
+        for txid in txids:
+            self._resolve(txid, error=error)
+
+    def _resolve(self, txid: str, result=None, error: Optional[BaseException] = None):
+        with self._lock:
+            entry = self._pending.pop(txid, None)
+        if entry is None:
+            return
+        if error is not None:
+            entry[0].set_exception(error)
+        else:
+            entry[0].set_result(result)
+
+
+_services: Dict[tuple, ConfirmationService] = {}
+_services_lock = threading.Lock()
+
+
+def service_for(client) -> ConfirmationService:
+    """Return the process-wide service for the algod endpoint behind `client`."""
+    address = getattr(client, 'algod_address', None)
+    key = (type(client), address, getattr(client, 'algod_token', None)) if address else (type(client), id(client))
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = _services[key] = ConfirmationService(client)
+        return service
+
+
+def wait_for_confirmation(client, txid: str, timeout_rounds: Optional[int] = None) -> dict:
+    """Block until `txid` is confirmed, sharing the per-round poll with other waiters."""
+    return service_for(client).wait(txid, timeout_rounds)
+
+
+def wait_for_confirmations(client, txids: Iterable[str], timeout_rounds: Optional[int] = None) -> Dict[str, BaseException]:
+    """Wait for several broadcast txids together; see `ConfirmationService.wait_all`."""
+    return service_for(client).wait_all(txids, timeout_rounds)
@@ -0,0 +1,69 @@
+"""Per-request time budget for outbound chain calls.
+
+`deadline_middleware` gives every request a budget of `CHAIN_CALL_BUDGET`
+seconds for algod/indexer calls. The pooled clients in `algod_clients` cap the
+timeout of each call to what is left of the budget and raise
+`DeadlineExceeded` once it is spent, so a view (or the login check) that makes
+several chain calls cannot hang for several full timeouts.
+
+Outside a request (outbox worker, management commands) there is no budget
+unless the code opens one with `deadline(seconds)`.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import asyncio
+import time
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+_deadline: ContextVar[Optional[float]] = ContextVar('chain_call_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's budget for chain calls is spent."""
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Limit chain calls inside the block to `seconds` (never extends an outer budget)."""
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(at if outer is None else min(outer, at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current budget, or None when there is none."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def cap_timeout(timeout: float) -> float:
+    """Return `timeout` shortened to the remaining budget; raise when it is spent."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded('time budget for chain calls exhausted')
+    return min(timeout, left)
+
+
+@sync_and_async_middleware
+def deadline_middleware(get_response):
+    def budget():
+        return float(getattr(settings, 'CHAIN_CALL_BUDGET', 5))
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            with deadline(budget()):
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with deadline(budget()):
+                return get_response(request)
+    return middleware
@@ -0,0 +1,116 @@
+"""Frozen final results of closed elections.
+
+Once `Election.end_date` has passed the results of an election never change, so
+`freeze` computes them once: the `api_candidates` payload with the final votes,
+the totals, the eligible voters and a SHA-256 digest of the election's on-chain
+records. It stores them as an immutable `FinalResult`. From then on
+`for_election` answers with that row in one query, and `api_candidates`,
+`api_stats`, the bootstrap payload and `generate_election_pdf` read it instead
+of the tallies.
+
+Elections are frozen by `python manage.py close_elections`, or by the first read
+after `end_date` (`FINAL_RESULTS_AUTO_FREEZE`). An election that still has votes
+in the outbox is not frozen, because its record digest would miss them; the
+command can force it.
+"""
+from typing import Optional, Tuple
+import hashlib
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Election, ElectionTally, FinalResult, OnChainRecord, Voter, VoteOutbox
+
+logger = logging.getLogger(__name__)
+
+
+class ElectionNotClosed(ValueError):
+    """The election has not ended yet, or still has votes waiting in the outbox."""
+
+
+def records_digest(election_id: int) -> Tuple[int, str]:
+    """(count, SHA-256) of the election's record txids in (`timestamp`, `id`) order."""
+    digest = hashlib.sha256()
+    count = 0
+    txids = (OnChainRecord.objects.filter(election_id=election_id).order_by('timestamp', 'id')
+             .values_list('txid', flat=True))
+    for txid in txids.iterator(chunk_size=2000):
+        digest.update(txid.encode() + b'\n')
+        count += 1
+    return count, digest.hexdigest()
+
+
+def pending_votes(election_id: int) -> int:
+    return VoteOutbox.objects.filter(election_id=election_id, status=VoteOutbox.STATUS_PENDING).count()
+
+
+def freeze(election: Election, force: bool = False) -> FinalResult:
+    """Compute and store the final results of `election` (or return the stored ones).
+
+    Raises `ElectionNotClosed` when the election has not ended or, unless `force`,
+    while some of its votes are still pending in the outbox.
+    """
+    existing = FinalResult.objects.filter(election=election).first()
+    if existing is not None:
+        return existing
+    if election.end_date >= timezone.now():
+        raise ElectionNotClosed(f'election {election.pk} has not ended')
+    pending = pending_votes(election.pk)
+    if pending and not force:
+        raise ElectionNotClosed(f'election {election.pk} has {pending} votes pending in the outbox')
+
+    from .views import _live_candidates_payload
+
+    candidates = _live_candidates_payload(election.pk)['candidates']
+    tally = ElectionTally.objects.filter(election=election).first() or ElectionTally(election=election)
+    count, digest = records_digest(election.pk)
+    try:
+        with transaction.atomic():
+            result = FinalResult.objects.create(
+                election=election,
+                candidates=candidates,
+                total_votes=tally.total_votes,
+                eligible_voters=Voter.objects.filter(is_eligible=True).count(),
+                record_count=count,
+                records_digest=digest,
+            )
+    except IntegrityError:
+        # frozen concurrently by another request or worker
+        return FinalResult.objects.get(election=election)
+    logger.info('final results frozen for election %s: %s votes, %s records', election.pk, result.total_votes, count)
+    return result
+
+
+def for_election(election_id: int) -> Optional[FinalResult]:
+    """The final results of `election_id` if it is closed, freezing them on first use; None otherwise."""
+    election = Election.objects.select_related('final_result').filter(pk=election_id).first()
+    if election is None:
+        return None
+    try:
+        return election.final_result
+    except FinalResult.DoesNotExist:
+        return _freeze_if_closed(election)
+
+
+async def afor_election(election_id: int) -> Optional[FinalResult]:
+    """`for_election` for async views; only the (one-off) freeze runs in a thread."""
+    election = await Election.objects.select_related('final_result').filter(pk=election_id).afirst()
+    if election is None:
+        return None
+    try:
+        return election.final_result
+    except FinalResult.DoesNotExist:
+        return await sync_to_async(_freeze_if_closed)(election)
+
+
+def _freeze_if_closed(election) -> Optional[FinalResult]:
+    if election.end_date >= timezone.now() or not getattr(settings, 'FINAL_RESULTS_AUTO_FREEZE', True):
+        return None
+    try:
+        return freeze(election)
+    except ElectionNotClosed as exc:
+        logger.info('final results not frozen yet: %s', exc)
+        return None
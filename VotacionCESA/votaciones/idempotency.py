@@ -0,0 +1,186 @@
+"""`Idempotency-Key` support for POST endpoints such as `api_vote`.
+
+A client that retries a request (e.g. after the mobile network dropped while
+waiting for the response) sends the same `Idempotency-Key` header again. The
+first request stores its response in an `IdempotencyRecord`; retries within
+`IDEMPOTENCY_KEY_TTL` seconds get that response back without running the view.
+A duplicate that arrives while the first request is still running waits up to
+`IDEMPOTENCY_WAIT_TIMEOUT` seconds for it to finish (409 if it does not).
+
+Until its response is stored, a record only holds a short lease
+(`IDEMPOTENCY_WAIT_TIMEOUT` plus `LEASE_MARGIN` seconds). If the worker dies
+mid-request, the key is free again after that instead of answering 409 for
+the whole TTL.
+
+Keys are scoped per user. Reusing a key with different request data is
+rejected with 422, and 429/5xx responses are not stored so the client can retry.
+"""
+from datetime import timedelta
+from functools import wraps
+import asyncio
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Interval between checks while waiting on an in-flight duplicate.
+POLL_INTERVAL = 0.05
+# Minimum seconds between purges of expired records in one process.
+PURGE_INTERVAL = 60
+# Seconds an in-flight record outlives the wait timeout before its key can be reclaimed.
+LEASE_MARGIN = 30
+
+_last_purge = 0.0
+
+
+def _request_hash(request) -> str:
+    digest = hashlib.sha256(request.method.encode() + b' ' + request.path.encode())
+    for name in sorted(request.POST):
+        for value in request.POST.getlist(name):
+            digest.update(f'\n{name}={value}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _purge_expired():
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < PURGE_INTERVAL:
+        return
+    _last_purge = now
+    IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()
+
+
+def _lease() -> timedelta:
+    return timedelta(seconds=float(getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)) + LEASE_MARGIN)
+
+
+def _claim(user, key: str, request_hash: str):
+    """Create the in-flight record for `key`, leased until the response is stored; return (record, created)."""
+    now = timezone.now()
+    IdempotencyRecord.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyRecord.objects.create(user=user, key=key, request_hash=request_hash, expires_at=now + _lease())
+        return record, True
+    except IntegrityError:
+        return IdempotencyRecord.objects.filter(user=user, key=key).first(), False
+
+
+def _replay(record) -> HttpResponse:
+    response = HttpResponse(bytes(record.response_body or b''), status=record.response_status,
+                            content_type=record.response_content_type or 'application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _try_claim(user, key: str, request_hash: str):
+    """One attempt at owning `key`.
+
+    Returns (record, None) when this request owns the key and must run the view,
+    (None, response) when a response can be returned right away, and (None, None)
+    when a duplicate is still in flight and the caller should wait and retry.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        return None, JsonResponse({'error': f'{HEADER} too long'}, status=400)
+    record, created = _claim(user, key, request_hash)
+    if created:
+        return record, None
+    if record is None:
+        # the first request failed and released the key: try to claim it again
+        return _try_claim(user, key, request_hash)
+    if record.request_hash != request_hash:
+        return None, JsonResponse({'error': f'{HEADER} reused with different request data'}, status=422)
+    if record.completed:
+        return None, _replay(record)
+    return None, None
+
+
+def _in_progress():
+    return JsonResponse({'error': 'a request with this Idempotency-Key is still in progress'}, status=409)
+
+
+def _finish(record, response):
+    """Store `response` for replays, or release the key for a retry (429/5xx, streaming, exception)."""
+    if (response is None or response.status_code >= 500 or response.status_code == 429
+            or getattr(response, 'streaming', False)):
+        record.delete()
+    else:
+        # the stored response is kept for the whole TTL; an update (not save) in case
+        # the lease ran out and a retry already replaced the record
+        ttl = timedelta(seconds=float(getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 3600)))
+        IdempotencyRecord.objects.filter(pk=record.pk).update(
+            response_status=response.status_code,
+            response_body=response.content,
+            response_content_type=response.get('Content-Type', ''),
+            expires_at=timezone.now() + ttl,
+        )
+    _purge_expired()
+
+
+def idempotent(view_func):
+    """Make a POST view replay its stored response for a repeated `Idempotency-Key`.
+
+    Works for both sync and async views.
+    """
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            user = await request.auser() if key else None
+            if not key or not user.is_authenticated:
+                return await view_func(request, *args, **kwargs)
+
+            request_hash = _request_hash(request)
+            deadline = time.monotonic() + float(getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10))
+            while True:
+                record, response = await sync_to_async(_try_claim)(user, key, request_hash)
+                if record is not None:
+                    break
+                if response is not None:
+                    return response
+                if time.monotonic() >= deadline:
+                    return _in_progress()
+                await asyncio.sleep(POLL_INTERVAL)
+
+            response = None
+            try:
+                response = await view_func(request, *args, **kwargs)
+            finally:
+                await sync_to_async(_finish)(record, response)
+            return response
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+
+        request_hash = _request_hash(request)
+        deadline = time.monotonic() + float(getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10))
+        while True:
+            record, response = _try_claim(request.user, key, request_hash)
+            if record is not None:
+                break
+            if response is not None:
+                return response
+            if time.monotonic() >= deadline:
+                return _in_progress()
+            time.sleep(POLL_INTERVAL)
+
+        response = None
+        try:
+            response = view_func(request, *args, **kwargs)
+        finally:
+            _finish(record, response)
+        return response
+    return wrapper
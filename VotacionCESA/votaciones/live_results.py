@@ -0,0 +1,206 @@
+"""Live tally deltas for `/api/results/stream/` (server-sent events).
+
+Every worker runs one `Broadcaster` per event loop. While at least one client
+is subscribed it polls, every `LIVE_RESULTS_INTERVAL` seconds, the results
+version of each watched election (`results_cache.version`, bumped by every
+committed vote in any worker), and only when it changed reads the tallies,
+diffs them against the last snapshot and encodes one ``tally`` event with the
+candidates whose count changed, the total and the participation. The encoded
+bytes are put on every subscriber's queue, so the cost of a vote does not grow
+with the number of clients beyond one `put_nowait` each.
+
+Each subscriber has a queue of at most `LIVE_RESULTS_BUFFER` events. A client
+whose queue is full is dropped: its stream ends and the browser's EventSource
+reconnects and starts again from a fresh ``snapshot`` event, instead of the
+worker buffering an ever growing backlog for it. Idle streams get a comment
+line every `LIVE_RESULTS_HEARTBEAT` seconds so proxies keep them open.
+
+A connected client costs one coroutine and its queue, so an ASGI worker holds
+thousands of them; under WSGI each would hold a thread, so the endpoint
+answers 503 there and the page falls back to polling.
+"""
+from typing import Dict, Optional, Set
+import asyncio
+import json
+import logging
+import threading
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metrics
+from . import results_cache
+from .models import CandidateTally, ElectionTally, Voter
+from .views import _stats_data
+
+logger = logging.getLogger(__name__)
+
+_counters = {'subscribers': 0, 'dropped': 0, 'broadcasts': 0, 'events_queued': 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str, n: int = 1):
+    with _counters_lock:
+        _counters[name] += n
+
+
+def _setting(name: str, default: float) -> float:
+    return float(getattr(settings, name, default))
+
+
+def encode(event: str, data: dict) -> bytes:
+    """One server-sent event."""
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode('utf-8')
+
+
+HEARTBEAT = b': ping\n\n'
+
+
+class Subscriber:
+    __slots__ = ('election_id', 'queue', 'dropped')
+
+    def __init__(self, election_id: int, buffer: int):
+        self.election_id = election_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        self.dropped = False
+
+
+async def snapshot(election_id: int) -> dict:
+    """Current tallies of `election_id`: votes per candidate, total and participation."""
+    votes = {cid: n async for cid, n in CandidateTally.objects.filter(election_id=election_id).values_list('candidate_id', 'votes')}
+    total = await ElectionTally.objects.filter(election_id=election_id).values_list('total_votes', flat=True).afirst() or 0
+    eligible = await Voter.objects.filter(is_eligible=True).acount()
+    return dict(_stats_data(total, eligible), election_id=election_id, votes=votes)
+
+
+def _payload(state: dict, votes: dict) -> dict:
+    return {
+        'election_id': state['election_id'],
+        'candidates': [{'candidate_id': cid, 'votes': n} for cid, n in sorted(votes.items())],
+        'total_votes': state['total_votes'],
+        'eligible_voters': state['eligible_voters'],
+        'participation': state['participation'],
+    }
+
+
+def delta(old: Optional[dict], new: dict) -> Optional[dict]:
+    """The ``tally`` payload going from `old` to `new`, or None when nothing changed."""
+    previous = old['votes'] if old else {}
+    changed = {cid: n for cid, n in new['votes'].items() if previous.get(cid) != n}
+    if not changed and old and old['total_votes'] == new['total_votes'] and old['participation'] == new['participation']:
+        return None
+    return _payload(new, changed)
+
+
+class Broadcaster:
+    """Fan-out of tally deltas to the subscribers of one event loop."""
+
+    def __init__(self):
+        self.subscribers: Dict[int, Set[Subscriber]] = {}
+        self.versions: Dict[int, str] = {}
+        self.snapshots: Dict[int, dict] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self, election_id: int) -> Subscriber:
+        sub = Subscriber(election_id, int(_setting('LIVE_RESULTS_BUFFER', 16)))
+        self.subscribers.setdefault(election_id, set()).add(sub)
+        _count('subscribers')
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        subs = self.subscribers.get(sub.election_id)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        _count('subscribers', -1)
+        if not subs:
+            del self.subscribers[sub.election_id]
+            self.versions.pop(sub.election_id, None)
+            self.snapshots.pop(sub.election_id, None)
+
+    def publish(self, election_id: int, message: bytes):
+        """Queue `message` for every subscriber of `election_id`, dropping those that are full."""
+        subs = list(self.subscribers.get(election_id, ()))
+        for sub in subs:
+            try:
+                sub.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.drop(sub)
+        _count('broadcasts')
+        _count('events_queued', len(subs))
+
+    def drop(self, sub: Subscriber):
+        self.unsubscribe(sub)
+        sub.dropped = True
+        # wake the stream so it ends now instead of after its backlog
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+        _count('dropped')
+
+    async def _run(self):
+        while self.subscribers:
+            await asyncio.sleep(_setting('LIVE_RESULTS_INTERVAL', 0.5))
+            for election_id in list(self.subscribers):
+                try:
+                    await self._check(election_id)
+                except Exception:
+                    logger.exception('live results: could not refresh election %s', election_id)
+        self.task = None
+
+    async def _check(self, election_id: int):
+        version = await sync_to_async(results_cache.version)(f'e{election_id}')
+        if self.versions.get(election_id) == version:
+            return
+        state = await snapshot(election_id)
+        if election_id not in self.subscribers:
+            return
+        change = delta(self.snapshots.get(election_id), state)
+        self.versions[election_id] = version
+        self.snapshots[election_id] = state
+        if change is not None:
+            self.publish(election_id, encode('tally', change))
+
+
+_broadcasters: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Broadcaster]' = weakref.WeakKeyDictionary()
+
+
+def broadcaster() -> Broadcaster:
+    """The broadcaster of the running event loop (one per ASGI worker)."""
+    loop = asyncio.get_running_loop()
+    if loop not in _broadcasters:
+        _broadcasters[loop] = Broadcaster()
+    return _broadcasters[loop]
+
+
+async def stream(election_id: int):
+    """Server-sent events for one client: a ``snapshot``, then ``tally`` deltas until it disconnects or is dropped."""
+    hub = broadcaster()
+    sub = hub.subscribe(election_id)
+    try:
+        state = await snapshot(election_id)
+        yield b'retry: %d\n' % int(_setting('LIVE_RESULTS_RETRY', 3) * 1000)
+        yield encode('snapshot', _payload(state, state['votes']))
+        heartbeat = _setting('LIVE_RESULTS_HEARTBEAT', 15)
+        while True:
+            try:
+                message = await asyncio.wait_for(sub.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+                continue
+            if message is None:
+                return
+            yield message
+    finally:
+        hub.unsubscribe(sub)
+
+
+def stats() -> dict:
+    with _counters_lock:
+        return dict(_counters)
+
+
+metrics.register('live_results', stats)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from votaciones import final_results
+from votaciones.models import Election
+
+
+class Command(BaseCommand):
+    help = 'Freeze the final results of elections whose end date has passed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--election', type=int, help='Only this election (default: every ended election without final results).')
+        parser.add_argument('--force', action='store_true', help='Freeze even if votes are still pending in the outbox.')
+
+    def handle(self, *args, **options):
+        elections = Election.objects.filter(end_date__lt=timezone.now(), final_result__isnull=True)
+        if options.get('election'):
+            elections = Election.objects.filter(pk=options['election'])
+            if not elections.exists():
+                raise CommandError(f"Election {options['election']} does not exist.")
+
+        frozen = skipped = 0
+        for election in elections.order_by('end_date'):
+            try:
+                result = final_results.freeze(election, force=options.get('force', False))
+            except final_results.ElectionNotClosed as exc:
+                skipped += 1
+                self.stdout.write(self.style.WARNING(f'Skipped {election}: {exc}'))
+                continue
+            frozen += 1
+            self.stdout.write(f'{election}: {result.total_votes} votes, {result.record_count} records, '
+                              f'digest {result.records_digest}')
+        self.stdout.write(self.style.SUCCESS(f'Final results frozen: {frozen}, skipped: {skipped}.'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from votaciones import final_results, static_export
+from votaciones.models import Election
+
+
+class Command(BaseCommand):
+    help = 'Export the results page and blockchain explorer of closed elections as static HTML/JSON (+ .gz).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--election', type=int, help='Only this election (default: every closed election).')
+        parser.add_argument('--output', help='Export directory (default RESULTS_EXPORT_ROOT).')
+        parser.add_argument('--force', action='store_true', help='Rewrite every file even if its content hash is unchanged.')
+
+    def handle(self, *args, **options):
+        if options.get('election'):
+            elections = Election.objects.filter(pk=options['election'])
+            if not elections.exists():
+                raise CommandError(f"Election {options['election']} does not exist.")
+        else:
+            elections = Election.objects.filter(end_date__lt=timezone.now())
+
+        root = options.get('output') or static_export.export_root()
+        for election in elections.order_by('end_date'):
+            try:
+                summary = static_export.export_election(election, root, force=options.get('force', False))
+            except final_results.ElectionNotClosed as exc:
+                raise CommandError(f'Cannot export {election}: {exc}')
+            self.stdout.write(f"{election}: {len(summary['written'])} written, {len(summary['unchanged'])} unchanged, "
+                              f"{len(summary['removed'])} removed")
+        self.stdout.write(self.style.SUCCESS(f'Static results exported to {root}.'))
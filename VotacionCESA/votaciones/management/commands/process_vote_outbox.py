@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from votaciones import algorand_integration
+from votaciones.outbox import batch_ready, process_due_entries
+
+
+class Command(BaseCommand):
+    help = 'Submit pending votes from the outbox to Algorand, retrying failures with backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the currently due entries once and exit.')
+        parser.add_argument('--batch-size', type=int, default=64, help='Maximum entries claimed per pass.')
+        parser.add_argument('--group-size', type=int, help='Votes per atomic group (default VOTE_BATCH_SIZE; 1 disables grouping).')
+        parser.add_argument('--window', type=float, help='Seconds to wait for a group to fill (default VOTE_BATCH_WINDOW).')
+        parser.add_argument('--interval', type=float, default=0.25, help='Seconds to sleep between polls when idle.')
+
+    def handle(self, *args, **options):
+        once = options.get('once', False)
+        batch_size = options.get('batch_size') or 64
+        group_size = options.get('group_size')
+        window = options.get('window')
+        interval = options.get('interval') or 0.25
+
+        # build the signer context (client, decoded key, suggested params) once at startup
+        ctx = algorand_integration.get_signer_context()
+        if ctx is None:
+            self.stdout.write(self.style.WARNING('Algorand not configured: votes will be simulated.'))
+        else:
+            try:
+                ctx.suggested_params()
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f'Could not prefetch suggested params: {e}'))
+
+        while True:
+            summary = {'processed': 0}
+            # --once drains whatever is due right away, without waiting for groups to fill
+            if once or batch_ready(group_size, window):
+                summary = process_due_entries(batch_size, group_size)
+            if summary['processed']:
+                self.stdout.write(f"Outbox pass: processed={summary['processed']} confirmed={summary['confirmed']} failed={summary['failed']}")
+            if once:
+                break
+            if summary['processed'] < batch_size:
+                time.sleep(interval)
+
+        self.stdout.write(self.style.SUCCESS('Outbox drained.'))
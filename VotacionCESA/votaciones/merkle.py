@@ -0,0 +1,74 @@
+"""Merkle tree helpers for batch anchoring of votes.
+
+Leaves and internal nodes are domain-separated SHA-256 hashes (0x00 prefix for
+leaves, 0x01 for nodes) so a leaf can never be confused with an internal node.
+When a level has an odd number of nodes the last one is promoted unchanged to
+the next level instead of being paired with itself.
+
+A proof is a list of ``{'side': 'L' | 'R', 'hash': <hex>}`` steps from the leaf
+up to the root; ``side`` tells on which side the sibling sits.
+"""
+from typing import Dict, List, Sequence, Tuple
+import hashlib
+import secrets
+
+
+def new_salt() -> str:
+    return secrets.token_hex(16)
+
+
+def leaf_hash(election_id: int, candidate_id: int, salt: str) -> str:
+    """Hash of a single vote leaf. The salt keeps equal votes distinct and unguessable."""
+    payload = f'{election_id}:{candidate_id}:{salt}'.encode('utf-8')
+    return hashlib.sha256(b'\x00' + payload).hexdigest()
+
+
+def _node_hash(left: str, right: str) -> str:
+    return hashlib.sha256(b'\x01' + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def build_tree(leaves: Sequence[str]) -> Tuple[str, List[List[Dict[str, str]]]]:
+    """Return (root, proofs) for `leaves`; `proofs[i]` is the inclusion proof of leaf i."""
+    if not leaves:
+        raise ValueError('cannot build a Merkle tree without leaves')
+
+    proofs = [[] for _ in leaves]
+    # positions[i] is the index of leaf i's ancestor in the current level
+    positions = list(range(len(leaves)))
+    level = list(leaves)
+    while len(level) > 1:
+        next_level = []
+        for i in range(0, len(level), 2):
+            if i + 1 < len(level):
+                next_level.append(_node_hash(level[i], level[i + 1]))
+            else:
+                next_level.append(level[i])
+        for leaf_index, pos in enumerate(positions):
+            sibling = pos ^ 1
+            if sibling < len(level):
+                side = 'L' if sibling < pos else 'R'
+                proofs[leaf_index].append({'side': side, 'hash': level[sibling]})
+            positions[leaf_index] = pos // 2
+        level = next_level
+    return level[0], proofs
+
+
+def root_from_proof(leaf: str, proof: Sequence[Dict[str, str]]) -> str:
+    """Root reached from `leaf` through `proof`; KeyError/TypeError/ValueError when a step is malformed."""
+    node = leaf
+    for step in proof:
+        side, sibling = step['side'], step['hash']
+        if side not in ('L', 'R') or not isinstance(sibling, str) or len(sibling) != 64:
+            raise ValueError(f'invalid proof step: {step!r}')
+        if side == 'L':
+            node = _node_hash(sibling, node)
+        else:
+            node = _node_hash(node, sibling)
+    return node
+
+
+def verify_proof(leaf: str, proof: Sequence[Dict[str, str]], root: str) -> bool:
+    try:
+        return root_from_proof(leaf, proof) == root
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return False
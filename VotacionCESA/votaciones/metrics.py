@@ -0,0 +1,28 @@
+"""In-process metrics registry.
+
+Modules register a provider (a callable returning a JSON-serializable dict)
+under a name; `snapshot()` collects them all. The staff-only `/api/metrics/`
+endpoint serves the snapshot of the worker that handles the request.
+"""
+from typing import Callable, Dict
+import threading
+
+_providers: Dict[str, Callable[[], dict]] = {}
+_lock = threading.Lock()
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    with _lock:
+        _providers[name] = provider
+
+
+def snapshot() -> dict:
+    with _lock:
+        providers = list(_providers.items())
+    data = {}
+    for name, provider in providers:
+        try:
+            data[name] = provider()
+        except Exception as e:
+            data[name] = {'error': str(e)}
+    return data
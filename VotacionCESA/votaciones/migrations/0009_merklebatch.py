@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votaciones', '0008_voteoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onchainrecord',
+            name='leaf_index',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='onchainrecord',
+            name='leaf_salt',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='onchainrecord',
+            name='merkle_proof',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='MerkleBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('root', models.CharField(max_length=64, unique=True)),
+                ('txid', models.CharField(max_length=200)),
+                ('leaf_count', models.PositiveIntegerField(default=0)),
+                ('anchored_at', models.DateTimeField(auto_now_add=True)),
+                ('election', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='merkle_batches', to='votaciones.election')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='onchainrecord',
+            name='merkle_batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='records', to='votaciones.merklebatch'),
+        ),
+    ]
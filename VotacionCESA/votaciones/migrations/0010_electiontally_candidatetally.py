@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_tallies(apps, schema_editor):
+    """Build the tallies of the existing votes.
+
+    Registered votes no longer link to their candidate (only their `OnChainRecord`
+    does), so a candidate's votes are its on-chain records plus its pending votes.
+    """
+    Candidate = apps.get_model('votaciones', 'Candidate')
+    Election = apps.get_model('votaciones', 'Election')
+    Vote = apps.get_model('votaciones', 'Vote')
+    OnChainRecord = apps.get_model('votaciones', 'OnChainRecord')
+    CandidateTally = apps.get_model('votaciones', 'CandidateTally')
+    ElectionTally = apps.get_model('votaciones', 'ElectionTally')
+
+    for candidate in Candidate.objects.all():
+        votes = OnChainRecord.objects.filter(candidate=candidate).count() + Vote.objects.filter(candidate=candidate).count()
+        CandidateTally.objects.create(candidate=candidate, election_id=candidate.election_id, votes=votes)
+    for election in Election.objects.all():
+        total = Vote.objects.filter(election=election).count()
+        ElectionTally.objects.create(election=election, total_votes=total, voters_voted=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votaciones', '0009_merklebatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidateTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('votes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('candidate', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tally', to='votaciones.candidate')),
+                ('election', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='candidate_tallies', to='votaciones.election')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ElectionTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_votes', models.PositiveIntegerField(default=0)),
+                ('voters_voted', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('election', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tally', to='votaciones.election')),
+            ],
+        ),
+        migrations.RunPython(backfill_tallies, migrations.RunPython.noop),
+    ]
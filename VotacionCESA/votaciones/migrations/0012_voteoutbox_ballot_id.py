@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votaciones', '0011_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voteoutbox',
+            name='ballot_id',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
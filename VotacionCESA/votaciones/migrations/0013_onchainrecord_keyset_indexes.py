@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votaciones', '0012_voteoutbox_ballot_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='onchainrecord',
+            index=models.Index(fields=['timestamp', 'id'], name='votaciones__timesta_aa117a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='onchainrecord',
+            index=models.Index(fields=['election', 'timestamp', 'id'], name='votaciones__electio_3f68cb_idx'),
+        ),
+    ]
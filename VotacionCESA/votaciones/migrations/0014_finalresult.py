@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votaciones', '0013_onchainrecord_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FinalResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('candidates', models.JSONField(default=list)),
+                ('total_votes', models.PositiveIntegerField(default=0)),
+                ('voters_voted', models.PositiveIntegerField(default=0)),
+                ('eligible_voters', models.PositiveIntegerField(default=0)),
+                ('record_count', models.PositiveIntegerField(default=0)),
+                ('records_digest', models.CharField(max_length=64)),
+                ('frozen_at', models.DateTimeField(auto_now_add=True)),
+                ('election', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='final_result', to='votaciones.election')),
+            ],
+        ),
+    ]
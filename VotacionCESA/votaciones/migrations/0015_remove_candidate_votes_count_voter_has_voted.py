@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votaciones', '0014_finalresult'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='candidate',
+            name='votes_count',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='has_voted',
+        ),
+    ]
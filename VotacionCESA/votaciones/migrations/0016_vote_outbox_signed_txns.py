@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votaciones', '0015_remove_candidate_votes_count_voter_has_voted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voteoutbox',
+            name='leaf_salt',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='voteoutbox',
+            name='send_id',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='voteoutbox',
+            name='signed_txns',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votaciones', '0016_vote_outbox_signed_txns'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='electiontally',
+            name='voters_voted',
+        ),
+        migrations.RemoveField(
+            model_name='finalresult',
+            name='voters_voted',
+        ),
+    ]
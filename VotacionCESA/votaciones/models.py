@@ -1,5 +1,8 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -12,7 +15,6 @@ class Candidate(models.Model):
     # change the field type to ImageField so Django can manage uploads.
     image_url = models.ImageField(upload_to='candidates/', blank=True, null=True)
     manifesto = models.TextField(blank=True)
-    votes_count = models.PositiveIntegerField(default=0)
     # cada candidate/planilla pertenece a una elección
     election = models.ForeignKey('Election', on_delete=models.CASCADE, null=True, blank=True, related_name='candidates')
 
@@ -45,8 +47,6 @@ class Voter(models.Model):
     is_eligible = models.BooleanField(default=True)
     # optional blockchain address associated with this voter (Algorand address)
     blockchain_address = models.CharField(max_length=128, blank=True, null=True)
-    # indicador simple si ha votado (nota: para multi-elección esto puede evolucionar a tracking por elección)
-    has_voted = models.BooleanField(default=False)
 
     def __str__(self):
         return f"{self.user.username} ({self.control_number})"
@@ -99,29 +99,35 @@ class Vote(models.Model):
                                                self.candidate.id if self.candidate else None)
             else:
                 # fallback to a uuid
-                import uuid
                 txid = str(uuid.uuid4())
-            self.hash_block = txid
-            self.valid = True
-            self.save(update_fields=['hash_block', 'valid'])
-
-            # Create a minimal on-chain record (no voter link) so the public results
-            # can be computed from on-chain-registered entries without exposing voter ids.
-            try:
-                OnChainRecord.objects.create(txid=txid, candidate=self.candidate, election=self.election)
-                # After recording on-chain, remove the direct candidate link to help anonymity
-                self.candidate = None
-                self.save(update_fields=['candidate'])
-            except Exception:
-                # ignore if migration hasn't created this model yet or other issues
-                pass
-
+            self.mark_registered(txid, self.candidate)
             return txid
         except Exception:
             # If blockchain registration fails, keep the vote locally but leave it invalid
             # so an operator can retry registration.
             return None
 
+    def mark_registered(self, txid, candidate, **record_fields):
+        """Marca el voto como registrado en cadena con `txid`.
+
+        Crea el `OnChainRecord` correspondiente (con `record_fields` adicionales, p. ej.
+        los datos de inclusión Merkle) y elimina el vínculo directo votante -> candidato
+        para preservar el anonimato.
+        """
+        self.hash_block = txid
+        self.valid = True
+
+        # Create a minimal on-chain record (no voter link) so the public results
+        # can be computed from on-chain-registered entries without exposing voter ids.
+        try:
+            OnChainRecord.objects.create(txid=txid, candidate=candidate, election=self.election, **record_fields)
+            # After recording on-chain, remove the direct candidate link to help anonymity
+            self.candidate = None
+        except Exception:
+            # ignore if migration hasn't created this model yet or other issues
+            pass
+        self.save(update_fields=['hash_block', 'valid', 'candidate'])
+
 
 class Election(models.Model):
     name = models.CharField(max_length=200)
@@ -150,10 +156,50 @@ class OnChainRecord(models.Model):
     candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='onchain_records')
     election = models.ForeignKey(Election, on_delete=models.CASCADE, null=True, blank=True, related_name='onchain_records')
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Modo de anclaje Merkle: `txid` guarda el hash de la hoja y la transacción real
+    # es la del lote (`merkle_batch.txid`), junto con la prueba de inclusión del voto.
+    merkle_batch = models.ForeignKey('MerkleBatch', on_delete=models.PROTECT, null=True, blank=True, related_name='records')
+    leaf_index = models.PositiveIntegerField(null=True, blank=True)
+    leaf_salt = models.CharField(max_length=64, blank=True)
+    merkle_proof = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        # keyset pagination of api_blockchain_records on (timestamp, id), optionally per election
+        indexes = [
+            models.Index(fields=['timestamp', 'id']),
+            models.Index(fields=['election', 'timestamp', 'id']),
+        ]
 
     def __str__(self):
         return f"OnChainRecord {self.txid} -> {self.candidate}"
 
+    def inclusion_receipt(self):
+        """Recibo verificable de inclusión del voto en el lote anclado, o None."""
+        if not self.merkle_batch_id:
+            return None
+        return {
+            'leaf': self.txid,
+            'salt': self.leaf_salt,
+            'election_id': self.election_id,
+            'candidate_id': self.candidate_id,
+            'leaf_index': self.leaf_index,
+            'proof': self.merkle_proof,
+            'root': self.merkle_batch.root,
+            'anchor_txid': self.merkle_batch.txid,
+        }
+
+
+class MerkleBatch(models.Model):
+    """Lote de votos anclado en la cadena con una sola transacción (raíz Merkle en la nota)."""
+    election = models.ForeignKey(Election, on_delete=models.CASCADE, null=True, blank=True, related_name='merkle_batches')
+    root = models.CharField(max_length=64, unique=True)
+    txid = models.CharField(max_length=200)
+    leaf_count = models.PositiveIntegerField(default=0)
+    anchored_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"MerkleBatch {self.root[:16]}... ({self.leaf_count} votos)"
+
 
 class PDFReport(models.Model):
     """Historial de reportes PDF generados por elección."""
@@ -170,3 +216,133 @@ class PDFReport(models.Model):
     
     def __str__(self):
         return f"Reporte {self.filename} - {self.election.name}"
+
+
+class VoteOutbox(models.Model):
+    """Cola persistente de votos pendientes de enviarse a la blockchain.
+
+    `api_vote` crea una fila por voto dentro de la misma transacción que el `Vote`;
+    el comando `process_vote_outbox` las envía a Algorand en segundo plano y
+    reintenta con backoff exponencial los envíos fallidos.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_CONFIRMED = 'confirmed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendiente'),
+        (STATUS_CONFIRMED, 'Confirmado'),
+        (STATUS_FAILED, 'Fallido'),
+    ]
+
+    receipt_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    vote = models.OneToOneField(Vote, on_delete=models.CASCADE, related_name='outbox')
+    election = models.ForeignKey(Election, on_delete=models.CASCADE, null=True, blank=True, related_name='outbox_entries')
+    # se limpia una vez confirmado el envío, igual que `Vote.candidate`
+    candidate = models.ForeignKey(Candidate, on_delete=models.SET_NULL, null=True, blank=True)
+    # votos emitidos juntos con `api_ballot` (varias elecciones); se envían en un mismo grupo atómico
+    ballot_id = models.UUIDField(null=True, blank=True, db_index=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    txid = models.CharField(max_length=200, blank=True)
+    # envío en curso: las transacciones ya firmadas (base64) se guardan antes de difundirlas y,
+    # si no se supo si se confirmaron, se reenvían tal cual en vez de firmar otras y contar el voto
+    # dos veces; `send_id` agrupa las entradas firmadas juntas (un grupo atómico o un anclaje)
+    send_id = models.UUIDField(null=True, blank=True, db_index=True)
+    signed_txns = models.TextField(blank=True)
+    # sal de la hoja en modo `merkle`, para reconstruir el árbol de un anclaje en curso
+    leaf_salt = models.CharField(max_length=64, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"VoteOutbox {self.receipt_id} [{self.status}]"
+
+
+class ElectionTally(models.Model):
+    """Totales de una elección, actualizados con `F()` en la misma transacción que cada voto.
+
+    Cada votante emite un solo voto por elección (restricción única `voter`,
+    `election`), así que `total_votes` es también el número de votantes que votaron.
+    """
+    election = models.OneToOneField(Election, on_delete=models.CASCADE, related_name='tally')
+    total_votes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Tally {self.election}: {self.total_votes} votos"
+
+
+class CandidateTally(models.Model):
+    """Votos de un candidato, actualizados con `F()` en la misma transacción que cada voto."""
+    candidate = models.OneToOneField(Candidate, on_delete=models.CASCADE, related_name='tally')
+    election = models.ForeignKey(Election, on_delete=models.CASCADE, null=True, blank=True, related_name='candidate_tallies')
+    votes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Tally {self.candidate}: {self.votes} votos"
+
+
+class FinalResult(models.Model):
+    """Resultados finales de una elección cerrada, calculados una sola vez e inmutables.
+
+    Se crean con `final_results.freeze` (comando `close_elections`, o la primera
+    lectura tras `end_date`) y a partir de entonces los endpoints de resultados y el
+    reporte PDF se sirven desde esta fila. `records_digest` es el SHA-256 de los
+    txid de la elección en orden (`timestamp`, `id`).
+    """
+    election = models.OneToOneField(Election, on_delete=models.CASCADE, related_name='final_result')
+    # payload de `api_candidates` para la elección, con los votos finales
+    candidates = models.JSONField(default=list)
+    total_votes = models.PositiveIntegerField(default=0)
+    eligible_voters = models.PositiveIntegerField(default=0)
+    record_count = models.PositiveIntegerField(default=0)
+    records_digest = models.CharField(max_length=64)
+    frozen_at = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('FinalResult is immutable once stored')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"FinalResult {self.election}: {self.total_votes} votos"
+
+
+class IdempotencyRecord(models.Model):
+    """Respuesta almacenada de una petición con cabecera `Idempotency-Key`.
+
+    La fila se crea (sin respuesta) al empezar la primera petición, lo que hace
+    esperar a los duplicados concurrentes, y guarda la respuesta al terminar para
+    devolverla a los reintentos hasta `expires_at`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_records')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.BinaryField(null=True, blank=True)
+    response_content_type = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"IdempotencyRecord {self.key} [{self.response_status or 'en curso'}]"
+
+    @property
+    def completed(self):
+        return self.response_status is not None
@@ -0,0 +1,448 @@
+"""Durable outbox for on-chain vote submission.
+
+`api_vote` only records the vote and an outbox row in the database; the actual
+Algorand submission happens in a background worker (`manage.py process_vote_outbox`)
+that drains due entries with `process_due_entries`. Failed submissions are retried
+with exponential backoff until `VOTE_OUTBOX_MAX_ATTEMPTS` is reached, after which
+the entry is marked as failed so an operator can inspect it.
+
+Due entries are sent as Algorand atomic groups of up to `VOTE_BATCH_SIZE` votes.
+The worker waits for a full group, or for the oldest entry to have waited
+`VOTE_BATCH_WINDOW` seconds, before claiming (see `batch_ready`). In `merkle`
+anchor mode a whole batch is committed with a single transaction carrying its
+Merkle root, and each vote keeps an inclusion proof (see `anchor_entries`).
+A pass broadcasts all of its groups first and then waits for their
+confirmations together (see `confirm_sends`).
+The votes of one multi-election ballot (`api_ballot`) share a `ballot_id` and
+are always claimed and sent in the same atomic group.
+
+The signed transactions are stored on the entries (`signed_txns`, `send_id`)
+before they are broadcast. If the outcome of a send is unknown (the confirmation
+wait timed out, the worker died), the retry re-sends those same bytes, which
+the chain accepts at most once, instead of signing a new transaction that
+would count the votes twice (see `resume_send`).
+
+Configuration (Django settings, all optional):
+ - VOTE_OUTBOX_MAX_ATTEMPTS (default 8)
+ - VOTE_OUTBOX_BACKOFF_BASE seconds (default 2)
+ - VOTE_OUTBOX_BACKOFF_MAX seconds (default 300)
+ - VOTE_OUTBOX_LEASE seconds a claimed entry is hidden from other workers (default 60)
+ - VOTE_BATCH_SIZE votes per atomic group, 1 disables grouping (default 16)
+ - VOTE_BATCH_WINDOW seconds to wait for a group to fill (default 0.5)
+ - VOTE_ANCHOR_MODE 'tx' (one transaction per vote) or 'merkle' (default 'tx')
+ - VOTE_MERKLE_BATCH_SIZE votes per Merkle batch in 'merkle' mode (default 256)
+"""
+from datetime import timedelta
+from typing import Optional
+import logging
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import confirmation
+from . import merkle
+from .models import MerkleBatch, VoteOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def _max_attempts() -> int:
+    return int(getattr(settings, 'VOTE_OUTBOX_MAX_ATTEMPTS', 8))
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    """Return the delay before retry number `attempts` (exponential, capped)."""
+    base = float(getattr(settings, 'VOTE_OUTBOX_BACKOFF_BASE', 2))
+    cap = float(getattr(settings, 'VOTE_OUTBOX_BACKOFF_MAX', 300))
+    return timedelta(seconds=min(cap, base * (2 ** max(attempts - 1, 0))))
+
+
+def enqueue_vote(vote, ballot_id=None, due_at=None) -> VoteOutbox:
+    """Create the outbox entry for `vote`. Call inside the same transaction as the vote.
+
+    Entries of one ballot get the same `ballot_id` and `due_at` so they are
+    claimed together.
+    """
+    return VoteOutbox.objects.create(vote=vote, election=vote.election, candidate=vote.candidate,
+                                     ballot_id=ballot_id, next_attempt_at=due_at or timezone.now())
+
+
+def claim_due_entries(limit: int = 50):
+    """Claim up to `limit` pending entries whose next attempt is due.
+
+    Claimed rows get a short lease (their `next_attempt_at` is pushed forward) in
+    a brief transaction, so several workers can drain the outbox concurrently
+    without double-sending and without holding locks during network I/O. If a
+    worker dies mid-batch the lease simply expires and the entries become due again.
+    The due siblings of every claimed ballot or in-flight send are claimed too,
+    even past `limit`.
+
+    The lease value (`next_attempt_at`) identifies the owner: `renew_lease`,
+    `mark_confirmed` and `mark_failed_attempt` only touch rows that still carry
+    the lease this worker set, so a worker that overran its lease never records
+    or reschedules entries another worker has claimed since.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=float(getattr(settings, 'VOTE_OUTBOX_LEASE', 60)))
+    with transaction.atomic():
+        entries = list(VoteOutbox.objects
+                       .select_for_update(skip_locked=True)
+                       .filter(status=VoteOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+                       .order_by('next_attempt_at', 'id')[:limit])
+        ballots = {e.ballot_id for e in entries if e.ballot_id}
+        sends = {e.send_id for e in entries if e.send_id}
+        if ballots or sends:
+            entries += list(VoteOutbox.objects
+                            .select_for_update(skip_locked=True)
+                            .filter(Q(ballot_id__in=ballots) | Q(send_id__in=sends),
+                                    status=VoteOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+                            .exclude(pk__in=[e.pk for e in entries]))
+        if entries:
+            VoteOutbox.objects.filter(pk__in=[e.pk for e in entries]).update(next_attempt_at=now + lease)
+    return list(VoteOutbox.objects
+                .select_related('vote', 'election', 'candidate')
+                .filter(pk__in=[e.pk for e in entries])
+                .order_by('id'))
+
+
+def _owned(entry: VoteOutbox):
+    """Queryset of `entry` while it is still pending under the lease this worker holds."""
+    return VoteOutbox.objects.filter(pk=entry.pk, status=VoteOutbox.STATUS_PENDING, next_attempt_at=entry.next_attempt_at)
+
+
+def renew_lease(entries) -> bool:
+    """Extend the lease of `entries` (claimed together) before a send; False if any was lost."""
+    lease = timedelta(seconds=float(getattr(settings, 'VOTE_OUTBOX_LEASE', 60)))
+    until = timezone.now() + lease
+    renewed = 0
+    for entry in entries:
+        if _owned(entry).update(next_attempt_at=until):
+            entry.next_attempt_at = until
+            renewed += 1
+    if renewed != len(entries):
+        logger.warning('vote outbox: lease lost on %s of %s entries; leaving them to their new owner',
+                       len(entries) - renewed, len(entries))
+        return False
+    return True
+
+
+class LeaseLost(Exception):
+    """Raised from `on_signed` to abort a send whose entries another worker has claimed."""
+
+
+def persist_signed(entries, txids, signed_txns: str, salts=None) -> None:
+    """`on_signed` callback: store the signed transactions of `entries` before they are broadcast.
+
+    All or nothing; raises `LeaseLost` (so nothing is sent) if any entry is no longer ours.
+    """
+    send_id = uuid.uuid4()
+    salts = salts or [''] * len(entries)
+    with transaction.atomic():
+        owned = sum(_owned(entry).update(send_id=send_id, txid=txid, signed_txns=signed_txns, leaf_salt=salt,
+                                         updated_at=timezone.now())
+                    for entry, txid, salt in zip(entries, txids, salts))
+        if owned != len(entries):
+            raise LeaseLost(f'lease lost on {len(entries) - owned} of {len(entries)} entries before sending')
+    for entry, txid, salt in zip(entries, txids, salts):
+        entry.send_id, entry.txid, entry.signed_txns, entry.leaf_salt = send_id, txid, signed_txns, salt
+
+
+def _clear_signed(entries) -> None:
+    """Forget a send that can never be confirmed, so the next attempt signs a new one."""
+    for entry in entries:
+        if _owned(entry).update(send_id=None, txid='', signed_txns='', leaf_salt='', updated_at=timezone.now()):
+            entry.send_id, entry.txid, entry.signed_txns, entry.leaf_salt = None, '', '', ''
+
+
+def mark_confirmed(entry: VoteOutbox, txid: str) -> bool:
+    """Record a successful submission for `entry` and anonymize the local links.
+
+    Returns False, recording nothing, when the entry is no longer ours (see `claim_due_entries`).
+    """
+    with transaction.atomic():
+        if not _owned(entry).update(status=VoteOutbox.STATUS_CONFIRMED, txid=txid, candidate=None, last_error='',
+                                    send_id=None, signed_txns='', leaf_salt='', updated_at=timezone.now()):
+            logger.warning('vote outbox %s: lease lost before confirmation was recorded', entry.receipt_id)
+            return False
+        entry.vote.mark_registered(txid, entry.candidate)
+        entry.status = VoteOutbox.STATUS_CONFIRMED
+        entry.txid = txid
+        entry.candidate = None
+        entry.last_error = ''
+    return True
+
+
+def mark_failed_attempt(entry: VoteOutbox, error: Exception, now=None) -> None:
+    """Schedule a retry for `entry`, or mark it failed after the last attempt (if it is still ours).
+
+    A stored signed send is kept, so the retry re-sends it (see `resume_send`).
+    Entries sent together pass the same `now` so they stay due together.
+    """
+    attempts = entry.attempts + 1
+    last_error = str(error)[:1000]
+    if attempts >= _max_attempts():
+        status, next_attempt_at = VoteOutbox.STATUS_FAILED, entry.next_attempt_at
+    else:
+        status, next_attempt_at = VoteOutbox.STATUS_PENDING, (now or timezone.now()) + backoff_delay(attempts)
+    if not _owned(entry).update(attempts=attempts, last_error=last_error, status=status,
+                                next_attempt_at=next_attempt_at, updated_at=timezone.now()):
+        return
+    entry.attempts, entry.last_error, entry.status, entry.next_attempt_at = attempts, last_error, status, next_attempt_at
+    if status == VoteOutbox.STATUS_FAILED:
+        logger.error('vote outbox %s failed permanently after %s attempts: %s',
+                     entry.receipt_id, entry.attempts, entry.last_error)
+    else:
+        logger.warning('vote outbox %s attempt %s failed, retrying at %s: %s',
+                       entry.receipt_id, entry.attempts, entry.next_attempt_at, entry.last_error)
+
+
+def _send_failed(entries, error: Exception) -> None:
+    if isinstance(error, confirmation.TransactionRejected):
+        # dropped from the pool: re-sending the same bytes cannot succeed
+        _clear_signed(entries)
+    now = timezone.now()
+    for entry in entries:
+        mark_failed_attempt(entry, error, now)
+
+
+# A broadcast awaiting confirmation: (entries, txids to wait on, record), where
+# `record()` stores the confirmation and returns how many entries it confirmed.
+# Every send of a pass is broadcast first and then all of them are waited on
+# together (see `confirm_sends`), so a pass takes about one confirmation wait
+# instead of one per group.
+
+
+def submit_entries(entries):
+    """Broadcast `entries` as one transaction, or one atomic group, without waiting.
+
+    Returns the pending send, or None when the send failed (a retry is scheduled)
+    or the lease was lost. A group is all-or-nothing on chain, so a failed send
+    schedules a retry for every entry in it.
+    """
+    from . import algorand_integration
+
+    if not renew_lease(entries):
+        return None
+
+    def on_signed(txids, signed_txns):
+        persist_signed(entries, txids, signed_txns)
+
+    try:
+        if len(entries) == 1:
+            txids = [algorand_integration.send_vote_tx(entries[0].election_id, entries[0].candidate_id,
+                                                       wait_for_confirmation=False, on_signed=on_signed)]
+        else:
+            txids = algorand_integration.send_vote_group([(e.election_id, e.candidate_id) for e in entries],
+                                                         wait_for_confirmation=False, on_signed=on_signed)
+    except Exception as e:
+        _send_failed(entries, e)
+        return None
+    # every transaction of a group is confirmed in the same round
+    return entries, txids[:1], lambda: sum(mark_confirmed(entry, txid) for entry, txid in zip(entries, txids))
+
+
+def anchor_entries(entries):
+    """Anchor `entries` (all of one election) as a single Merkle batch, without waiting.
+
+    Each vote becomes a salted leaf; only the root is sent on chain. Once
+    confirmed, every `OnChainRecord` keeps its leaf hash (as `txid`), salt and
+    inclusion proof so the voter can later verify the receipt against the
+    anchored root. Returns the pending send, or None like `submit_entries`.
+    """
+    from . import algorand_integration
+
+    salts = [merkle.new_salt() for _ in entries]
+    _, root, _ = _merkle_tree(entries, salts)
+    counts = {}
+    for entry in entries:
+        counts[entry.candidate_id] = counts.get(entry.candidate_id, 0) + 1
+
+    if not renew_lease(entries):
+        return None
+    try:
+        txid = algorand_integration.send_anchor_tx(
+            entries[0].election_id, root, counts, wait_for_confirmation=False,
+            on_signed=lambda txids, signed_txns: persist_signed(entries, txids * len(entries), signed_txns, salts))
+    except Exception as e:
+        _send_failed(entries, e)
+        return None
+    return entries, [txid], lambda: _record_anchor(entries, txid, salts)
+
+
+def _merkle_tree(entries, salts):
+    leaves = [merkle.leaf_hash(e.election_id, e.candidate_id, salt) for e, salt in zip(entries, salts)]
+    root, proofs = merkle.build_tree(leaves)
+    return leaves, root, proofs
+
+
+def _record_anchor(entries, txid: str, salts) -> int:
+    """Record the confirmed anchor `txid` of `entries`; the tree is rebuilt from their salts."""
+    leaves, root, proofs = _merkle_tree(entries, salts)
+    with transaction.atomic():
+        # all or nothing: a batch whose entries were partly re-claimed is left to the new owner
+        owned = sum(_owned(e).update(status=VoteOutbox.STATUS_CONFIRMED, txid=txid, candidate=None, last_error='',
+                                     send_id=None, signed_txns='', leaf_salt='', updated_at=timezone.now())
+                    for e in entries)
+        if owned != len(entries):
+            transaction.set_rollback(True)
+            logger.warning('vote outbox: lease lost before anchor %s was recorded', txid)
+            return 0
+        batch = MerkleBatch.objects.create(election_id=entries[0].election_id, root=root, txid=txid, leaf_count=len(entries))
+        for index, (entry, leaf, salt, proof) in enumerate(zip(entries, leaves, salts, proofs)):
+            entry.vote.mark_registered(leaf, entry.candidate, merkle_batch=batch, leaf_index=index,
+                                       leaf_salt=salt, merkle_proof=proof)
+            entry.status = VoteOutbox.STATUS_CONFIRMED
+            entry.txid = txid
+            entry.candidate = None
+            entry.last_error = ''
+    return len(entries)
+
+
+def confirm_sends(sends) -> int:
+    """Wait for every pending send of a pass together and record the outcome. Returns how many were confirmed.
+
+    A send whose wait fails keeps its signed transactions, so the retry re-sends them.
+    """
+    from . import algorand_integration
+
+    sends = [send for send in sends if send and renew_lease(send[0])]
+    if not sends:
+        return 0
+    errors = algorand_integration.wait_for_confirmations([txid for _, txids, _ in sends for txid in txids])
+    confirmed = 0
+    for entries, txids, record in sends:
+        error = next((errors[txid] for txid in txids if txid in errors), None)
+        if error is None:
+            confirmed += record()
+        else:
+            _send_failed(entries, error)
+    return confirmed
+
+
+def resume_send(entries):
+    """Resume an earlier send of `entries` (one `send_id`) by re-sending its stored signed transactions.
+
+    Returns the pending send (already recorded and waited for when the chain
+    has it), None when it failed or cannot be resumed yet, or `entries`
+    themselves when the stored send expired unconfirmed and was cleared, so the
+    caller sends them anew.
+    """
+    from . import algorand_integration
+
+    if entries[0].leaf_salt and VoteOutbox.objects.filter(send_id=entries[0].send_id).count() != len(entries):
+        # the tree needs every leaf of the anchor; try again once all are claimed together
+        logger.warning('vote outbox: anchor %s is only partly claimed; skipping it this pass', entries[0].txid)
+        return None
+    if not renew_lease(entries):
+        return None
+    try:
+        state = algorand_integration.resend_signed(entries[0].signed_txns)
+    except Exception as e:
+        _send_failed(entries, e)
+        return None
+    if state == algorand_integration.EXPIRED:
+        _clear_signed(entries)
+        return entries
+    if entries[0].leaf_salt:
+        txid = entries[0].txid
+        record = lambda: _record_anchor(entries, txid, [e.leaf_salt for e in entries])
+    else:
+        record = lambda: sum(mark_confirmed(entry, entry.txid) for entry in entries)
+    txids = [] if state == algorand_integration.IN_LEDGER else sorted({e.txid for e in entries})
+    return entries, txids, record
+
+
+def _resume_in_flight(entries):
+    """Resume the in-flight sends among `entries`; returns (pending sends, entries left to send)."""
+    in_flight, fresh, sends = {}, [], []
+    for entry in entries:
+        if entry.send_id:
+            in_flight.setdefault(entry.send_id, []).append(entry)
+        else:
+            fresh.append(entry)
+    for unit in in_flight.values():
+        result = resume_send(unit)
+        if result is unit:
+            fresh += unit
+        else:
+            sends.append(result)
+    return sends, sorted(fresh, key=lambda e: e.id)
+
+
+def _anchor_mode() -> str:
+    return getattr(settings, 'VOTE_ANCHOR_MODE', 'tx')
+
+
+def _group_size() -> int:
+    from .algorand_integration import MAX_GROUP_SIZE
+
+    if _anchor_mode() == 'merkle':
+        return max(1, int(getattr(settings, 'VOTE_MERKLE_BATCH_SIZE', 256)))
+    size = int(getattr(settings, 'VOTE_BATCH_SIZE', MAX_GROUP_SIZE))
+    return max(1, min(size, MAX_GROUP_SIZE))
+
+
+def batch_ready(group_size: Optional[int] = None, window: Optional[float] = None) -> bool:
+    """Return True when a full group is due or the oldest due entry waited `window` seconds."""
+    group_size = group_size or _group_size()
+    if window is None:
+        window = float(getattr(settings, 'VOTE_BATCH_WINDOW', 0.5))
+    now = timezone.now()
+    due = VoteOutbox.objects.filter(status=VoteOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+    if due[:group_size].count() >= group_size:
+        return True
+    oldest = due.order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+    return oldest is not None and oldest <= now - timedelta(seconds=window)
+
+
+def _groups(entries, group_size: int):
+    """Split `entries` into groups of at most `group_size`, never splitting a ballot."""
+    units, by_ballot = [], {}
+    for entry in entries:
+        if entry.ballot_id is None:
+            units.append([entry])
+        elif entry.ballot_id in by_ballot:
+            by_ballot[entry.ballot_id].append(entry)
+        else:
+            by_ballot[entry.ballot_id] = [entry]
+            units.append(by_ballot[entry.ballot_id])
+    groups, current = [], []
+    for unit in units:
+        if current and len(current) + len(unit) > group_size:
+            groups.append(current)
+            current = []
+        current = current + unit
+    if current:
+        groups.append(current)
+    return groups
+
+
+def process_due_entries(limit: int = 64, group_size: Optional[int] = None) -> dict:
+    """Drain one batch of due entries. Returns a summary dict for logging.
+
+    In the default `tx` anchor mode entries are submitted in atomic groups of
+    `group_size` (default `VOTE_BATCH_SIZE`); a group size of 1 uses the
+    single-transaction path. In `merkle` mode each election's entries are
+    anchored as Merkle batches of up to `VOTE_MERKLE_BATCH_SIZE` votes.
+    In-flight sends are resumed first (see `resume_send`). Every send is
+    broadcast before any is waited on (see `confirm_sends`).
+    """
+    group_size = group_size or _group_size()
+    if _anchor_mode() == 'merkle':
+        entries = claim_due_entries(max(limit, group_size))
+        sends, fresh = _resume_in_flight(entries)
+        by_election = {}
+        for entry in fresh:
+            by_election.setdefault(entry.election_id, []).append(entry)
+        for election_entries in by_election.values():
+            for i in range(0, len(election_entries), group_size):
+                sends.append(anchor_entries(election_entries[i:i + group_size]))
+    else:
+        entries = claim_due_entries(limit)
+        sends, fresh = _resume_in_flight(entries)
+        sends += [submit_entries(group) for group in _groups(fresh, group_size)]
+    confirmed = confirm_sends(sends)
+    return {'processed': len(entries), 'confirmed': confirmed, 'failed': len(entries) - confirmed}
@@ -0,0 +1,230 @@
+"""In-process cache of the reference data: elections, candidates and their members.
+
+These rows almost never change while people vote, so each worker loads them
+all at once (two queries) into immutable `ElectionRef` / `CandidateRef` /
+`MemberRef` tuples. The results payloads, the active-election lookups and
+the PDF report then read them from memory. Only the tallies are still
+queried per request.
+
+A snapshot is dropped when:
+
+ - the ``reference`` results version changes. It is bumped by `post_save`
+   and `post_delete` of `Election`, `Candidate` and `CandidateMember` in
+   whichever worker made the change, and shared through the ``results``
+   cache (see `results_cache`);
+ - the next election boundary passes, i.e. the earliest start or end date
+   after the load, since that is when the active election changes.
+
+Async views use the `a`-prefixed accessors, which check the version and load
+the snapshot with the cache's and the ORM's async APIs.
+"""
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import metrics
+from . import results_cache
+from .models import Candidate, CandidateMember, Election
+
+SCOPE = 'reference'
+
+
+class ElectionRef(NamedTuple):
+    id: int
+    name: str
+    start_date: datetime
+    end_date: datetime
+
+    def is_active(self, now=None) -> bool:
+        now = now or timezone.now()
+        return self.start_date <= now <= self.end_date
+
+
+class MemberRef(NamedTuple):
+    full_name: str
+    role: str
+
+
+class CandidateRef(NamedTuple):
+    id: int
+    election_id: Optional[int]
+    name: str
+    list_name: str
+    image_url: str
+    manifesto: str
+    members: Tuple[MemberRef, ...]
+
+    def data(self, votes: int) -> dict:
+        """The candidate in the `api_candidates` payload shape, with `votes` as its count."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'list_name': self.list_name,
+            'image_url': self.image_url,
+            'manifesto': self.manifesto,
+            'votes_count': votes,
+            'members': [{'full_name': m.full_name, 'role': m.role} for m in self.members],
+        }
+
+
+class Snapshot(NamedTuple):
+    version: str
+    expires_at: Optional[datetime]
+    # by id, as `.first()` without ordering would pick them
+    elections: Tuple[ElectionRef, ...]
+    candidates: Tuple[CandidateRef, ...]
+
+
+_snapshot: Optional[Snapshot] = None
+_lock = threading.Lock()
+_counters = {'hits': 0, 'loads': 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def _election_rows():
+    return Election.objects.order_by('id').values_list('id', 'name', 'start_date', 'end_date')
+
+
+def _candidate_rows():
+    # candidates and their members in one query: one row per member, or one with NULLs
+    return (Candidate.objects.order_by('id', 'members__order', 'members__id')
+            .values_list('id', 'election_id', 'name', 'list_name', 'image_url', 'manifesto',
+                         'members__full_name', 'members__role'))
+
+
+def _load(version: str, now: datetime) -> Snapshot:
+    return _build(version, now, list(_election_rows()), list(_candidate_rows()))
+
+
+async def _aload(version: str, now: datetime) -> Snapshot:
+    return _build(version, now, [row async for row in _election_rows()], [row async for row in _candidate_rows()])
+
+
+def _build(version: str, now: datetime, election_rows, rows) -> Snapshot:
+    elections = tuple(ElectionRef(*row) for row in election_rows)
+    storage = Candidate._meta.get_field('image_url').storage
+    candidates: Dict[int, list] = {}
+    for cid, election_id, name, list_name, image, manifesto, member_name, role in rows:
+        if cid not in candidates:
+            candidates[cid] = [cid, election_id, name, list_name, storage.url(image) if image else '', manifesto, []]
+        if member_name is not None:
+            candidates[cid][6].append(MemberRef(member_name, role))
+    boundaries = [t for e in elections for t in (e.start_date, e.end_date) if t > now]
+    return Snapshot(
+        version=version,
+        expires_at=min(boundaries) if boundaries else None,
+        elections=elections,
+        candidates=tuple(CandidateRef(*c[:6], tuple(c[6])) for c in candidates.values()),
+    )
+
+
+def _valid(current: Optional[Snapshot], version: str, now: datetime) -> bool:
+    return current is not None and current.version == version and (current.expires_at is None or now < current.expires_at)
+
+
+def snapshot(now: Optional[datetime] = None) -> Snapshot:
+    """The current reference data, reloaded when its version changed or a boundary passed."""
+    global _snapshot
+    now = now or timezone.now()
+    version = results_cache.version(SCOPE)
+    current = _snapshot
+    if _valid(current, version, now):
+        _count('hits')
+        return current
+    with _lock:
+        current = _snapshot
+        if not _valid(current, version, now):
+            current = _snapshot = _load(version, now)
+            _count('loads')
+        return current
+
+
+async def asnapshot(now: Optional[datetime] = None) -> Snapshot:
+    """`snapshot` for async views. Concurrent reloads may each run; the last one is kept."""
+    global _snapshot
+    now = now or timezone.now()
+    version = await results_cache.aversion(SCOPE)
+    current = _snapshot
+    if _valid(current, version, now):
+        _count('hits')
+        return current
+    current = _snapshot = await _aload(version, now)
+    _count('loads')
+    return current
+
+
+def elections() -> Tuple[ElectionRef, ...]:
+    return snapshot().elections
+
+
+async def aelections() -> Tuple[ElectionRef, ...]:
+    return (await asnapshot()).elections
+
+
+def election(election_id: int) -> Optional[ElectionRef]:
+    return next((e for e in snapshot().elections if e.id == election_id), None)
+
+
+async def aelection(election_id: int) -> Optional[ElectionRef]:
+    return next((e for e in (await asnapshot()).elections if e.id == election_id), None)
+
+
+def active_election(now: Optional[datetime] = None) -> Optional[ElectionRef]:
+    """The election open at `now` (the first by id if several are)."""
+    now = now or timezone.now()
+    return _active(snapshot(now), now)
+
+
+async def aactive_election(now: Optional[datetime] = None) -> Optional[ElectionRef]:
+    now = now or timezone.now()
+    return _active(await asnapshot(now), now)
+
+
+def _active(current: Snapshot, now: datetime) -> Optional[ElectionRef]:
+    return next((e for e in current.elections if e.is_active(now)), None)
+
+
+def candidates(election_id: Optional[int] = None, include_unassigned: bool = False) -> Tuple[CandidateRef, ...]:
+    """Candidates of `election_id` (plus those without an election if asked), or all of them."""
+    return _candidates(snapshot(), election_id, include_unassigned)
+
+
+async def acandidates(election_id: Optional[int] = None, include_unassigned: bool = False) -> Tuple[CandidateRef, ...]:
+    return _candidates(await asnapshot(), election_id, include_unassigned)
+
+
+def _candidates(current: Snapshot, election_id: Optional[int], include_unassigned: bool) -> Tuple[CandidateRef, ...]:
+    if election_id is None:
+        return current.candidates
+    return tuple(c for c in current.candidates
+                 if c.election_id == election_id or (include_unassigned and c.election_id is None))
+
+
+def stats() -> dict:
+    current = _snapshot
+    with _counters_lock:
+        counters = dict(_counters)
+    return dict(counters, elections=len(current.elections) if current else 0,
+                candidates=len(current.candidates) if current else 0,
+                expires_at=current.expires_at.isoformat() if current and current.expires_at else None)
+
+
+metrics.register('reference_data', stats)
+
+
+@receiver([post_save, post_delete], sender=Election)
+@receiver([post_save, post_delete], sender=Candidate)
+@receiver([post_save, post_delete], sender=CandidateMember)
+def _on_reference_change(sender, **kwargs):
+    results_cache.bump(SCOPE)
+    transaction.on_commit(lambda: results_cache.bump(SCOPE), robust=True)
@@ -0,0 +1,313 @@
+"""Shared cache for the public results payloads (`api_candidates`, `api_stats`, `api_elections`).
+
+Entries live in the ``results`` cache (`CACHES`; file-based by default, or the
+database with ``RESULTS_CACHE_BACKEND=db``), so every gunicorn worker shares
+them. An entry is keyed by endpoint, parameters and the current *results
+versions* of the scopes it depends on:
+
+ - ``e<id>``: bumped when a vote for election <id> is committed;
+ - ``all``: bumped by every vote (payloads for "the active election");
+ - ``meta``: bumped when elections, candidates, members or voters change.
+
+Bumping a version makes the next read build a fresh entry; old entries simply
+expire. Votes bump once their transaction commits (no cache I/O inside the
+vote transaction, and nothing built from the committed vote is cached under an
+older version); model changes bump inside their transaction and again once it
+commits, so a rebuild that raced with the commit is never kept. A read that finds no entry
+for the current versions rebuilds it only if it wins the rebuild lock; while
+that one request rebuilds, the others keep serving the latest entry of a
+previous version (or, when there is none, wait up to `BUILD_WAIT` seconds for
+the lock holder's entry), so a bump under load does not start a rebuild stampede.
+
+An entry is fresh for `RESULTS_CACHE_TTL` seconds. After that it is still
+served, for up to `RESULTS_CACHE_STALE` more seconds, while one worker (the one
+that wins the rebuild lock) recomputes it in a background thread. The lock is a
+`cache.add`, atomic only with the database backend: the file backend checks and
+then writes, so under load two workers may occasionally rebuild the same entry.
+That only costs a duplicate computation, since both store the same payload.
+
+Entries hold the serialized JSON, a strong ETag and, for bodies of at least
+`RESULTS_GZIP_MIN_BYTES`, a gzipped copy. The ETag is derived from the
+endpoint, its parameters and the versions the entry was built for (plus the
+current election period, since an election opening or closing changes the
+payloads without a bump), so `json_response` answers a matching
+`If-None-Match` with 304 before looking up or building the entry. It sends
+the gzipped body to clients that accept it. Bytes sent versus uncompressed bytes per endpoint are
+published under ``results_http``.
+"""
+from typing import Callable, Dict, Iterable, Optional
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags, patch_vary_headers
+
+from . import metrics
+from .models import Candidate, CandidateMember, Election, Voter
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'results'
+# Seconds a rebuild lock is held at most (a crashed rebuild frees it after this).
+LOCK_TIMEOUT = 30
+# Seconds a read with nothing to serve waits for another worker's rebuild before building itself.
+BUILD_WAIT = 5
+
+_counters = {'hits': 0, 'stale': 0, 'misses': 0, 'rebuilds': 0}
+_http: Dict[str, Dict[str, int]] = {}
+_counters_lock = threading.Lock()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _count(name: str):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def _version_key(scope: str) -> str:
+    return f'results:version:{scope}'
+
+
+def _versions(scopes: Iterable[str]) -> str:
+    cache = _cache()
+    keys = [_version_key(s) for s in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # unknown (first use, or evicted): start from a fresh random version
+            cache.add(key, uuid.uuid4().hex[:12], None)
+            found[key] = cache.get(key)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def version(scope: str) -> str:
+    """Current results version of `scope`; it changes whenever the scope is bumped."""
+    return _versions((scope,))
+
+
+async def aversion(scope: str) -> str:
+    """`version` through the cache's async API, for async views."""
+    cache = _cache()
+    key = _version_key(scope)
+    value = await cache.aget(key)
+    if value is None:
+        await cache.aadd(key, uuid.uuid4().hex[:12], None)
+        value = await cache.aget(key)
+    return str(value)
+
+
+def bump(*scopes: str):
+    """Invalidate every entry that depends on one of `scopes`."""
+    _cache().set_many({_version_key(s): uuid.uuid4().hex[:12] for s in scopes}, None)
+
+
+def bump_for_vote(election_id: Optional[int]):
+    """Invalidate the results of `election_id` once the vote's transaction commits."""
+    scopes = ('all', f'e{election_id}') if election_id else ('all',)
+    transaction.on_commit(lambda: bump(*scopes), robust=True)
+
+
+def _period() -> str:
+    """When the elections' open/closed status next changes (see `reference_data`)."""
+    from . import reference_data
+
+    expires_at = reference_data.snapshot().expires_at
+    return str(int(expires_at.timestamp())) if expires_at else '-'
+
+
+def _state(scopes: Iterable[str]) -> str:
+    """Everything a payload of `scopes` depends on: their versions and the election period."""
+    return f'{_versions(scopes)}.{_period()}'
+
+
+def _etag(name: str, params: str, state: str) -> str:
+    return hashlib.sha256(f'{name}\0{params}\0{state}'.encode()).hexdigest()[:32]
+
+
+def scopes_for(election_id=None):
+    """Scopes of a payload for `election_id`, or for the active election / all elections."""
+    return (f'e{election_id}', 'meta') if election_id else ('all', 'meta')
+
+
+def get_or_build(name: str, params: str, scopes: Iterable[str], builder: Callable[[], dict]) -> dict:
+    """Return the cached payload for (`name`, `params`), building it with `builder` when needed."""
+    return get_entry(name, params, scopes, builder)['value']
+
+
+def get_entry(name: str, params: str, scopes: Iterable[str], builder: Callable[[], dict],
+              state: Optional[str] = None) -> dict:
+    """Like `get_or_build`, but return the whole entry: value, body, etag and gzip body.
+
+    `state` is `_state(scopes)` when the caller already computed it.
+    """
+    if not getattr(settings, 'RESULTS_CACHE_ENABLED', True):
+        return _entry(name, builder())
+    cache = _cache()
+    state = state or _state(scopes)
+    etag = _etag(name, params, state)
+    base = f'results:{name}:{params}'
+    key = f'{base}:{state}'
+    lock = base + ':lock'
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None:
+        if now < entry['fresh_until']:
+            _count('hits')
+            return entry
+        _count('stale')
+        # best-effort with the file backend (see the module docstring)
+        if cache.add(lock, 1, LOCK_TIMEOUT):
+            threading.Thread(target=_rebuild_in_background, args=(key, base, name, etag, builder), daemon=True).start()
+        return entry
+
+    _count('misses')
+    if cache.add(lock, 1, LOCK_TIMEOUT):
+        try:
+            return _store(key, base, name, builder(), etag)
+        finally:
+            cache.delete(lock)
+    # another worker is rebuilding: serve what it is replacing
+    previous = cache.get(base + ':latest')
+    if previous is not None:
+        _count('stale')
+        return previous
+    return _wait_for_rebuild(key, base, name, etag, builder)
+
+
+def _wait_for_rebuild(key: str, base: str, name: str, etag: str, builder: Callable[[], dict]) -> dict:
+    cache = _cache()
+    deadline = time.monotonic() + BUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key) or cache.get(base + ':latest')
+        if entry is not None:
+            return entry
+    return _store(key, base, name, builder(), etag)
+
+
+def _entry(name: str, value: dict, etag: Optional[str] = None) -> dict:
+    body = json.dumps(value, cls=DjangoJSONEncoder).encode('utf-8')
+    # uncached entries have no versions to derive it from
+    etag = etag or hashlib.sha256(name.encode() + b'\0' + body).hexdigest()[:32]
+    compressed = None
+    if len(body) >= int(getattr(settings, 'RESULTS_GZIP_MIN_BYTES', 1024)):
+        compressed = gzip.compress(body, compresslevel=6, mtime=0)
+    return {'value': value, 'body': body, 'etag': etag, 'gzip': compressed}
+
+
+def _store(key: str, base: str, name: str, value: dict, etag: str) -> dict:
+    """Store `value` under `key` and as the latest entry of `base` (whatever its versions)."""
+    ttl = float(getattr(settings, 'RESULTS_CACHE_TTL', 5))
+    stale = float(getattr(settings, 'RESULTS_CACHE_STALE', 60))
+    entry = dict(_entry(name, value, etag), fresh_until=time.time() + ttl)
+    _cache().set_many({key: entry, base + ':latest': entry}, ttl + stale)
+    return entry
+
+
+def _rebuild_in_background(key: str, base: str, name: str, etag: str, builder: Callable[[], dict]):
+    try:
+        _store(key, base, name, builder(), etag)
+        _count('rebuilds')
+    except Exception:
+        logger.exception('results cache: rebuild of %s failed', key)
+    finally:
+        _cache().delete(base + ':lock')
+        connections.close_all()
+
+
+def json_response(request, name: str, params: str, scopes: Iterable[str], builder: Callable[[], dict]) -> HttpResponse:
+    """The cached payload as a JSON response with ETag, 304 on `If-None-Match`, and gzip when accepted."""
+    if_none_match = request.headers.get('If-None-Match')
+    state = None
+    if getattr(settings, 'RESULTS_CACHE_ENABLED', True):
+        state = _state(scopes)
+        if if_none_match:
+            # the current ETag is known from the versions alone: no lookup, no build
+            tag = _etag(name, params, state)
+            for etag in ('"%s"' % tag, '"%s-gz"' % tag):
+                if _matches(if_none_match, etag):
+                    response = HttpResponseNotModified()
+                    response['ETag'] = etag
+                    response['Cache-Control'] = 'no-cache'
+                    patch_vary_headers(response, ('Accept-Encoding',))
+                    _count_http(name, 304, 0, 0)
+                    return response
+
+    entry = get_entry(name, params, scopes, builder, state)
+    use_gzip = entry['gzip'] is not None and 'gzip' in request.headers.get('Accept-Encoding', '')
+    # each encoding of the body gets its own strong validator
+    etag = '"%s%s"' % (entry['etag'], '-gz' if use_gzip else '')
+    if if_none_match and _matches(if_none_match, etag):
+        # e.g. the previous version, served while it is rebuilt
+        response = HttpResponseNotModified()
+        sent = 0
+    else:
+        body = entry['gzip'] if use_gzip else entry['body']
+        response = HttpResponse(body, content_type='application/json')
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        sent = len(body)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    if entry['gzip'] is not None:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    _count_http(name, response.status_code, sent, len(entry['body']))
+    return response
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    return etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+
+
+def _count_http(name: str, status: int, sent: int, uncompressed: int):
+    with _counters_lock:
+        counters = _http.setdefault(name, {'requests': 0, 'not_modified': 0, 'bytes_sent': 0, 'bytes_uncompressed': 0})
+        counters['requests'] += 1
+        counters['not_modified'] += status == 304
+        counters['bytes_sent'] += sent
+        counters['bytes_uncompressed'] += uncompressed
+
+
+def stats() -> dict:
+    with _counters_lock:
+        return dict(_counters)
+
+
+def http_stats() -> dict:
+    """Per endpoint: requests, 304s, bytes sent and the bytes a full uncompressed body would have been.
+
+    A 304 answered from the versions alone never sees the body, so it adds no uncompressed bytes.
+    """
+    with _counters_lock:
+        data = {}
+        for name, c in _http.items():
+            data[name] = dict(c, bytes_per_poll=round(c['bytes_sent'] / c['requests'], 1),
+                              uncompressed_bytes_per_poll=round(c['bytes_uncompressed'] / c['requests'], 1))
+        return data
+
+
+metrics.register('results_cache', stats)
+metrics.register('results_http', http_stats)
+
+
+@receiver([post_save, post_delete], sender=Election)
+@receiver([post_save, post_delete], sender=Candidate)
+@receiver([post_save, post_delete], sender=CandidateMember)
+@receiver([post_save, post_delete], sender=Voter)
+def _on_results_change(sender, **kwargs):
+    bump('meta')
+    transaction.on_commit(lambda: bump('meta'), robust=True)
@@ -0,0 +1,113 @@
+"""Static export of the published results of a closed election.
+
+`export_election` renders `resultados.html` and `blockchain.html` with the
+election's bootstrap payload embedded (as `PublicPageView` does). It writes
+them to ``<root>/<election id>/`` together with the API payloads they stand
+for:
+
+ - ``bootstrap.json``, ``candidates.json``, ``stats.json``: the `api_bootstrap`,
+   `api_candidates` and `api_stats` payloads of the election;
+ - ``records-<n>.json``: the election's `api_blockchain_records` pages, newest
+   first. The exported explorer pages back through them instead of the API.
+
+Every file also gets a precompressed ``.gz`` copy, so a front proxy serves the
+results after the election straight from disk (nginx ``gzip_static on``).
+
+The results of a closed election are frozen (see `final_results`), so re-running
+the export usually changes nothing. A file is rewritten only when its SHA-256
+differs from the one in ``manifest.json``. Unchanged files keep their mtime and
+the proxy's validators stay valid. Record pages beyond the last one are removed.
+"""
+from pathlib import Path
+from typing import Dict, List
+import gzip
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template.loader import render_to_string
+
+from . import final_results
+from .models import Election
+from .views import _bootstrap_payload, _candidates_payload, _records_payload, _records_queryset, _stats_payload
+
+MANIFEST = 'manifest.json'
+PAGES = ('resultados.html', 'blockchain.html')
+
+
+def export_root() -> Path:
+    return Path(getattr(settings, 'RESULTS_EXPORT_ROOT', None) or Path(settings.BASE_DIR) / 'export')
+
+
+def _json(payload) -> bytes:
+    return json.dumps(payload, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+def _record_pages(election_id: int) -> List[bytes]:
+    size = int(getattr(settings, 'BLOCKCHAIN_RECORDS_PAGE_SIZE', 200))
+    pages, cursor = [], None
+    while True:
+        payload = _records_payload(list(_records_queryset(election_id, size, cursor)), size, None)
+        pages.append(_json(payload))
+        cursor = payload['next_cursor']
+        if not cursor:
+            return pages
+
+
+def render_files(election: Election) -> Dict[str, bytes]:
+    """Name -> content of every file of the export (without the .gz copies)."""
+    bootstrap = _bootstrap_payload(election.pk)
+    files = {
+        'bootstrap.json': _json(bootstrap),
+        'candidates.json': _json(_candidates_payload(election.pk)),
+        'stats.json': _json(_stats_payload(election.pk)),
+    }
+    for number, body in enumerate(_record_pages(election.pk), 1):
+        files[f'records-{number}.json'] = body
+    for page in PAGES:
+        files[page] = render_to_string(page, {'bootstrap': bootstrap, 'static_export': True}).encode('utf-8')
+    return files
+
+
+def export_election(election: Election, root=None, force: bool = False) -> Dict[str, List[str]]:
+    """Write the static export of `election`; return the names written, unchanged and removed.
+
+    Raises `final_results.ElectionNotClosed` unless the election has ended (its
+    results are frozen first).
+    """
+    final_results.freeze(election)
+    directory = Path(root or export_root()) / str(election.pk)
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest_path = directory / MANIFEST
+    try:
+        old = json.loads(manifest_path.read_text())
+    except (FileNotFoundError, ValueError):
+        old = {}
+
+    manifest, summary = {}, {'written': [], 'unchanged': [], 'removed': []}
+    for name, body in render_files(election).items():
+        digest = hashlib.sha256(body).hexdigest()
+        manifest[name] = digest
+        path, gz_path = directory / name, directory / (name + '.gz')
+        if not force and old.get(name) == digest and path.exists() and gz_path.exists():
+            summary['unchanged'].append(name)
+            continue
+        _write(path, body)
+        # mtime=0 keeps the compressed bytes stable for identical content
+        _write(gz_path, gzip.compress(body, compresslevel=9, mtime=0))
+        summary['written'].append(name)
+
+    for name in sorted(set(old) - set(manifest)):
+        for path in (directory / name, directory / (name + '.gz')):
+            path.unlink(missing_ok=True)
+        summary['removed'].append(name)
+    _write(manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return summary
+
+
+def _write(path: Path, body: bytes):
+    # write then rename, so the proxy never serves a half-written file
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(body)
+    tmp.replace(path)
@@ -0,0 +1,43 @@
+"""Per-election vote tallies maintained in the same transaction as each vote.
+
+`record_vote` is called inside the `api_vote` transaction and increments the
+`CandidateTally` and `ElectionTally` rows with `F()` expressions (two UPDATE
+statements once the rows exist), so results are read from these rows instead of
+counting `Vote` or `OnChainRecord` on every request. Once the transaction
+commits, the election's results version is bumped so cached results are
+rebuilt (see `results_cache`).
+"""
+from typing import Optional
+
+from django.db.models import F
+
+from . import results_cache
+from .models import CandidateTally, ElectionTally
+
+
+def record_vote(election_id: Optional[int], candidate_id: int) -> None:
+    """Count one vote for `candidate_id` in `election_id`. Call inside the vote's transaction."""
+    if not CandidateTally.objects.filter(candidate_id=candidate_id).update(votes=F('votes') + 1):
+        # first vote for this candidate: create the row, then increment it like any other vote
+        CandidateTally.objects.get_or_create(candidate_id=candidate_id, defaults={'election_id': election_id})
+        CandidateTally.objects.filter(candidate_id=candidate_id).update(votes=F('votes') + 1)
+
+    results_cache.bump_for_vote(election_id)
+    if election_id is None:
+        return
+    increment = {'total_votes': F('total_votes') + 1}
+    if not ElectionTally.objects.filter(election_id=election_id).update(**increment):
+        ElectionTally.objects.get_or_create(election_id=election_id)
+        ElectionTally.objects.filter(election_id=election_id).update(**increment)
+
+
+def candidate_votes(candidate) -> int:
+    """Votes of `candidate` (use `select_related('tally')` to avoid a query)."""
+    tally = getattr(candidate, 'tally', None)
+    return tally.votes if tally else 0
+
+
+def election_tally(election) -> ElectionTally:
+    """The tally row of `election`, or an unsaved empty one if it has no votes yet."""
+    tally = getattr(election, 'tally', None)
+    return tally if tally is not None else ElectionTally(election=election)
@@ -0,0 +1,515 @@
+"""Offline interpreter for the TEAL v5 subset used by `approval.teal`.
+
+Runs application calls (create, opt-in, vote, close-out, update, delete)
+against an in-memory `Ledger`, without a sandbox, and reports the opcode cost
+of every call. Useful to test the contract, to benchmark it in CI, and to check
+a vote locally before sending a transaction that would be rejected on chain
+(see `algorand_smart_contract.submit_vote`).
+
+    program = teal.load_program()
+    ledger = teal.Ledger(latest_timestamp=now)
+    app_id = ledger.call(program, creator, args=[itob(b0), itob(e0), itob(b1), itob(e1)]).app_id
+    ledger.call(program, voter, app_id, teal.OPT_IN)
+    result = ledger.call(program, voter, app_id, args=[b'vote', itob(candidate_id)])
+    result.approved, result.cost, result.opcodes
+
+Only the opcodes listed in `OPCODES` are supported; anything else is rejected
+when the program is assembled. Every supported opcode costs 1 in TEAL v5 and an
+application call may spend at most `MAX_COST`.
+"""
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import base64
+import re
+
+from django.conf import settings
+
+MAX_COST = 700
+MAX_UINT64 = 2 ** 64 - 1
+
+# OnCompletion values
+NO_OP = 0
+OPT_IN = 1
+CLOSE_OUT = 2
+CLEAR_STATE = 3
+UPDATE_APPLICATION = 4
+DELETE_APPLICATION = 5
+
+NAMED_INTS = {
+    'NoOp': NO_OP,
+    'OptIn': OPT_IN,
+    'CloseOut': CLOSE_OUT,
+    'ClearState': CLEAR_STATE,
+    'UpdateApplication': UPDATE_APPLICATION,
+    'DeleteApplication': DELETE_APPLICATION,
+}
+
+Value = Union[int, bytes]
+
+
+class TealError(Exception):
+    """The program failed: the application call is rejected."""
+
+
+class AssembleError(ValueError):
+    """The source uses syntax or opcodes this interpreter does not support."""
+
+
+def address_bytes(address: str) -> bytes:
+    """The 32-byte public key of an Algorand address, as `txn Sender` pushes it."""
+    return base64.b32decode(address + '=' * (-len(address) % 8))[:32]
+
+
+def itob(n: int) -> bytes:
+    return n.to_bytes(8, 'big')
+
+
+class Program:
+    """An assembled program: a list of (opcode, argument) and its label table."""
+
+    def __init__(self, source: str):
+        self.instructions: List[Tuple[str, object]] = []
+        self.labels: Dict[str, int] = {}
+        self.version = 1
+        pending_jumps = []
+        for lineno, raw in enumerate(source.splitlines(), 1):
+            line = _strip_comment(raw).strip()
+            if not line:
+                continue
+            if line.startswith('#pragma'):
+                parts = line.split()
+                if len(parts) == 3 and parts[1] == 'version':
+                    self.version = int(parts[2])
+                continue
+            if line.endswith(':') and ' ' not in line:
+                self.labels[line[:-1]] = len(self.instructions)
+                continue
+            op, _, rest = line.partition(' ')
+            rest = rest.strip()
+            if op not in OPCODES:
+                raise AssembleError(f'line {lineno}: unsupported opcode {op!r}')
+            arg = _parse_arg(op, rest, lineno)
+            if op in ('b', 'bz', 'bnz'):
+                pending_jumps.append((lineno, arg))
+            self.instructions.append((op, arg))
+        for lineno, label in pending_jumps:
+            if label not in self.labels:
+                raise AssembleError(f'line {lineno}: unknown label {label!r}')
+
+
+def _strip_comment(line: str) -> str:
+    # `//` starts a comment unless it is inside a string literal
+    in_string = False
+    for i, ch in enumerate(line):
+        if ch == '"' and (i == 0 or line[i - 1] != '\\'):
+            in_string = not in_string
+        elif not in_string and line.startswith('//', i):
+            return line[:i]
+    return line
+
+
+def _parse_arg(op: str, rest: str, lineno: int):
+    try:
+        if op == 'int':
+            return NAMED_INTS[rest] if rest in NAMED_INTS else int(rest, 0)
+        if op == 'byte':
+            if rest.startswith('"') and rest.endswith('"'):
+                return rest[1:-1].encode('utf-8').decode('unicode_escape').encode('latin-1')
+            if rest.startswith('0x'):
+                return bytes.fromhex(rest[2:])
+            kind, _, data = rest.partition(' ')
+            if kind in ('base64', 'b64'):
+                return base64.b64decode(data)
+            raise ValueError(rest)
+        if op == 'txna':
+            field, index = rest.split()
+            return field, int(index)
+        if op in ('txn', 'global', 'b', 'bz', 'bnz'):
+            if not re.fullmatch(r'\w+', rest):
+                raise ValueError(rest)
+            return rest
+    except (KeyError, ValueError) as e:
+        raise AssembleError(f'line {lineno}: bad argument for {op}: {e}')
+    if rest:
+        raise AssembleError(f'line {lineno}: {op} takes no argument')
+    return None
+
+
+class Result:
+    """Outcome of one application call."""
+
+    def __init__(self, approved: bool, cost: int, opcodes: Counter, error: Optional[str] = None, app_id: int = 0):
+        self.approved = approved
+        self.cost = cost
+        self.opcodes = opcodes
+        self.error = error
+        self.app_id = app_id
+
+    def __repr__(self):
+        return f'<Result approved={self.approved} cost={self.cost} error={self.error!r}>'
+
+
+class Ledger:
+    """In-memory application state: global state per app, local state per (account, app)."""
+
+    def __init__(self, latest_timestamp: int = 0, round: int = 1):
+        self.latest_timestamp = latest_timestamp
+        self.round = round
+        self.globals: Dict[int, Dict[bytes, Value]] = {}
+        self.locals: Dict[Tuple[str, int], Dict[bytes, Value]] = {}
+        self.creators: Dict[int, str] = {}
+        self._next_app_id = 1
+
+    def opted_in(self, address: str, app_id: int) -> bool:
+        return (address, app_id) in self.locals
+
+    def call(self, program: Program, sender: str, app_id: int = 0, on_completion: int = NO_OP,
+             args: Sequence[bytes] = ()) -> Result:
+        """Run one application call from `sender`; state changes are kept only if it is approved."""
+        creating = app_id == 0
+        if creating:
+            app_id = self._next_app_id
+        elif app_id not in self.globals:
+            return Result(False, 0, Counter(), f'application {app_id} does not exist', app_id)
+        if on_completion == OPT_IN and self.opted_in(sender, app_id):
+            return Result(False, 0, Counter(), 'account already opted in', app_id)
+        if on_completion == CLOSE_OUT and not self.opted_in(sender, app_id):
+            return Result(False, 0, Counter(), 'account not opted in', app_id)
+
+        # work on copies so a rejected call leaves no trace; only the sender's
+        # local state is reachable (the only account reference the contract uses)
+        global_state = dict(self.globals.get(app_id, {}))
+        local_state = {} if on_completion == OPT_IN else self.locals.get((sender, app_id))
+        if local_state is not None:
+            local_state = dict(local_state)
+
+        run = _Run(self, program, sender, app_id, 0 if creating else app_id, on_completion, list(args),
+                   global_state, local_state)
+        try:
+            approved = run.execute()
+            error = None if approved else 'rejected'
+        except TealError as e:
+            approved, error = False, str(e)
+        result = Result(approved, run.cost, run.opcodes, error, app_id)
+        if not approved:
+            return result
+
+        if creating:
+            self._next_app_id += 1
+            self.creators[app_id] = sender
+        self.globals[app_id] = global_state
+        if local_state is not None:
+            self.locals[(sender, app_id)] = local_state
+        if on_completion == CLOSE_OUT:
+            self.locals.pop((sender, app_id), None)
+        elif on_completion == DELETE_APPLICATION:
+            del self.globals[app_id]
+        return result
+
+
+class _Run:
+    """Execution state of one call; see `Ledger.call`."""
+
+    def __init__(self, ledger, program, sender, app_id, txn_app_id, on_completion, args, global_state, local_state):
+        self.ledger = ledger
+        self.program = program
+        self.sender = sender
+        self.app_id = app_id
+        self.txn_app_id = txn_app_id
+        self.on_completion = on_completion
+        self.args = args
+        self.global_state = global_state
+        self.sender_local_state = local_state
+        self.stack: List[Value] = []
+        self.cost = 0
+        self.opcodes = Counter()
+
+    def execute(self) -> bool:
+        instructions = self.program.instructions
+        labels = self.program.labels
+        pc = 0
+        while pc < len(instructions):
+            op, arg = instructions[pc]
+            self.cost += 1
+            self.opcodes[op] += 1
+            if self.cost > MAX_COST:
+                raise TealError(f'dynamic cost budget exceeded ({MAX_COST})')
+            pc += 1
+            if op == 'b':
+                pc = labels[arg]
+            elif op in ('bz', 'bnz'):
+                if (self.pop_int() != 0) == (op == 'bnz'):
+                    pc = labels[arg]
+            elif op == 'return':
+                return self.pop_int() != 0
+            else:
+                OPCODES[op](self, arg)
+        if len(self.stack) != 1:
+            raise TealError(f'stack must hold exactly one value at the end, has {len(self.stack)}')
+        return self.pop_int() != 0
+
+    def pop(self) -> Value:
+        if not self.stack:
+            raise TealError('stack underflow')
+        return self.stack.pop()
+
+    def pop_int(self) -> int:
+        value = self.pop()
+        if not isinstance(value, int):
+            raise TealError('expected uint64, got bytes')
+        return value
+
+    def pop_bytes(self) -> bytes:
+        value = self.pop()
+        if not isinstance(value, bytes):
+            raise TealError('expected bytes, got uint64')
+        return value
+
+    def push(self, value: Value):
+        if len(self.stack) >= 1000:
+            raise TealError('stack overflow')
+        self.stack.append(value)
+
+    def account(self, value: Value) -> str:
+        """Resolve an account reference (v5: the sender's public key or offset 0) to an address."""
+        if value == 0 or value == address_bytes(self.sender):
+            return self.sender
+        raise TealError('invalid account reference')
+
+    def local_state(self, account: Value) -> Dict[bytes, Value]:
+        self.account(account)
+        state = self.sender_local_state
+        if state is None:
+            raise TealError('account is not opted in to the application')
+        return state
+
+
+def _binary(fn):
+    def op(run, arg):
+        b = run.pop_int()
+        a = run.pop_int()
+        run.push(fn(a, b))
+    return op
+
+
+def _checked(value: int) -> int:
+    if value < 0 or value > MAX_UINT64:
+        raise TealError('uint64 overflow')
+    return value
+
+
+def _div(a, b):
+    if b == 0:
+        raise TealError('division by zero')
+    return a // b
+
+
+def _mod(a, b):
+    if b == 0:
+        raise TealError('modulo by zero')
+    return a % b
+
+
+def _equal(run, arg, negate=False):
+    b, a = run.pop(), run.pop()
+    if type(a) is not type(b):
+        raise TealError('cannot compare uint64 with bytes')
+    run.push(int((a == b) != negate))
+
+
+def _btoi(run, arg):
+    value = run.pop_bytes()
+    if len(value) > 8:
+        raise TealError('btoi arg too long')
+    run.push(int.from_bytes(value, 'big'))
+
+
+def _txn(run, field):
+    if field == 'Sender':
+        run.push(address_bytes(run.sender))
+    elif field == 'ApplicationID':
+        run.push(run.txn_app_id)
+    elif field == 'OnCompletion':
+        run.push(run.on_completion)
+    elif field == 'NumAppArgs':
+        run.push(len(run.args))
+    elif field == 'TypeEnum':
+        run.push(6)  # appl
+    else:
+        raise TealError(f'unsupported txn field {field}')
+
+
+def _txna(run, arg):
+    field, index = arg
+    if field != 'ApplicationArgs':
+        raise TealError(f'unsupported txna field {field}')
+    if index >= len(run.args):
+        raise TealError(f'invalid ApplicationArgs index {index}')
+    run.push(run.args[index])
+
+
+def _global(run, field):
+    if field == 'LatestTimestamp':
+        run.push(run.ledger.latest_timestamp)
+    elif field == 'Round':
+        run.push(run.ledger.round)
+    elif field == 'GroupSize':
+        run.push(1)
+    elif field == 'ZeroAddress':
+        run.push(bytes(32))
+    elif field == 'CurrentApplicationID':
+        run.push(run.app_id)
+    else:
+        raise TealError(f'unsupported global field {field}')
+
+
+def _assert(run, arg):
+    if run.pop_int() == 0:
+        raise TealError('assert failed')
+
+
+def _err(run, arg):
+    raise TealError('err opcode executed')
+
+
+def _app_global_get(run, arg):
+    run.push(run.global_state.get(run.pop_bytes(), 0))
+
+
+def _app_global_put(run, arg):
+    value = run.pop()
+    run.global_state[run.pop_bytes()] = value
+
+
+def _app_global_del(run, arg):
+    run.global_state.pop(run.pop_bytes(), None)
+
+
+def _app_local_get(run, arg):
+    key = run.pop_bytes()
+    run.push(run.local_state(run.pop()).get(key, 0))
+
+
+def _app_local_put(run, arg):
+    value = run.pop()
+    key = run.pop_bytes()
+    run.local_state(run.pop())[key] = value
+
+
+def _app_local_del(run, arg):
+    key = run.pop_bytes()
+    run.local_state(run.pop()).pop(key, None)
+
+
+def _app_opted_in(run, arg):
+    app = run.pop_int()
+    account = run.account(run.pop())
+    if app == run.app_id:
+        run.push(int(run.sender_local_state is not None))
+    else:
+        run.push(int(run.ledger.opted_in(account, app)))
+
+
+def _pop_only(run, arg):
+    run.pop()
+
+
+def _dup(run, arg):
+    value = run.pop()
+    run.push(value)
+    run.push(value)
+
+
+def _not(run, arg):
+    run.push(int(run.pop_int() == 0))
+
+
+def _len(run, arg):
+    run.push(len(run.pop_bytes()))
+
+
+def _itob(run, arg):
+    run.push(itob(run.pop_int()))
+
+
+def _concat(run, arg):
+    b = run.pop_bytes()
+    a = run.pop_bytes()
+    if len(a) + len(b) > 4096:
+        raise TealError('concat result too long')
+    run.push(a + b)
+
+
+# Branches and `return` are handled in `_Run.execute`.
+OPCODES = {
+    'int': lambda run, arg: run.push(arg),
+    'byte': lambda run, arg: run.push(arg),
+    'txn': _txn,
+    'txna': _txna,
+    'global': _global,
+    '+': _binary(lambda a, b: _checked(a + b)),
+    '-': _binary(lambda a, b: _checked(a - b)),
+    '*': _binary(lambda a, b: _checked(a * b)),
+    '/': _binary(_div),
+    '%': _binary(_mod),
+    '<': _binary(lambda a, b: int(a < b)),
+    '>': _binary(lambda a, b: int(a > b)),
+    '<=': _binary(lambda a, b: int(a <= b)),
+    '>=': _binary(lambda a, b: int(a >= b)),
+    '&&': _binary(lambda a, b: int(a != 0 and b != 0)),
+    '||': _binary(lambda a, b: int(a != 0 or b != 0)),
+    '==': _equal,
+    '!=': lambda run, arg: _equal(run, arg, negate=True),
+    '!': _not,
+    'btoi': _btoi,
+    'itob': _itob,
+    'len': _len,
+    'concat': _concat,
+    'pop': _pop_only,
+    'dup': _dup,
+    'assert': _assert,
+    'err': _err,
+    'return': None,
+    'b': None,
+    'bz': None,
+    'bnz': None,
+    'app_global_get': _app_global_get,
+    'app_global_put': _app_global_put,
+    'app_global_del': _app_global_del,
+    'app_local_get': _app_local_get,
+    'app_local_put': _app_local_put,
+    'app_local_del': _app_local_del,
+    'app_opted_in': _app_opted_in,
+}
+
+
+def approval_teal_path() -> Path:
+    """`APPROVAL_TEAL_PATH`, or the `approval.teal` at the root of the repository."""
+    configured = getattr(settings, 'APPROVAL_TEAL_PATH', None)
+    if configured:
+        return Path(configured)
+    return Path(settings.BASE_DIR).parent / 'approval.teal'
+
+
+_programs: Dict[str, Program] = {}
+
+
+def load_program(path: Optional[Union[str, Path]] = None) -> Program:
+    """Assemble the TEAL file at `path` (default `approval_teal_path()`), cached per path."""
+    path = str(path or approval_teal_path())
+    program = _programs.get(path)
+    if program is None:
+        with open(path, 'r') as f:
+            program = _programs[path] = Program(f.read())
+    return program
+
+
+def state_from_api(key_values) -> Dict[bytes, Value]:
+    """Convert algod's TealKeyValue list (base64 keys; type 1 bytes, 2 uint) into a state dict."""
+    state = {}
+    for kv in key_values or []:
+        value = kv.get('value', {})
+        key = base64.b64decode(kv['key'])
+        state[key] = base64.b64decode(value.get('bytes', '')) if value.get('type') == 1 else value.get('uint', 0)
+    return state
@@ -0,0 +1,114 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .. import admission, outbox
+from ..models import Candidate, Election, Vote, Voter, VoteOutbox
+from .test_results_cache import RESULTS_CACHES
+
+User = get_user_model()
+
+
+def use_temp_admission_state(test, **overrides):
+    """Give `test` its own admission bucket in a temporary state file, reset for the test."""
+    fd, state_file = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    test.addCleanup(os.remove, state_file)
+    override = override_settings(ADMISSION_STATE_FILE=state_file, **overrides)
+    override.enable()
+    test.addCleanup(override.disable)
+    admission.reset()
+    return state_file
+
+
+@override_settings(CACHES=RESULTS_CACHES)
+class AdmissionTests(TestCase):
+    def setUp(self):
+        self.state_file = use_temp_admission_state(self, ADMISSION_RATE=1.0, ADMISSION_BURST=2, ADMISSION_TOKEN_CHUNK=5,
+                                                   ADMISSION_MAX_BACKLOG=3, ADMISSION_MAX_LAG=30.0,
+                                                   ADMISSION_BACKLOG_INTERVAL=0.0)
+        now = timezone.now()
+        self.election = Election.objects.create(name='E', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.candidate = Candidate.objects.create(name='A', election=self.election)
+
+    def enqueue(self, count, due_at=None):
+        for _ in range(count):
+            voter = Voter.objects.create(user=User.objects.create_user(username=f'q{Voter.objects.count()}'),
+                                         control_number=f'Q{Voter.objects.count()}')
+            outbox.enqueue_vote(Vote.objects.create(voter=voter, candidate=self.candidate, election=self.election), due_at=due_at)
+
+    def test_empty_bucket_answers_429_with_retry_after(self):
+        self.assertIsNone(admission.try_acquire())
+        self.assertIsNone(admission.try_acquire())
+        response = admission.try_acquire()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(admission.stats()['shed_rate'], 1)
+
+    @override_settings(ADMISSION_RATE=1000.0, ADMISSION_BURST=100)
+    def test_tokens_are_taken_from_the_shared_file_in_chunks(self):
+        admission.reset()
+        with mock.patch.object(admission, '_locked_state', wraps=admission._locked_state) as locked:
+            for _ in range(10):
+                self.assertIsNone(admission.try_acquire())
+        self.assertEqual(locked.call_count, 2)
+        self.assertEqual(admission.stats()['admitted'], 10)
+
+    @override_settings(ADMISSION_RATE=1000.0, ADMISSION_BURST=100)
+    def test_outbox_backlog_answers_503(self):
+        admission.reset()
+        self.enqueue(3)
+        self.assertIsNone(admission.try_acquire())
+        self.enqueue(1)
+        response = admission.try_acquire()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        stats = admission.stats()
+        self.assertEqual((stats['shed_backlog'], stats['outbox_backlog']), (1, 4))
+
+        VoteOutbox.objects.update(status=VoteOutbox.STATUS_CONFIRMED)
+        self.assertIsNone(admission.try_acquire())
+
+    @override_settings(ADMISSION_RATE=1000.0, ADMISSION_BURST=100)
+    def test_outbox_lag_answers_503(self):
+        admission.reset()
+        # one vote waiting to be sent for longer than ADMISSION_MAX_LAG: the worker is behind
+        self.enqueue(1, due_at=timezone.now() - timedelta(seconds=40))
+        self.assertEqual(admission.try_acquire().status_code, 503)
+        self.assertGreater(admission.stats()['outbox_lag'], 30)
+        # waiting out a retry backoff is not lag
+        VoteOutbox.objects.update(next_attempt_at=timezone.now() + timedelta(seconds=60))
+        self.assertIsNone(admission.try_acquire())
+
+    @override_settings(ADMISSION_BACKLOG_INTERVAL=60.0, ADMISSION_RATE=1000.0, ADMISSION_BURST=100)
+    def test_backlog_is_read_once_per_interval(self):
+        admission.reset()
+        admission.try_acquire()
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(5):
+                admission.try_acquire()
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_api_vote_is_shed_before_running_the_view(self):
+        user = User.objects.create_user(username='shed', password='pass')
+        Voter.objects.create(user=user, control_number='S1')
+        self.client.login(username='shed', password='pass')
+
+        admission.try_acquire()
+        admission.try_acquire()
+        resp = self.client.post('/api/vote/', {'candidate_id': str(self.candidate.id)})
+        self.assertEqual(resp.status_code, 429)
+        self.assertIn('Retry-After', resp)
+        self.assertFalse(Vote.objects.filter(election=self.election).exists())
+
+    @override_settings(ADMISSION_ENABLED=False)
+    def test_disabled(self):
+        for _ in range(5):
+            self.assertEqual(self.client.post('/api/vote/').status_code, 403)
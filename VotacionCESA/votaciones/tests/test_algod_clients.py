@@ -0,0 +1,58 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import SimpleTestCase
+
+from .. import algod_clients
+
+
+class FakeAlgodHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path.startswith('/v2/status'):
+            status, body = 200, {'last-round': 42, 'token': self.headers.get('X-Algo-API-Token')}
+        else:
+            status, body = 404, {'message': 'not found'}
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class PooledAlgodClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAlgodHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.address = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_client_is_shared_and_reuses_its_connection(self):
+        client = algod_clients.get_algod_client('t' * 64, self.address)
+        self.assertIs(client, algod_clients.get_algod_client('t' * 64, self.address))
+
+        for _ in range(5):
+            self.assertEqual(client.status(), {'last-round': 42, 'token': 't' * 64})
+
+        stats = algod_clients.connection_stats()[self.address]
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['reused'], 4)
+
+    def test_http_errors_keep_algosdk_semantics(self):
+        from algosdk.error import AlgodHTTPError
+
+        client = algod_clients.get_algod_client('t' * 64, self.address)
+        with self.assertRaises(AlgodHTTPError) as ctx:
+            client.account_info('UNKNOWN')
+        self.assertEqual(ctx.exception.code, 404)
+        self.assertEqual(str(ctx.exception), 'not found')
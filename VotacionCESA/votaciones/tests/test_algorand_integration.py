@@ -0,0 +1,104 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import algorand_integration
+
+
+class CountingParamsClient:
+    def __init__(self, first=1000, last=2000):
+        self.first = first
+        self.last = last
+        self.calls = 0
+
+    def suggested_params(self):
+        from algosdk import transaction
+
+        self.calls += 1
+        return transaction.SuggestedParams(fee=1000, first=self.first, last=self.last, gen='sandnet-v1',
+                                           gh='SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=', flat_fee=True)
+
+
+class SignerContextTests(SimpleTestCase):
+    def test_suggested_params_are_reused(self):
+        client = CountingParamsClient()
+        ctx = algorand_integration.SignerContext(client, [('ADDR', 'KEY')])
+        for _ in range(20):
+            ctx.suggested_params()
+        self.assertEqual(client.calls, 1)
+
+    @override_settings(ALGORAND_ROUND_SECONDS=1)
+    def test_params_near_last_valid_round_are_refreshed_before_use(self):
+        client = CountingParamsClient(first=1000, last=1015)
+        ctx = algorand_integration.SignerContext(client, [('ADDR', 'KEY')])
+        ctx.suggested_params()
+        # pretend 6 rounds passed: 1006 is within the expiry margin of last=1015
+        ctx._fetched_at = time.monotonic() - 6
+        ctx.suggested_params()
+        self.assertEqual(client.calls, 2)
+
+    def test_context_is_built_once_per_process(self):
+        algorand_integration.reset_signer_context()
+        self.addCleanup(algorand_integration.reset_signer_context)
+        with mock.patch.object(algorand_integration, '_get_algod_client', return_value=CountingParamsClient()) as get_client, \
+                mock.patch.object(algorand_integration, '_get_sender_credentials', return_value=[('ADDR', 'KEY')]):
+            first = algorand_integration.get_signer_context()
+            self.assertIs(algorand_integration.get_signer_context(), first)
+        self.assertEqual(get_client.call_count, 1)
+
+
+class BalanceClient:
+    def __init__(self, balances):
+        self.balances = balances
+
+    def account_info(self, address):
+        return {'amount': self.balances[address]}
+
+
+@override_settings(ALGORAND_SENDER_BALANCE_INTERVAL=3600)
+class SenderPoolTests(SimpleTestCase):
+    def make_context(self, balances):
+        ctx = algorand_integration.SignerContext(BalanceClient(balances), [(addr, 'KEY') for addr in balances])
+        self.addCleanup(ctx.close)
+        return ctx
+
+    def test_sender_with_fewest_outstanding_transactions_is_chosen(self):
+        ctx = self.make_context({'A': 10 ** 7, 'B': 10 ** 7, 'C': 10 ** 7})
+        with ctx.sender(5) as first, ctx.sender(2) as second, ctx.sender() as third:
+            self.assertEqual({first.address, second.address, third.address}, {'A', 'B', 'C'})
+            with ctx.sender() as fourth:
+                # C has a single outstanding transaction, fewer than B (2) and A (5)
+                self.assertIs(fourth, third)
+        stats = ctx.stats()
+        self.assertEqual(sum(s['outstanding'] for s in stats.values()), 0)
+        self.assertEqual(stats[first.address]['submitted'], 5)
+        self.assertEqual(stats[third.address]['submitted'], 2)
+
+    @override_settings(ALGORAND_SENDER_MIN_BALANCE=1_000_000)
+    def test_accounts_below_minimum_balance_are_skipped(self):
+        balances = {'LOW': 500_000, 'OK': 5_000_000}
+        ctx = self.make_context(balances)
+        ctx.check_balances()
+        for _ in range(3):
+            with ctx.sender() as sender:
+                self.assertEqual(sender.address, 'OK')
+
+        balances['OK'] = 0
+        ctx.check_balances()
+        with self.assertRaises(RuntimeError):
+            with ctx.sender():
+                pass
+
+        balances['LOW'] = 2_000_000
+        ctx.check_balances()
+        with ctx.sender() as sender:
+            self.assertEqual(sender.address, 'LOW')
+
+    def test_failures_are_counted_per_sender(self):
+        ctx = self.make_context({'A': 10 ** 7})
+        with self.assertRaises(ValueError):
+            with ctx.sender():
+                raise ValueError('rejected')
+        self.assertEqual(ctx.stats()['A']['failed'], 1)
+        self.assertEqual(ctx.stats()['A']['outstanding'], 0)
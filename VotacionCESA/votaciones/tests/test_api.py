@@ -1,16 +1,27 @@
-from django.test import TestCase, Client
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.utils import timezone
 from datetime import timedelta
 
-from ..models import Candidate, Voter, Election, Vote, OnChainRecord
+from .. import results_cache
+from ..models import Candidate, CandidateMember, CandidateTally, Voter, Election, ElectionTally, Vote, OnChainRecord
+from .test_admission import use_temp_admission_state
+from .test_results_cache import RESULTS_CACHES
 
 
 User = get_user_model()
 
 
+@override_settings(CACHES=RESULTS_CACHES)
 class ApiTests(TestCase):
     def setUp(self):
+        # a fresh results cache and admission bucket per test, never the project's files
+        results_cache._cache().clear()
+        use_temp_admission_state(self)
+
         self.client = Client()
         # create user and voter
         self.user = User.objects.create_user(username='tester', password='pass')
@@ -30,17 +41,43 @@ class ApiTests(TestCase):
         self.assertIn('candidates', data)
         self.assertGreaterEqual(len(data['candidates']), 1)
 
+    def test_api_candidates_query_count_does_not_grow_with_candidates(self):
+        def queries():
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get('/api/candidates/').status_code, 200)
+            return len(ctx.captured_queries)
+
+        CandidateMember.objects.create(candidate=self.candidate, full_name='Alice A', role='Presidenta')
+        baseline = queries()
+        for i in range(5):
+            c = Candidate.objects.create(name=f'C{i}', election=self.election)
+            CandidateMember.objects.create(candidate=c, full_name=f'M{i}', role='Vocal')
+            CandidateTally.objects.create(candidate=c, election=self.election, votes=i)
+        self.assertEqual(queries(), baseline)
+        self.assertLessEqual(baseline, 3)
+
     def test_api_vote_flow(self):
         # login
         logged = self.client.login(username='tester', password='pass')
         self.assertTrue(logged)
 
-        # post vote
+        # post vote: the request is accepted and queued in the outbox
         resp = self.client.post('/api/vote/', {'candidate_id': str(self.candidate.id)})
-        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.status_code, 202)
         data = resp.json()
-        self.assertEqual(data.get('status'), 'ok')
-        self.assertIn('txid', data)
+        self.assertEqual(data.get('status'), 'accepted')
+        self.assertIn('receipt_id', data)
+
+        status = self.client.get(data['status_url']).json()
+        self.assertEqual(status['status'], 'pending')
+        self.assertIsNone(status['txid'])
+
+        # drain the outbox as the background worker would
+        call_command('process_vote_outbox', '--once')
+
+        status = self.client.get(data['status_url']).json()
+        self.assertEqual(status['status'], 'confirmed')
+        self.assertTrue(status['txid'])
 
         # verify Vote object exists and is marked valid and candidate link was removed
         vote = Vote.objects.filter(voter=self.voter, election=self.election).first()
@@ -53,4 +90,43 @@ class ApiTests(TestCase):
         ocr = OnChainRecord.objects.filter(election=self.election, candidate=self.candidate).first()
         # It might not exist if migration wasn't run, so don't fail hard here; but if present, txid matches
         if ocr:
-            self.assertEqual(ocr.txid, data.get('txid'))
+            self.assertEqual(ocr.txid, status.get('txid'))
+
+    def test_api_vote_query_budget(self):
+        # a first vote creates the tally rows; measure a steady-state vote
+        Voter.objects.create(user=User.objects.create_user(username='other', password='pass'), control_number='C999')
+        self.client.login(username='other', password='pass')
+        self.client.post('/api/vote/', {'candidate_id': str(self.candidate.id)})
+
+        self.client.login(username='tester', password='pass')
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post('/api/vote/', {'candidate_id': str(self.candidate.id)})
+        self.assertEqual(resp.status_code, 202)
+        # session + user, candidate (with election and tallies), voter, vote + outbox
+        # inserts, two tally updates; plus the savepoint pair of the atomic block
+        self.assertLessEqual(len(ctx.captured_queries), 10, [q['sql'] for q in ctx.captured_queries])
+        data = resp.json()
+        self.assertEqual(data['candidate_votes'], 2)
+        self.assertEqual(data['total_votes'], 2)
+        self.assertEqual(CandidateTally.objects.get(candidate=self.candidate).votes, 2)
+        tally = ElectionTally.objects.get(election=self.election)
+        self.assertEqual(tally.total_votes, 2)
+
+    def test_api_vote_twice_is_rejected_by_the_constraint(self):
+        self.client.login(username='tester', password='pass')
+        first = self.client.post('/api/vote/', {'candidate_id': str(self.candidate.id)})
+        self.assertEqual(first.status_code, 202)
+        second = self.client.post('/api/vote/', {'candidate_id': str(self.candidate.id)})
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(second.json()['error'], 'user already voted in this election')
+        self.assertEqual(Vote.objects.filter(voter=self.voter).count(), 1)
+        self.assertEqual(CandidateTally.objects.get(candidate=self.candidate).votes, 1)
+
+    def test_results_endpoints_read_the_tallies(self):
+        self.client.login(username='tester', password='pass')
+        self.client.post('/api/vote/', {'candidate_id': str(self.candidate.id)})
+
+        candidates = self.client.get('/api/candidates/', {'election_id': self.election.id}).json()['candidates']
+        self.assertEqual(candidates[0]['votes_count'], 1)
+        stats = self.client.get('/api/stats/', {'election_id': self.election.id}).json()
+        self.assertEqual(stats['total_votes'], 1)
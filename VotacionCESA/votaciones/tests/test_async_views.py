@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+
+from .. import results_cache
+from ..models import Candidate, CandidateMember, Election, Voter, VoteOutbox
+from .test_admission import use_temp_admission_state
+from .test_results_cache import RESULTS_CACHES
+
+User = get_user_model()
+
+
+@override_settings(CACHES=RESULTS_CACHES)
+class AsyncApiTests(TestCase):
+    def setUp(self):
+        results_cache._cache().clear()
+        use_temp_admission_state(self)
+        self.user = User.objects.create_user(username='async', password='pass')
+        Voter.objects.create(user=self.user, control_number='A1')
+        now = timezone.now()
+        self.election = Election.objects.create(name='Async', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.candidate = Candidate.objects.create(name='Alice', list_name='Lista A', election=self.election)
+        CandidateMember.objects.create(candidate=self.candidate, full_name='Alice A', role='Presidenta')
+        self.client = AsyncClient()
+
+    async def test_read_endpoints_match_the_sync_api(self):
+        for path in ('/api/candidates/', '/api/elections/', '/api/stats/', '/api/blockchain/records/'):
+            sync_resp = await sync_to_async(self.client_class().get)(path)
+            async_resp = await self.client.get(path.replace('/api/', '/api/async/'))
+            self.assertEqual(async_resp.status_code, 200, path)
+            self.assertEqual(async_resp.json(), sync_resp.json(), path)
+
+    async def test_vote_and_wait_for_confirmation(self):
+        await self.client.alogin(username='async', password='pass')
+        resp = await self.client.post('/api/async/vote/', {'candidate_id': str(self.candidate.id)})
+        self.assertEqual(resp.status_code, 202)
+        data = resp.json()
+        self.assertTrue(data['status_url'].startswith('/api/async/vote/status/'))
+
+        duplicate = await self.client.post('/api/async/vote/', {'candidate_id': str(self.candidate.id)})
+        self.assertEqual(duplicate.status_code, 400)
+
+        await sync_to_async(call_command)('process_vote_outbox', '--once')
+        status = (await self.client.get(data['status_url'], {'wait': 5})).json()
+        self.assertEqual(status['status'], VoteOutbox.STATUS_CONFIRMED)
+        self.assertTrue(status['txid'])
+
+    @override_settings(VOTE_STATUS_POLL_INTERVAL=0.01)
+    async def test_status_wait_returns_pending_after_the_deadline(self):
+        await self.client.alogin(username='async', password='pass')
+        data = (await self.client.post('/api/async/vote/', {'candidate_id': str(self.candidate.id)})).json()
+        status = (await self.client.get(data['status_url'], {'wait': 0.05})).json()
+        self.assertEqual(status['status'], VoteOutbox.STATUS_PENDING)
+
+    async def test_idempotency_key_is_honoured(self):
+        await self.client.alogin(username='async', password='pass')
+        first = await self.client.post('/api/async/vote/', {'candidate_id': str(self.candidate.id)}, headers={'Idempotency-Key': 'a-1'})
+        retry = await self.client.post('/api/async/vote/', {'candidate_id': str(self.candidate.id)}, headers={'Idempotency-Key': 'a-1'})
+        self.assertEqual(retry.status_code, 202)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
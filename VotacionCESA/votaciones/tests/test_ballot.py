@@ -0,0 +1,80 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import algorand_integration, outbox, results_cache
+from ..models import Candidate, Election, ElectionTally, Vote, Voter, VoteOutbox
+from .test_admission import use_temp_admission_state
+from .test_results_cache import RESULTS_CACHES
+
+User = get_user_model()
+
+
+@override_settings(CACHES=RESULTS_CACHES)
+class BallotTests(TestCase):
+    def setUp(self):
+        results_cache._cache().clear()
+        use_temp_admission_state(self)
+        user = User.objects.create_user(username='ballot', password='pass')
+        self.voter = Voter.objects.create(user=user, control_number='B1')
+        now = timezone.now()
+        self.elections = [Election.objects.create(name=f'E{i}', start_date=now - timedelta(hours=1),
+                                                  end_date=now + timedelta(hours=1)) for i in range(3)]
+        self.candidates = [Candidate.objects.create(name=f'C{i}', election=e) for i, e in enumerate(self.elections)]
+        self.client.login(username='ballot', password='pass')
+
+    def post(self, candidates):
+        return self.client.post('/api/ballot/', {'candidate_id': [str(c.id) for c in candidates]})
+
+    def test_ballot_records_every_selection_with_one_ballot_id(self):
+        resp = self.post(self.candidates)
+        self.assertEqual(resp.status_code, 202)
+        data = resp.json()
+        self.assertEqual([v['election_id'] for v in data['votes']], [e.id for e in self.elections])
+        self.assertTrue(all(v['status_url'].startswith('/api/vote/status/') for v in data['votes']))
+
+        entries = VoteOutbox.objects.filter(ballot_id=data['ballot_id'])
+        self.assertEqual(entries.count(), 3)
+        self.assertEqual(len({e.next_attempt_at for e in entries}), 1)
+        self.assertEqual(list(ElectionTally.objects.values_list('total_votes', flat=True)), [1, 1, 1])
+
+    def test_ballot_is_all_or_nothing(self):
+        Vote.objects.create(voter=self.voter, candidate=self.candidates[1], election=self.elections[1])
+        resp = self.post(self.candidates)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertFalse(VoteOutbox.objects.exists())
+
+    def test_invalid_selections_are_rejected(self):
+        other = Candidate.objects.create(name='X', election=self.elections[0])
+        self.assertEqual(self.post([self.candidates[0], other]).status_code, 400)
+        self.assertEqual(self.client.post('/api/ballot/', {'candidate_id': ['999999']}).status_code, 404)
+        self.assertEqual(self.client.post('/api/ballot/', {'candidate_id': ['x']}).status_code, 400)
+        self.assertEqual(self.client.post('/api/ballot/').status_code, 400)
+
+        closed = self.elections[2]
+        closed.end_date = timezone.now() - timedelta(minutes=1)
+        closed.save()
+        self.assertEqual(self.post(self.candidates).status_code, 400)
+        self.assertFalse(Vote.objects.exists())
+
+    @override_settings(VOTE_BATCH_SIZE=2)
+    def test_worker_sends_a_ballot_as_one_group(self):
+        single = Candidate.objects.create(name='S', election=Election.objects.create(
+            name='S', start_date=timezone.now() - timedelta(hours=1), end_date=timezone.now() + timedelta(hours=1)))
+        other = Voter.objects.create(user=User.objects.create_user(username='single'), control_number='B2')
+        outbox.enqueue_vote(Vote.objects.create(voter=other, candidate=single, election=single.election))
+        self.post(self.candidates)
+
+        groups = []
+        with mock.patch.object(algorand_integration, 'send_vote_group',
+                               side_effect=lambda votes, **kwargs: groups.append(votes) or [f'TX{i}' for i in range(len(votes))]), \
+                mock.patch.object(algorand_integration, 'send_vote_tx', return_value='SINGLE'):
+            summary = outbox.process_due_entries()
+
+        self.assertEqual(summary['confirmed'], 4)
+        # the three-vote ballot is not split even though VOTE_BATCH_SIZE is 2
+        self.assertEqual(groups, [[(c.election_id, c.id) for c in self.candidates]])
@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..models import Candidate, Election, OnChainRecord
+from .test_results_cache import RESULTS_CACHES
+
+
+@override_settings(CACHES=RESULTS_CACHES)
+class BlockchainRecordsPaginationTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.election = Election.objects.create(name='E', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.other = Election.objects.create(name='O', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.candidate = Candidate.objects.create(name='A', election=self.election)
+        self.base = now - timedelta(minutes=10)
+        # pairs of records share a timestamp, so the id has to break the ties
+        for i in range(7):
+            self.add(f'TX{i}', self.base + timedelta(seconds=i // 2))
+        self.add('OTHER', self.base, election=self.other)
+
+    def add(self, txid, timestamp, election=None):
+        record = OnChainRecord.objects.create(txid=txid, candidate=self.candidate, election=election or self.election)
+        OnChainRecord.objects.filter(pk=record.pk).update(timestamp=timestamp)
+
+    def get(self, **params):
+        response = self.client.get('/api/blockchain/records/', dict(params, election_id=self.election.id))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_walk_back_through_every_record_once(self):
+        page = self.get(limit=3)
+        seen = [r['txid'] for r in page['records']]
+        self.assertEqual(seen, ['TX6', 'TX5', 'TX4'])
+        while page['next_cursor']:
+            with CaptureQueriesContext(connection) as ctx:
+                page = self.get(limit=3, cursor=page['next_cursor'])
+            self.assertEqual(len(ctx.captured_queries), 1)
+            seen += [r['txid'] for r in page['records']]
+        self.assertEqual(seen, [f'TX{i}' for i in range(6, -1, -1)])
+        self.assertFalse(page['has_more'])
+
+    @override_settings(BLOCKCHAIN_RECORDS_SINCE_OVERLAP=0)
+    def test_since_returns_only_newer_records(self):
+        first = self.get(limit=2)
+        self.assertEqual(self.get(since=first['since'])['records'], [])
+
+        self.add('TX7', self.base + timedelta(seconds=3))  # same timestamp as TX6
+        self.add('TX8', self.base + timedelta(seconds=4))
+        self.add('TX9', self.base + timedelta(seconds=5))
+        delta = self.get(since=first['since'], limit=2)
+        self.assertEqual([r['txid'] for r in delta['records']], ['TX7', 'TX8'])
+        self.assertTrue(delta['has_more'])
+        rest = self.get(since=delta['since'], limit=2)
+        self.assertEqual([r['txid'] for r in rest['records']], ['TX9'])
+        self.assertFalse(rest['has_more'])
+        self.assertEqual(self.get(since=rest['since'])['since'], rest['since'])
+
+    def test_since_resends_the_overlap_window(self):
+        first = self.get(limit=2)
+        # committed after TX6 was served, but stamped earlier (inserted before TX6 committed)
+        self.add('LATE', self.base + timedelta(seconds=2))
+        with self.settings(BLOCKCHAIN_RECORDS_SINCE_OVERLAP=5):
+            delta = self.get(since=first['since'], limit=3)
+            txids = [r['txid'] for r in delta['records']]
+            self.assertTrue(delta['has_more'])
+            while delta['has_more']:
+                delta = self.get(since=first['since'], cursor=delta['next_cursor'], limit=3)
+                txids += [r['txid'] for r in delta['records']]
+        self.assertIn('LATE', txids)
+        self.assertEqual(len(txids), len(set(txids)))
+        # nothing newer than `since` arrived, so the cursor does not move back
+        self.assertEqual(delta['since'], first['since'])
+
+    def test_election_filter_and_unfiltered_listing(self):
+        txids = [r['txid'] for r in self.client.get('/api/blockchain/records/').json()['records']]
+        self.assertIn('OTHER', txids)
+        self.assertNotIn('OTHER', [r['txid'] for r in self.get()['records']])
+
+    def test_invalid_parameters(self):
+        for params in ({'cursor': 'nope'}, {'since': 'bm9wZQ'}, {'limit': 'x'}, {'election_id': 'x'}):
+            self.assertEqual(self.client.get('/api/blockchain/records/', params).status_code, 400, params)
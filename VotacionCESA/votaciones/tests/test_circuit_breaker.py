@@ -0,0 +1,89 @@
+import socket
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import algod_clients, circuit_breaker, deadlines
+
+
+@override_settings(CIRCUIT_BREAKER_FAILURES=3, CIRCUIT_BREAKER_COOLDOWN=30, CIRCUIT_BREAKER_PROBES=1)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        circuit_breaker.reset()
+        self.addCleanup(circuit_breaker.reset)
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        breaker = circuit_breaker.breaker_for('http://node')
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertTrue(circuit_breaker.is_open('http://node'))
+        with self.assertRaises(circuit_breaker.CircuitOpenError):
+            breaker.before_call()
+        self.assertEqual(circuit_breaker.breaker_stats()['http://node'], {'state': 'open', 'failures': 3, 'rejected': 1})
+
+    def test_success_resets_the_failure_count(self):
+        breaker = circuit_breaker.breaker_for('http://node')
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.before_call()
+        self.assertEqual(breaker.state, circuit_breaker.CLOSED)
+
+    def test_half_open_probe_closes_or_reopens(self):
+        breaker = circuit_breaker.breaker_for('http://node')
+        for _ in range(3):
+            breaker.record_failure()
+        breaker.opened_at = time.monotonic() - 31
+
+        breaker.before_call()  # the probe
+        self.assertEqual(breaker.state, circuit_breaker.HALF_OPEN)
+        with self.assertRaises(circuit_breaker.CircuitOpenError):
+            breaker.before_call()  # only one probe at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, circuit_breaker.OPEN)
+
+        breaker.opened_at = time.monotonic() - 31
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, circuit_breaker.CLOSED)
+        breaker.before_call()
+
+    def test_unreachable_node_trips_the_pooled_client(self):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            address = f'http://127.0.0.1:{s.getsockname()[1]}'  # nothing listens once closed
+        client = algod_clients.get_algod_client('t' * 64, address)
+        for _ in range(3):
+            with self.assertRaises(OSError):
+                client.status()
+        with mock.patch.object(algod_clients.ConnectionPool, 'request') as request:
+            with self.assertRaises(circuit_breaker.CircuitOpenError):
+                client.status()
+            request.assert_not_called()
+
+
+class DeadlineTests(SimpleTestCase):
+    def test_no_budget_outside_a_request(self):
+        self.assertIsNone(deadlines.remaining())
+        self.assertEqual(deadlines.cap_timeout(10), 10)
+
+    def test_budget_caps_and_then_rejects_calls(self):
+        with deadlines.deadline(2):
+            self.assertLessEqual(deadlines.cap_timeout(10), 2)
+            with deadlines.deadline(60):
+                # an inner block never extends the outer budget
+                self.assertLessEqual(deadlines.remaining(), 2)
+        with deadlines.deadline(0):
+            with self.assertRaises(deadlines.DeadlineExceeded):
+                deadlines.cap_timeout(10)
+
+    @override_settings(CHAIN_CALL_BUDGET=1.5)
+    def test_middleware_sets_the_request_budget(self):
+        seen = []
+        middleware = deadlines.deadline_middleware(lambda request: seen.append(deadlines.remaining()))
+        middleware(None)
+        self.assertTrue(0 < seen[0] <= 1.5)
+        self.assertIsNone(deadlines.remaining())
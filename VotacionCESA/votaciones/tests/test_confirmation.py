@@ -0,0 +1,87 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..confirmation import ConfirmationService
+
+
+class FakeRoundClient:
+    """Confirms each txid at a given round; counts algod calls."""
+
+    def __init__(self, confirm_at):
+        self.round = 100
+        self.confirm_at = confirm_at
+        self.calls = {'status': 0, 'status_after_block': 0, 'pending_transaction_info': 0}
+        self.lock = threading.Lock()
+
+    def status(self):
+        self.calls['status'] += 1
+        return {'last-round': self.round}
+
+    def status_after_block(self, round_num):
+        self.calls['status_after_block'] += 1
+        with self.lock:
+            self.round = round_num + 1
+        return {'last-round': self.round}
+
+    def pending_transaction_info(self, txid):
+        self.calls['pending_transaction_info'] += 1
+        confirm_round = self.confirm_at[txid]
+        if confirm_round is None:
+            return {'pool-error': 'overspend'}
+        return {'confirmed-round': confirm_round if self.round >= confirm_round else 0}
+
+
+class ConfirmationServiceTests(SimpleTestCase):
+    def test_one_poll_loop_serves_all_outstanding_txids(self):
+        confirm_at = {f'TX{i}': 102 for i in range(50)}
+        client = FakeRoundClient(confirm_at)
+        service = ConfirmationService(client)
+        # hold the chain at round 100 until every txid is tracked
+        with client.lock:
+            futures = [service.submit(txid) for txid in confirm_at]
+        for future in futures:
+            self.assertEqual(future.result(timeout=5)['confirmed-round'], 102)
+        # rounds 100, 101, 102: one status read plus one follow-up per round, not per txid
+        self.assertLessEqual(client.calls['status'], 3)
+        self.assertEqual(service.outstanding(), 0)
+
+    def test_pool_error_and_timeout_fail_the_future(self):
+        client = FakeRoundClient({'BAD': None, 'SLOW': 10_000})
+        service = ConfirmationService(client, timeout_rounds=2)
+        bad = service.submit('BAD')
+        slow = service.submit('SLOW')
+        with self.assertRaises(RuntimeError):
+            bad.result(timeout=5)
+        with self.assertRaises(TimeoutError):
+            slow.result(timeout=5)
+
+    def test_algod_outage_fails_the_waiters(self):
+        client = FakeRoundClient({'TX': 102})
+        client.status = mock.Mock(side_effect=ConnectionError('algod down'))
+        service = ConfirmationService(client, max_status_failures=2)
+        with self.assertRaises(TimeoutError):
+            service.wait('TX')
+        self.assertEqual(service.outstanding(), 0)
+
+    def test_stalled_rounds_hit_the_wall_clock_deadline(self):
+        client = FakeRoundClient({'TX': 10_000})
+        # algod answers, but no new round is ever produced
+        client.status_after_block = mock.Mock(side_effect=lambda round_num: time.sleep(0.05))
+        service = ConfirmationService(client, timeout_rounds=2, round_seconds=0.1)
+        started = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            service.wait('TX')
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(service.outstanding(), 0)
+
+    def test_wait_all_reports_each_failure(self):
+        client = FakeRoundClient({'OK1': 101, 'OK2': 102, 'BAD': None})
+        service = ConfirmationService(client)
+        errors = service.wait_all(['OK1', 'OK2', 'BAD'])
+        self.assertEqual(list(errors), ['BAD'])
+        self.assertIsInstance(errors['BAD'], RuntimeError)
+        self.assertLessEqual(client.calls['status'], 3)
+        self.assertEqual(service.outstanding(), 0)
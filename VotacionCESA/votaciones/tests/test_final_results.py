@@ -0,0 +1,92 @@
+import hashlib
+import io
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .. import final_results
+from ..models import Candidate, CandidateTally, Election, ElectionTally, FinalResult, OnChainRecord, PDFReport, Voter, VoteOutbox
+from ..views import _record_vote
+from .test_results_cache import RESULTS_CACHES
+
+User = get_user_model()
+
+
+@override_settings(CACHES=RESULTS_CACHES, RESULTS_CACHE_ENABLED=False)
+class FinalResultsTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.election = Election.objects.create(name='E', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.a = Candidate.objects.create(name='A', list_name='Lista A', election=self.election)
+        self.b = Candidate.objects.create(name='B', list_name='Lista B', election=self.election)
+        voters = [Voter.objects.create(user=User.objects.create_user(username=f'v{i}'), control_number=f'V{i}') for i in range(4)]
+        for voter, candidate in zip(voters, (self.a, self.a, self.b)):
+            _record_vote(voter, candidate, self.election)
+        for i in range(3):
+            OnChainRecord.objects.create(txid=f'TX{i}', candidate=self.a, election=self.election)
+        VoteOutbox.objects.update(status=VoteOutbox.STATUS_CONFIRMED)
+
+    def close(self):
+        Election.objects.filter(pk=self.election.pk).update(end_date=timezone.now() - timedelta(minutes=1))
+        self.election.refresh_from_db()
+
+    def get(self, path):
+        return self.client.get(path, {'election_id': self.election.id}).json()
+
+    def test_open_elections_are_not_frozen(self):
+        self.assertIsNone(final_results.for_election(self.election.id))
+        with self.assertRaises(final_results.ElectionNotClosed):
+            final_results.freeze(self.election)
+
+    def test_first_read_after_the_end_freezes_the_results(self):
+        live = self.get('/api/candidates/')
+        self.close()
+        self.assertEqual(self.get('/api/candidates/'), live)
+        result = FinalResult.objects.get(election=self.election)
+        self.assertEqual((result.total_votes, result.eligible_voters, result.record_count), (3, 4, 3))
+        expected = hashlib.sha256(b''.join(f'TX{i}\n'.encode() for i in range(3))).hexdigest()
+        self.assertEqual(result.records_digest, expected)
+
+        # later changes to the tallies no longer show, and each read is one query
+        CandidateTally.objects.update(votes=99)
+        ElectionTally.objects.update(total_votes=99)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.get('/api/candidates/'), live)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(self.get('/api/stats/'), {'total_votes': 3, 'eligible_voters': 4, 'participation': 75.0})
+
+    def test_pending_votes_block_the_automatic_freeze(self):
+        VoteOutbox.objects.filter(pk=VoteOutbox.objects.first().pk).update(status=VoteOutbox.STATUS_PENDING)
+        self.close()
+        self.get('/api/stats/')
+        self.assertFalse(FinalResult.objects.exists())
+
+        call_command('close_elections', stdout=io.StringIO())
+        self.assertFalse(FinalResult.objects.exists())
+        call_command('close_elections', '--force', stdout=io.StringIO())
+        self.assertTrue(FinalResult.objects.filter(election=self.election).exists())
+
+    def test_snapshot_is_immutable(self):
+        self.close()
+        result = final_results.freeze(self.election)
+        self.assertEqual(final_results.freeze(self.election), result)
+        result.total_votes = 0
+        with self.assertRaises(ValueError):
+            result.save()
+
+    def test_pdf_report_uses_the_snapshot(self):
+        self.close()
+        final_results.freeze(self.election)
+        ElectionTally.objects.update(total_votes=99)
+        User.objects.create_user(username='staff', password='pass', is_staff=True)
+        self.client.login(username='staff', password='pass')
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media):
+            response = self.client.get(f'/manage/report/pdf/{self.election.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PDFReport.objects.get().total_votes, 3)
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from .. import idempotency, results_cache
+from ..models import Candidate, Election, IdempotencyRecord, Voter, VoteOutbox
+from .test_admission import use_temp_admission_state
+from .test_results_cache import RESULTS_CACHES
+
+User = get_user_model()
+
+
+@override_settings(CACHES=RESULTS_CACHES)
+class IdempotentVoteTests(TestCase):
+    def setUp(self):
+        results_cache._cache().clear()
+        use_temp_admission_state(self)
+        self.client = Client()
+        self.user = User.objects.create_user(username='retry', password='pass')
+        Voter.objects.create(user=self.user, control_number='R1')
+        now = timezone.now()
+        self.election = Election.objects.create(name='Retry', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.candidate = Candidate.objects.create(name='Alice', election=self.election)
+        self.client.login(username='retry', password='pass')
+
+    def vote(self, key, candidate=None):
+        return self.client.post('/api/vote/', {'candidate_id': str((candidate or self.candidate).id)},
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_original_response(self):
+        first = self.vote('k-1')
+        self.assertEqual(first.status_code, 202)
+
+        retry = self.vote('k-1')
+        self.assertEqual(retry.status_code, 202)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(VoteOutbox.objects.count(), 1)
+
+    def test_a_new_key_runs_the_view(self):
+        self.vote('k-1')
+        second = self.vote('k-2')
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(second.json()['error'], 'user already voted in this election')
+
+    def test_key_reused_with_different_data_is_rejected(self):
+        other = Candidate.objects.create(name='Bob', election=self.election)
+        self.vote('k-1')
+        resp = self.vote('k-1', candidate=other)
+        self.assertEqual(resp.status_code, 422)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0.1)
+    def test_duplicate_of_an_in_flight_request_gets_409(self):
+        first = self.vote('k-1')
+        # pretend the first request is still running
+        IdempotencyRecord.objects.filter(key='k-1').update(response_status=None, response_body=None)
+        resp = self.vote('k-1')
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(first.status_code, 202)
+
+    def test_expired_record_is_not_replayed(self):
+        self.vote('k-1')
+        IdempotencyRecord.objects.filter(key='k-1').update(expires_at=timezone.now() - timedelta(seconds=1))
+        resp = self.vote('k-1')
+        self.assertEqual(resp.status_code, 400)
+        self.assertNotIn('Idempotent-Replayed', resp)
+
+    def test_in_flight_records_only_hold_a_short_lease(self):
+        self.vote('k-1')
+        record = IdempotencyRecord.objects.get(key='k-1')
+        self.assertGreater(record.expires_at, timezone.now() + timedelta(hours=23))
+
+        record, created = idempotency._claim(self.user, 'k-2', 'hash')
+        self.assertTrue(created)
+        self.assertLess(record.expires_at, timezone.now() + timedelta(minutes=5))
+
+    def test_key_of_a_crashed_request_is_reclaimed_after_its_lease(self):
+        other = User.objects.create_user(username='crash', password='pass')
+        Voter.objects.create(user=other, control_number='R2')
+        # the worker died before storing a response; its lease has run out
+        IdempotencyRecord.objects.create(user=other, key='k-1', request_hash='stale',
+                                         expires_at=timezone.now() - timedelta(seconds=1))
+        self.client.login(username='crash', password='pass')
+        resp = self.vote('k-1')
+        self.assertEqual(resp.status_code, 202)
@@ -0,0 +1,111 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import live_results
+from ..models import Candidate, Election, Voter
+from ..views import _record_vote
+from .test_results_cache import RESULTS_CACHES
+
+User = get_user_model()
+
+
+def parse(chunk):
+    fields = dict(line.split(': ', 1) for line in chunk.decode().strip().splitlines())
+    return fields['event'], json.loads(fields['data'])
+
+
+@override_settings(CACHES=RESULTS_CACHES, LIVE_RESULTS_INTERVAL=0.01, LIVE_RESULTS_HEARTBEAT=5)
+class LiveResultsStreamTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.election = Election.objects.create(name='E', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.a = Candidate.objects.create(name='A', election=self.election)
+        self.b = Candidate.objects.create(name='B', election=self.election)
+        self.voters = [Voter.objects.create(user=User.objects.create_user(username=f'v{i}'), control_number=f'V{i}')
+                       for i in range(4)]
+
+    def vote(self, voter, candidate):
+        # the results version is bumped when the vote commits
+        with self.captureOnCommitCallbacks(execute=True):
+            _record_vote(voter, candidate, self.election)
+
+    async def next_event(self, stream):
+        while True:
+            chunk = await asyncio.wait_for(anext(stream), 5)
+            if chunk.startswith(b'event:'):
+                return parse(chunk)
+
+    async def test_snapshot_then_deltas_of_committed_votes(self):
+        await sync_to_async(self.vote)(self.voters[0], self.a)
+        response = await self.async_client.get('/api/results/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        try:
+            event, data = await self.next_event(stream)
+            self.assertEqual(event, 'snapshot')
+            self.assertEqual(data['candidates'], [{'candidate_id': self.a.id, 'votes': 1}])
+            self.assertEqual(data['total_votes'], 1)
+            self.assertEqual(data['participation'], 25.0)
+
+            await sync_to_async(self.vote)(self.voters[1], self.b)
+            # the first check publishes the state it finds; later ones only what changed
+            while True:
+                event, data = await self.next_event(stream)
+                if data['total_votes'] == 2:
+                    break
+            self.assertEqual(event, 'tally')
+            self.assertIn({'candidate_id': self.b.id, 'votes': 1}, data['candidates'])
+
+            await sync_to_async(self.vote)(self.voters[2], self.b)
+            event, data = await self.next_event(stream)
+            self.assertEqual(data['candidates'], [{'candidate_id': self.b.id, 'votes': 2}])
+            self.assertEqual((data['total_votes'], data['participation']), (3, 75.0))
+        finally:
+            await stream.aclose()
+
+    async def test_closing_the_stream_unsubscribes(self):
+        stream = live_results.stream(self.election.id)
+        await anext(stream)
+        hub = live_results.broadcaster()
+        self.assertEqual(len(hub.subscribers[self.election.id]), 1)
+        await stream.aclose()
+        self.assertNotIn(self.election.id, hub.subscribers)
+
+    async def test_invalid_or_missing_election(self):
+        self.assertEqual((await self.async_client.get('/api/results/stream/', {'election_id': 'x'})).status_code, 400)
+        self.assertEqual((await self.async_client.get('/api/results/stream/', {'election_id': 999})).status_code, 404)
+
+    def test_wsgi_requests_are_refused(self):
+        response = self.client.get('/api/results/stream/')
+        self.assertEqual(response.status_code, 503)
+
+
+class BroadcasterTests(TestCase):
+    @override_settings(LIVE_RESULTS_BUFFER=2)
+    async def test_slow_subscriber_is_dropped_and_others_keep_receiving(self):
+        hub = live_results.Broadcaster()
+        hub.task = asyncio.get_running_loop().create_future()  # no poller for this test
+        slow, fast = hub.subscribe(1), hub.subscribe(1)
+        dropped = live_results.stats()['dropped']
+        for i in range(3):
+            hub.publish(1, b'event %d' % i)
+            await fast.queue.get()
+        self.assertTrue(slow.dropped)
+        self.assertIsNone(slow.queue.get_nowait())
+        self.assertEqual(hub.subscribers[1], {fast})
+        self.assertEqual(live_results.stats()['dropped'], dropped + 1)
+        hub.unsubscribe(fast)
+        self.assertEqual(hub.subscribers, {})
+        hub.task.cancel()
+
+    def test_delta_only_carries_changed_candidates(self):
+        old = {'election_id': 1, 'votes': {1: 3, 2: 1}, 'total_votes': 4, 'eligible_voters': 10, 'participation': 40.0}
+        new = dict(old, votes={1: 3, 2: 2}, total_votes=5, participation=50.0)
+        self.assertEqual(live_results.delta(old, new)['candidates'], [{'candidate_id': 2, 'votes': 2}])
+        self.assertIsNone(live_results.delta(new, dict(new)))
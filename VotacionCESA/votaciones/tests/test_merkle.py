@@ -0,0 +1,100 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
+from unittest import mock
+
+from ..models import Candidate, Election, Vote, Voter, VoteOutbox, OnChainRecord, MerkleBatch
+from .. import algorand_integration, merkle, outbox
+from .test_results_cache import RESULTS_CACHES
+
+
+User = get_user_model()
+
+
+class MerkleTreeTests(TestCase):
+    def test_every_leaf_proves_against_root(self):
+        for size in (1, 2, 3, 5, 8, 13):
+            leaves = [merkle.leaf_hash(1, i % 3, merkle.new_salt()) for i in range(size)]
+            root, proofs = merkle.build_tree(leaves)
+            for leaf, proof in zip(leaves, proofs):
+                self.assertTrue(merkle.verify_proof(leaf, proof, root))
+            other = merkle.leaf_hash(1, 99, 'x')
+            self.assertFalse(merkle.verify_proof(other, proofs[0], root))
+
+
+@override_settings(CACHES=RESULTS_CACHES, VOTE_ANCHOR_MODE='merkle', VOTE_MERKLE_BATCH_SIZE=256)
+class MerkleAnchoringTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.election = Election.objects.create(name='Merkle', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.candidates = [Candidate.objects.create(name=f'M{i}', election=self.election) for i in range(2)]
+        self.entries = []
+        for i in range(7):
+            user = User.objects.create_user(username=f'merkle{i}', password='pass')
+            voter = Voter.objects.create(user=user, control_number=f'MRK{i}')
+            vote = Vote.objects.create(voter=voter, candidate=self.candidates[i % 2], election=self.election)
+            self.entries.append(outbox.enqueue_vote(vote))
+
+    def test_batch_is_anchored_once_and_receipts_verify(self):
+        summary = outbox.process_due_entries()
+        self.assertEqual(summary['confirmed'], 7)
+        self.assertEqual(MerkleBatch.objects.count(), 1)
+        batch = MerkleBatch.objects.get()
+        self.assertEqual(batch.leaf_count, 7)
+        self.assertEqual(OnChainRecord.objects.filter(merkle_batch=batch).count(), 7)
+        self.assertEqual(OnChainRecord.objects.filter(candidate=self.candidates[0]).count(), 4)
+
+        client = Client()
+        status = client.get(f'/api/vote/status/{self.entries[3].receipt_id}/').json()
+        self.assertEqual(status['status'], VoteOutbox.STATUS_CONFIRMED)
+        self.assertEqual(status['txid'], batch.txid)
+        receipt = status['inclusion_receipt']
+        self.assertEqual(receipt['root'], batch.root)
+
+        resp = client.post('/api/receipts/verify/', json.dumps(receipt), content_type='application/json')
+        self.assertTrue(resp.json()['valid'])
+        self.assertEqual(resp.json()['anchor_txid'], batch.txid)
+
+        # tampering with the vote data breaks the receipt
+        forged = dict(receipt, candidate_id=self.candidates[1].id if receipt['candidate_id'] == self.candidates[0].id else self.candidates[0].id)
+        resp = client.post('/api/receipts/verify/', json.dumps(forged), content_type='application/json')
+        self.assertFalse(resp.json()['valid'])
+
+        # a bare root (or any internal node) is not a receipt: the leaf comes from the vote data
+        for bogus in ({'leaf': batch.root, 'proof': []}, dict(receipt, leaf=batch.root, proof=[])):
+            resp = client.post('/api/receipts/verify/', json.dumps(bogus), content_type='application/json')
+            self.assertFalse(resp.status_code == 200 and resp.json()['valid'], bogus)
+
+        # the batch must belong to the receipt's election
+        other = {'salt': 's', 'election_id': receipt['election_id'] + 1, 'candidate_id': receipt['candidate_id'], 'proof': []}
+        MerkleBatch.objects.create(election_id=receipt['election_id'], txid='OTHER', leaf_count=1,
+                                   root=merkle.leaf_hash(other['election_id'], other['candidate_id'], 's'))
+        resp = client.post('/api/receipts/verify/', json.dumps(other), content_type='application/json')
+        self.assertFalse(resp.json()['valid'])
+
+        for proof in ([{'side': 'R'}], [{'side': 'R', 'hash': 'zz'}], [1], ['x'], [{'side': 'X', 'hash': batch.root}], 'x'):
+            resp = client.post('/api/receipts/verify/', json.dumps(dict(receipt, proof=proof)), content_type='application/json')
+            self.assertEqual(resp.status_code, 400, proof)
+
+    def test_unconfirmed_anchor_is_resent_with_the_same_tree(self):
+        sent = {}
+
+        def send_anchor(election_id, root, counts, on_signed=None, **kwargs):
+            sent['root'] = root
+            on_signed(['ANCHOR'], 'c2lnbmVk')
+            raise TimeoutError('slow')
+
+        with mock.patch.object(algorand_integration, 'send_anchor_tx', side_effect=send_anchor):
+            self.assertEqual(outbox.process_due_entries()['failed'], 7)
+        VoteOutbox.objects.update(next_attempt_at=timezone.now())
+        with mock.patch.object(algorand_integration, 'resend_signed', return_value=algorand_integration.IN_LEDGER) as resend:
+            self.assertEqual(outbox.process_due_entries()['confirmed'], 7)
+
+        resend.assert_called_once_with('c2lnbmVk')
+        batch = MerkleBatch.objects.get()
+        self.assertEqual((batch.txid, batch.root), ('ANCHOR', sent['root']))
+        for record in OnChainRecord.objects.all():
+            self.assertTrue(merkle.verify_proof(record.txid, record.merkle_proof, batch.root))
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .. import reference_data, results_cache
+from ..models import Candidate, CandidateMember, Election
+
+RESULTS_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'results': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'reference-tests'},
+}
+
+
+@override_settings(CACHES=RESULTS_CACHES, RESULTS_CACHE_ENABLED=False)
+class ReferenceDataTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.election = Election.objects.create(name='E', start_date=self.now - timedelta(hours=1), end_date=self.now + timedelta(hours=1))
+        self.candidate = Candidate.objects.create(name='A', list_name='Lista A', election=self.election)
+        CandidateMember.objects.create(candidate=self.candidate, full_name='Ana', role='Presidenta')
+        self.unassigned = Candidate.objects.create(name='B')
+
+    def test_loads_once_then_serves_from_memory(self):
+        with CaptureQueriesContext(connection) as ctx:
+            snapshot = reference_data.snapshot()
+        self.assertEqual(len(ctx.captured_queries), 2)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertIs(reference_data.snapshot(), snapshot)
+            self.assertEqual(reference_data.active_election().id, self.election.id)
+            candidates = reference_data.candidates(self.election.id)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual([c.id for c in candidates], [self.candidate.id])
+        self.assertEqual(candidates[0].members, (reference_data.MemberRef('Ana', 'Presidenta'),))
+        self.assertEqual({c.id for c in reference_data.candidates(self.election.id, include_unassigned=True)},
+                         {self.candidate.id, self.unassigned.id})
+
+    def test_changes_invalidate_the_snapshot(self):
+        reference_data.snapshot()
+        Candidate.objects.filter(pk=self.candidate.pk).first().delete()
+        self.assertEqual([c.id for c in reference_data.candidates(self.election.id)], [])
+        member = CandidateMember.objects.create(candidate=self.unassigned, full_name='Beto')
+        self.assertEqual(reference_data.candidates(self.election.id, include_unassigned=True)[0].members[0].full_name, 'Beto')
+        member.delete()
+        self.assertEqual(reference_data.candidates(self.election.id, include_unassigned=True)[0].members, ())
+
+    def test_a_bump_from_another_worker_reloads(self):
+        snapshot = reference_data.snapshot()
+        # a queryset update sends no signal; the worker that made it bumps the shared version
+        Election.objects.filter(pk=self.election.pk).update(name='Renamed')
+        self.assertIs(reference_data.snapshot(), snapshot)
+        results_cache.bump(reference_data.SCOPE)
+        self.assertEqual(reference_data.election(self.election.id).name, 'Renamed')
+
+    def test_expires_at_the_next_election_boundary(self):
+        later = Election.objects.create(name='L', start_date=self.now + timedelta(minutes=30), end_date=self.now + timedelta(hours=2))
+        snapshot = reference_data.snapshot(self.now)
+        self.assertEqual(snapshot.expires_at, later.start_date)
+        self.assertIs(reference_data.snapshot(later.start_date - timedelta(seconds=1)), snapshot)
+        with CaptureQueriesContext(connection) as ctx:
+            reloaded = reference_data.snapshot(later.start_date)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(reloaded.expires_at, self.election.end_date)
+        # both are open now; the first by id wins, as before
+        self.assertEqual(reference_data.active_election(later.start_date).id, self.election.id)
+
+    def test_candidates_endpoint_only_queries_the_tallies(self):
+        self.client.get('/api/candidates/', {'election_id': self.election.id})
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/candidates/').json()
+        self.assertEqual([c['id'] for c in data['candidates']], [self.candidate.id])
+        self.assertEqual(data['candidates'][0]['members'], [{'full_name': 'Ana', 'role': 'Presidenta'}])
+        self.assertEqual(len(ctx.captured_queries), 1, [q['sql'] for q in ctx.captured_queries])
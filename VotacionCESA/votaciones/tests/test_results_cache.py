@@ -0,0 +1,203 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .. import results_cache
+from ..models import Candidate, Election, Voter
+from ..views import _record_vote
+
+User = get_user_model()
+
+RESULTS_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'results': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'results-tests'},
+}
+
+
+@override_settings(CACHES=RESULTS_CACHES, RESULTS_CACHE_TTL=60)
+class ResultsCacheTests(TestCase):
+    def setUp(self):
+        results_cache._cache().clear()
+        now = timezone.now()
+        self.election = Election.objects.create(name='E', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.candidate = Candidate.objects.create(name='A', election=self.election)
+        self.voter = Voter.objects.create(user=User.objects.create_user(username='v'), control_number='V1')
+
+    def get(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(path, {'election_id': self.election.id}).json()
+        return data, len(ctx.captured_queries)
+
+    def test_second_read_is_served_from_the_cache(self):
+        for path in ('/api/candidates/', '/api/stats/'):
+            first, queries = self.get(path)
+            self.assertGreater(queries, 0, path)
+            self.assertEqual(self.get(path), (first, 0), path)
+        # the elections come from the in-process reference data, already loaded above
+        first, _ = self.get('/api/elections/')
+        self.assertEqual(self.get('/api/elections/'), (first, 0))
+
+    def test_committed_vote_invalidates_its_election(self):
+        other = Election.objects.create(name='O', start_date=self.election.start_date, end_date=self.election.end_date)
+        self.get('/api/candidates/')
+        self.client.get('/api/stats/', {'election_id': other.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _record_vote(self.voter, self.candidate, self.election)
+
+        data, queries = self.get('/api/candidates/')
+        self.assertGreater(queries, 0)
+        self.assertEqual(data['candidates'][0]['votes_count'], 1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/stats/', {'election_id': other.id})
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_model_changes_invalidate(self):
+        self.get('/api/candidates/')
+        Candidate.objects.filter(pk=self.candidate.pk).get().save()
+        self.assertGreater(self.get('/api/candidates/')[1], 0)
+
+    def test_etag_and_304_without_queries(self):
+        first = self.client.get('/api/candidates/', {'election_id': self.election.id})
+        etag = first['ETag']
+        self.assertTrue(etag.startswith('"'))
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.client.get('/api/candidates/', {'election_id': self.election.id}, headers={'If-None-Match': etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _record_vote(self.voter, self.candidate, self.election)
+        changed = self.client.get('/api/candidates/', {'election_id': self.election.id}, headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_matching_etag_is_answered_without_building(self):
+        builder = mock.Mock(return_value={'n': 1})
+        request = mock.Mock(headers={})
+        etag = results_cache.json_response(request, 't', 'p', ('meta',), builder)['ETag']
+        request.headers = {'If-None-Match': etag}
+        with mock.patch.object(results_cache, 'get_entry') as get_entry:
+            self.assertEqual(results_cache.json_response(request, 't', 'p', ('meta',), builder).status_code, 304)
+        get_entry.assert_not_called()
+        self.assertEqual(builder.call_count, 1)
+
+        # the ETag follows the versions and the parameters
+        results_cache.bump('meta')
+        self.assertEqual(results_cache.json_response(request, 't', 'p', ('meta',), builder).status_code, 200)
+        request.headers = {'If-None-Match': etag}
+        self.assertEqual(results_cache.json_response(request, 't', 'q', ('meta',), builder).status_code, 200)
+
+    @override_settings(RESULTS_GZIP_MIN_BYTES=200)
+    def test_large_bodies_are_gzipped_for_clients_that_accept_it(self):
+        import gzip
+
+        Candidate.objects.filter(pk=self.candidate.pk).update(manifesto='Propuesta ' * 100)
+        Candidate.objects.get(pk=self.candidate.pk).save()
+        plain = self.client.get('/api/candidates/', {'election_id': self.election.id})
+        zipped = self.client.get('/api/candidates/', {'election_id': self.election.id}, headers={'Accept-Encoding': 'gzip, br'})
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(zipped['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(zipped.content), plain.content)
+        self.assertLess(len(zipped.content), len(plain.content) / 4)
+        self.assertIn('Accept-Encoding', zipped['Vary'])
+        self.assertNotEqual(zipped['ETag'], plain['ETag'])
+
+        small = self.client.get('/api/stats/', {'election_id': self.election.id}, headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', small)
+
+        http = results_cache.http_stats()['candidates']
+        self.assertLess(http['bytes_sent'], http['bytes_uncompressed'])
+
+    @override_settings(RESULTS_CACHE_TTL=0)
+    def test_expired_entry_is_served_stale_while_one_rebuild_runs(self):
+        builds = []
+        started = []
+
+        def builder():
+            builds.append(1)
+            return {'n': len(builds)}
+
+        with mock.patch.object(results_cache.threading, 'Thread') as thread:
+            thread.side_effect = lambda target, args, daemon: started.append((target, args)) or mock.Mock()
+            self.assertEqual(results_cache.get_or_build('t', '', ('meta',), builder), {'n': 1})
+            self.assertEqual(results_cache.get_or_build('t', '', ('meta',), builder), {'n': 1})
+            self.assertEqual(results_cache.get_or_build('t', '', ('meta',), builder), {'n': 1})
+        # only the worker that took the lock rebuilds
+        self.assertEqual(len(started), 1)
+        target, args = started[0]
+        with mock.patch.object(results_cache.connections, 'close_all'):
+            target(*args)
+        with override_settings(RESULTS_CACHE_TTL=60):
+            # the rebuilt entry (TTL 0, so stale again) carries the new value
+            self.assertEqual(results_cache.get_or_build('t', '', ('meta',), builder), {'n': 2})
+        self.assertGreaterEqual(results_cache.stats()['rebuilds'], 1)
+
+
+    def test_new_version_is_rebuilt_once_while_others_serve_the_previous_one(self):
+        builds = []
+
+        def builder():
+            builds.append(1)
+            return {'n': len(builds)}
+
+        self.assertEqual(results_cache.get_or_build('t', '', ('meta',), builder), {'n': 1})
+        results_cache.bump('meta')
+        # another worker holds the rebuild lock: the previous version is served, nothing is built
+        results_cache._cache().add('results:t::lock', 1)
+        self.assertEqual(results_cache.get_or_build('t', '', ('meta',), builder), {'n': 1})
+        self.assertEqual(len(builds), 1)
+        # the lock holder's entry is picked up as soon as it is stored
+        results_cache._cache().delete('results:t::lock')
+        self.assertEqual(results_cache.get_or_build('t', '', ('meta',), builder), {'n': 2})
+        self.assertEqual(results_cache.get_or_build('t', '', ('meta',), builder), {'n': 2})
+        self.assertEqual(len(builds), 2)
+
+    def test_first_build_waits_for_the_lock_holder(self):
+        results_cache._cache().add('results:t::lock', 1)
+        stored = {'n': 'other worker'}
+
+        def other_worker_stores(seconds):
+            state = results_cache._state(('meta',))
+            results_cache._store('results:t::' + state, 'results:t:', 't', stored, results_cache._etag('t', '', state))
+
+        with mock.patch.object(results_cache.time, 'sleep', side_effect=other_worker_stores):
+            self.assertEqual(results_cache.get_or_build('t', '', ('meta',), lambda: {'n': 'built'}), stored)
+
+@override_settings(CACHES=RESULTS_CACHES, RESULTS_CACHE_TTL=60)
+class BootstrapTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        Election.objects.create(name='Old', start_date=now - timedelta(days=9), end_date=now - timedelta(days=8))
+        self.election = Election.objects.create(name='E', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.candidate = Candidate.objects.create(name='A', election=self.election)
+        self.voter = Voter.objects.create(user=User.objects.create_user(username='v'), control_number='V1')
+
+    def test_one_payload_with_the_active_election(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _record_vote(self.voter, self.candidate, self.election)
+        data = self.client.get('/api/bootstrap/').json()
+        self.assertEqual(len(data['elections']), 2)
+        self.assertEqual(data['active_election']['id'], self.election.id)
+        self.assertEqual([c['votes_count'] for c in data['candidates']], [1])
+        self.assertEqual(data['stats'], self.client.get('/api/stats/', {'election_id': self.election.id}).json())
+
+    def test_public_pages_embed_the_payload(self):
+        import json
+        import re
+
+        for path in ('/', '/resultados/', '/blockchain/'):
+            html = self.client.get(path).content.decode()
+            embedded = re.search(r'<script id="bootstrap-data" type="application/json">(.*?)</script>', html, re.S)
+            self.assertIsNotNone(embedded, path)
+            self.assertEqual(json.loads(embedded.group(1)), self.client.get('/api/bootstrap/').json(), path)
+            self.assertIn('<div id="statStatus" class="h4 mt-1 text-success">Activa</div>', html)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/resultados/')
+        self.assertEqual(len(ctx.captured_queries), 0)
@@ -0,0 +1,70 @@
+import gzip
+import io
+import json
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import final_results, results_cache, static_export
+from ..models import Candidate, Election, OnChainRecord
+from .test_results_cache import RESULTS_CACHES
+
+
+@override_settings(BLOCKCHAIN_RECORDS_PAGE_SIZE=2, CACHES=RESULTS_CACHES)
+class StaticExportTests(TestCase):
+    def setUp(self):
+        results_cache._cache().clear()
+        now = timezone.now()
+        self.election = Election.objects.create(name='Cerrada', start_date=now - timedelta(days=2), end_date=now - timedelta(days=1))
+        self.candidate = Candidate.objects.create(name='A', election=self.election)
+        for i in range(3):
+            OnChainRecord.objects.create(txid=f'TX{i}', candidate=self.candidate, election=self.election)
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def export(self, *args):
+        call_command('export_results', '--election', str(self.election.id), '--output', str(self.root), *args, stdout=io.StringIO())
+        return self.root / str(self.election.id)
+
+    def test_pages_and_payloads_with_gzip_copies(self):
+        out = self.export()
+        expected = {'resultados.html', 'blockchain.html', 'bootstrap.json', 'candidates.json', 'stats.json',
+                    'records-1.json', 'records-2.json'}
+        self.assertEqual(set(json.loads((out / 'manifest.json').read_text())), expected)
+        for name in expected:
+            self.assertEqual(gzip.decompress((out / (name + '.gz')).read_bytes()), (out / name).read_bytes(), name)
+
+        stats = self.client.get('/api/stats/', {'election_id': self.election.id}).json()
+        self.assertEqual(json.loads((out / 'stats.json').read_text()), stats)
+        pages = [json.loads((out / f'records-{n}.json').read_text()) for n in (1, 2)]
+        self.assertEqual([r['txid'] for p in pages for r in p['records']], ['TX2', 'TX1', 'TX0'])
+        self.assertFalse(pages[1]['has_more'])
+
+        html = (out / 'resultados.html').read_text()
+        embedded = re.search(r'<script id="bootstrap-data" type="application/json">(.*?)</script>', html, re.S)
+        self.assertEqual(json.loads(embedded.group(1)), json.loads((out / 'bootstrap.json').read_text()))
+        self.assertIn('const STATIC_RECORDS = true;', (out / 'blockchain.html').read_text())
+
+    def test_only_changed_files_are_rewritten(self):
+        self.export()
+        self.assertEqual(static_export.export_election(self.election, self.root)['written'], [])
+
+        self.election.name = 'Renombrada'
+        self.election.save(update_fields=['name'])
+        OnChainRecord.objects.filter(txid='TX0').delete()
+        summary = static_export.export_election(self.election, self.root)
+        self.assertEqual(set(summary['written']), {'bootstrap.json', 'resultados.html', 'blockchain.html', 'records-1.json'})
+        self.assertEqual(summary['removed'], ['records-2.json'])
+        self.assertFalse((self.root / str(self.election.id) / 'records-2.json.gz').exists())
+
+    def test_open_elections_are_refused(self):
+        Election.objects.filter(pk=self.election.pk).update(end_date=timezone.now() + timedelta(days=1))
+        with self.assertRaises(CommandError):
+            self.export()
+        self.assertFalse(final_results.for_election(self.election.id))
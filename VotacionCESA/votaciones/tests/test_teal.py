@@ -0,0 +1,157 @@
+import base64
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .. import algorand_smart_contract, teal
+from ..teal import itob
+
+NOW = 1_700_000_000
+CREATOR = base64.b32encode(b'\x01' * 36).decode().rstrip('=')
+VOTER = base64.b32encode(b'\x02' * 36).decode().rstrip('=')
+
+
+def window(begin, end):
+    return [itob(NOW + begin), itob(NOW + end)]
+
+
+class ApprovalProgramTests(SimpleTestCase):
+    def setUp(self):
+        self.program = teal.load_program()
+        self.ledger = teal.Ledger(latest_timestamp=NOW)
+        created = self.ledger.call(self.program, CREATOR, args=window(-10, 10) + window(-10, 10))
+        self.assertTrue(created.approved, created.error)
+        self.app_id = created.app_id
+
+    def vote(self, sender=VOTER, candidate_id=3):
+        return self.ledger.call(self.program, sender, self.app_id, args=[b'vote', itob(candidate_id)])
+
+    def test_create_stores_creator_and_periods(self):
+        state = self.ledger.globals[self.app_id]
+        self.assertEqual(state[b'Creator'], teal.address_bytes(CREATOR))
+        self.assertEqual(state[b'VoteEnd'], NOW + 10)
+
+    def test_opt_in_vote_and_profile(self):
+        opt_in = self.ledger.call(self.program, VOTER, self.app_id, teal.OPT_IN)
+        self.assertTrue(opt_in.approved, opt_in.error)
+        result = self.vote()
+        self.assertTrue(result.approved, result.error)
+        self.assertEqual(self.ledger.locals[(VOTER, self.app_id)], {b'Voted': 1, b'CandidateID': 3})
+        self.assertEqual(result.cost, sum(result.opcodes.values()))
+        self.assertEqual(result.opcodes['app_local_put'], 2)
+        self.assertLess(result.cost, teal.MAX_COST)
+
+    def test_rejections_leave_state_untouched(self):
+        self.assertEqual(self.vote().error, 'account is not opted in to the application')
+        self.ledger.call(self.program, VOTER, self.app_id, teal.OPT_IN)
+        self.vote()
+        second = self.vote(candidate_id=4)
+        self.assertFalse(second.approved)
+        self.assertEqual(second.error, 'assert failed')
+        self.assertEqual(self.ledger.locals[(VOTER, self.app_id)][b'CandidateID'], 3)
+
+        self.ledger.latest_timestamp = NOW + 60
+        self.assertFalse(self.ledger.call(self.program, CREATOR, self.app_id, teal.OPT_IN).approved)
+        self.assertFalse(self.ledger.opted_in(CREATOR, self.app_id))
+
+    def test_close_out_update_and_delete(self):
+        self.ledger.call(self.program, VOTER, self.app_id, teal.OPT_IN)
+        self.assertTrue(self.ledger.call(self.program, VOTER, self.app_id, teal.CLOSE_OUT).approved)
+        self.assertFalse(self.ledger.opted_in(VOTER, self.app_id))
+
+        self.assertFalse(self.ledger.call(self.program, VOTER, self.app_id, teal.UPDATE_APPLICATION).approved)
+        self.assertFalse(self.ledger.call(self.program, VOTER, self.app_id, teal.DELETE_APPLICATION).approved)
+        self.assertTrue(self.ledger.call(self.program, CREATOR, self.app_id, teal.DELETE_APPLICATION).approved)
+        self.assertFalse(self.vote().approved)
+
+    def test_unknown_noop_command_fails(self):
+        self.ledger.call(self.program, VOTER, self.app_id, teal.OPT_IN)
+        result = self.ledger.call(self.program, VOTER, self.app_id, args=[b'tally'])
+        self.assertEqual(result.error, 'err opcode executed')
+
+
+class InterpreterTests(SimpleTestCase):
+    def run_source(self, source, args=()):
+        return teal.Ledger().call(teal.Program(source), CREATOR, args=args)
+
+    def test_arithmetic_and_types(self):
+        self.assertTrue(self.run_source('int 2\nint 3\n+\nint 5\n==').approved)
+        self.assertEqual(self.run_source('int 0\nint 1\n-').error, 'uint64 overflow')
+        self.assertEqual(self.run_source('int 1\nbyte "a"\n==').error, 'cannot compare uint64 with bytes')
+        self.assertEqual(self.run_source('byte 0x000000000000000001\nbtoi').error, 'btoi arg too long')
+        self.assertEqual(self.run_source('int 1\nint 1').error, 'stack must hold exactly one value at the end, has 2')
+
+    def test_cost_budget(self):
+        loop = 'loop:\nint 1\nbnz loop'
+        result = self.run_source(loop)
+        self.assertFalse(result.approved)
+        self.assertEqual(result.cost, teal.MAX_COST + 1)
+
+    def test_unsupported_source_is_rejected_when_assembled(self):
+        with self.assertRaises(teal.AssembleError):
+            teal.Program('sha256')
+        with self.assertRaises(teal.AssembleError):
+            teal.Program('b nowhere')
+
+    def test_state_from_api(self):
+        kv = [{'key': base64.b64encode(b'Voted').decode(), 'value': {'type': 2, 'uint': 1}},
+              {'key': base64.b64encode(b'Creator').decode(), 'value': {'type': 1, 'bytes': base64.b64encode(b'ab').decode()}}]
+        self.assertEqual(teal.state_from_api(kv), {b'Voted': 1, b'Creator': b'ab'})
+
+
+class LocalVoteCheckTests(SimpleTestCase):
+    def test_check_uses_the_chain_state(self):
+        def kv(key, uint):
+            return {'key': base64.b64encode(key).decode(), 'value': {'type': 2, 'uint': uint}}
+
+        class FakeClient:
+            voted = 0
+
+            def application_info(self, app_id):
+                import time
+                now = int(time.time())
+                return {'params': {'global-state': [kv(b'VoteBegin', now - 60), kv(b'VoteEnd', now + 60)]}}
+
+            def account_application_info(self, address, app_id):
+                return {'app-local-state': {'key-value': [kv(b'Voted', self.voted)]}}
+
+        client = FakeClient()
+        self.assertTrue(algorand_smart_contract.check_vote_locally(client, VOTER, 7, 3).approved)
+        client.voted = 1
+        self.assertFalse(algorand_smart_contract.check_vote_locally(client, VOTER, 7, 3).approved)
+
+    def test_submit_vote_signs_as_the_mnemonic_account(self):
+        from algosdk import account, mnemonic, transaction
+
+        private_key, address = account.generate_account()
+        sent = []
+
+        def kv(key, uint):
+            return {'key': base64.b64encode(key).decode(), 'value': {'type': 2, 'uint': uint}}
+
+        class FakeClient:
+            def application_info(self, app_id):
+                import time
+                now = int(time.time())
+                return {'params': {'global-state': [kv(b'VoteBegin', now - 60), kv(b'VoteEnd', now + 60)]}}
+
+            def account_application_info(self, address, app_id):
+                return {'app-local-state': {'key-value': []}}
+
+            def suggested_params(self):
+                return transaction.SuggestedParams(fee=1000, first=1, last=1001, gen='sandnet-v1',
+                                                   gh='SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=', flat_fee=True)
+
+            def send_transaction(self, signed):
+                sent.append(signed)
+                return signed.get_txid()
+
+        with mock.patch.object(algorand_smart_contract, '_get_algod_client', return_value=FakeClient()), \
+                mock.patch.object(algorand_smart_contract, '_wait_for_confirmation') as wait:
+            txid = algorand_smart_contract.submit_vote(mnemonic.from_private_key(private_key), 7, 3)
+
+        [signed] = sent
+        self.assertEqual(txid, signed.get_txid())
+        self.assertEqual(signed.transaction.sender, address)
+        self.assertEqual(signed.transaction.app_args, [b'vote', (3).to_bytes(8, 'big')])
+        wait.assert_called_once()
@@ -0,0 +1,63 @@
+import base64
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import algorand_reader, vote_notes
+
+ROOT = 'ab' * 32
+
+
+class VoteNoteTests(SimpleTestCase):
+    def test_vote_round_trip(self):
+        note = vote_notes.encode_vote(7, 42)
+        self.assertTrue(note.startswith(vote_notes.election_prefix(7)))
+        self.assertFalse(note.startswith(vote_notes.election_prefix(70)))
+        self.assertEqual(len(note), 26)
+        self.assertEqual(vote_notes.decode(note), {'election_id': 7, 'candidate_id': 42})
+        # the nonce keeps identical votes from producing identical transactions
+        self.assertNotEqual(note, vote_notes.encode_vote(7, 42))
+
+    def test_anchor_round_trip(self):
+        note = vote_notes.encode_anchor(7, ROOT, {3: 10, 1: 2})
+        self.assertTrue(note.startswith(vote_notes.election_prefix(7)))
+        self.assertEqual(vote_notes.decode(note), {'election_id': 7, 'merkle_root': ROOT, 'counts': {1: 2, 3: 10}})
+
+    def test_notes_without_an_election_round_trip(self):
+        vote = vote_notes.encode_vote(None, 42)
+        self.assertTrue(vote.startswith(vote_notes.election_prefix(None)))
+        self.assertEqual(vote_notes.decode(vote), {'election_id': None, 'candidate_id': 42})
+        anchor = vote_notes.encode_anchor(None, ROOT, {42: 1})
+        self.assertEqual(vote_notes.decode(anchor), {'election_id': None, 'merkle_root': ROOT, 'counts': {42: 1}})
+
+    def test_legacy_json_notes_still_decode(self):
+        vote = json.dumps({'election_id': 7, 'candidate_id': 42, 'nonce': 'abcd'}).encode('utf-8')
+        anchor = json.dumps({'election_id': 7, 'merkle_root': ROOT, 'counts': {'3': 10}}).encode('utf-8')
+        self.assertTrue(vote.startswith(vote_notes.legacy_prefix(7)))
+        self.assertTrue(anchor.startswith(vote_notes.legacy_prefix(7)))
+        self.assertEqual(vote_notes.decode(vote), {'election_id': 7, 'candidate_id': 42})
+        self.assertEqual(vote_notes.decode(anchor), {'election_id': 7, 'merkle_root': ROOT, 'counts': {3: 10}})
+
+    def test_foreign_notes_are_ignored(self):
+        for note in (b'', b'hello', b'CESA', b'CESA\x02' + bytes(20), b'[1, 2]', b'{"other": 1}'):
+            self.assertIsNone(vote_notes.decode(note), note)
+
+
+@override_settings(INDEXER_ADDRESS='http://indexer', INDEXER_TOKEN='t')
+class IndexerCountTests(SimpleTestCase):
+    def test_counts_use_note_prefix_queries_and_pages(self):
+        def tx(note):
+            return {'note': base64.b64encode(note).decode()}
+
+        pages = {
+            (vote_notes.election_prefix(7), None): {'transactions': [tx(vote_notes.encode_vote(7, 1))], 'next-token': 'p2'},
+            (vote_notes.election_prefix(7), 'p2'): {'transactions': [tx(vote_notes.encode_anchor(7, ROOT, {1: 3, 2: 1}))]},
+            (vote_notes.legacy_prefix(7), None): {'transactions': [tx(json.dumps({'election_id': 7, 'candidate_id': 2}).encode())]},
+        }
+        client = mock.Mock()
+        client.search_transactions.side_effect = lambda limit, next_page, note_prefix: pages.get((note_prefix, next_page), {})
+
+        with mock.patch.object(algorand_reader.algod_clients, 'get_indexer_client', return_value=client):
+            self.assertEqual(algorand_reader.get_counts_from_indexer(7), {1: 4, 2: 2})
+        self.assertEqual(client.search_transactions.call_count, 3)
@@ -0,0 +1,220 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Candidate, Election, Vote, Voter, VoteOutbox, OnChainRecord
+from .. import algorand_integration, confirmation, outbox, vote_notes
+from .test_results_cache import RESULTS_CACHES
+
+
+User = get_user_model()
+
+
+@override_settings(CACHES=RESULTS_CACHES, VOTE_OUTBOX_MAX_ATTEMPTS=2, VOTE_OUTBOX_BACKOFF_BASE=2, VOTE_BATCH_SIZE=1)
+class VoteOutboxTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='outbox', password='pass')
+        voter = Voter.objects.create(user=user, control_number='OUT1')
+        now = timezone.now()
+        self.election = Election.objects.create(name='Outbox', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.candidate = Candidate.objects.create(name='Bob', election=self.election)
+        vote = Vote.objects.create(voter=voter, candidate=self.candidate, election=self.election)
+        self.entry = outbox.enqueue_vote(vote)
+
+    def test_failed_submission_is_retried_with_backoff(self):
+        with mock.patch('votaciones.algorand_integration.send_vote_tx', side_effect=RuntimeError('algod down')):
+            summary = outbox.process_due_entries()
+        self.assertEqual(summary['failed'], 1)
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.status, VoteOutbox.STATUS_PENDING)
+        self.assertEqual(self.entry.attempts, 1)
+        self.assertIn('algod down', self.entry.last_error)
+        self.assertGreater(self.entry.next_attempt_at, timezone.now())
+
+        # not due yet: nothing is claimed
+        self.assertEqual(outbox.process_due_entries()['processed'], 0)
+
+        # last attempt fails permanently
+        VoteOutbox.objects.filter(pk=self.entry.pk).update(next_attempt_at=timezone.now())
+        with mock.patch('votaciones.algorand_integration.send_vote_tx', side_effect=RuntimeError('algod down')):
+            outbox.process_due_entries()
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.status, VoteOutbox.STATUS_FAILED)
+        self.assertFalse(OnChainRecord.objects.exists())
+
+    def test_confirmed_submission_anonymizes_entry(self):
+        with mock.patch('votaciones.algorand_integration.send_vote_tx', return_value='TXID1'):
+            outbox.process_due_entries()
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.status, VoteOutbox.STATUS_CONFIRMED)
+        self.assertEqual(self.entry.txid, 'TXID1')
+        self.assertIsNone(self.entry.candidate)
+        self.assertTrue(OnChainRecord.objects.filter(txid='TXID1', candidate=self.candidate).exists())
+
+    def test_worker_that_lost_its_lease_records_nothing(self):
+        [entry] = outbox.claim_due_entries()
+        # the lease ran out and another worker claimed the entry
+        VoteOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        [other] = outbox.claim_due_entries()
+
+        self.assertFalse(outbox.mark_confirmed(entry, 'LATE'))
+        outbox.mark_failed_attempt(entry, RuntimeError('late'))
+        self.assertFalse(OnChainRecord.objects.exists())
+        self.assertFalse(outbox.renew_lease([entry]))
+
+        self.assertTrue(outbox.mark_confirmed(other, 'OWNER'))
+        self.assertEqual(list(OnChainRecord.objects.values_list('txid', flat=True)), ['OWNER'])
+        other.refresh_from_db()
+        self.assertEqual((other.attempts, other.last_error), (0, ''))
+
+    def test_vote_without_an_election_is_sent(self):
+        # candidates created without an election are still votable; their note carries no election
+        candidate = Candidate.objects.create(name='Sin elección')
+        voter = Voter.objects.create(user=User.objects.create_user(username='noelection'), control_number='OUT2')
+        entry = outbox.enqueue_vote(Vote.objects.create(voter=voter, candidate=candidate))
+        VoteOutbox.objects.exclude(pk=entry.pk).delete()
+        self.assertEqual(outbox.process_due_entries()['confirmed'], 1)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, VoteOutbox.STATUS_CONFIRMED)
+
+
+@override_settings(CACHES=RESULTS_CACHES)
+class VoteGroupTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.election = Election.objects.create(name='Group', start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.candidates = [Candidate.objects.create(name=f'C{i}', election=self.election) for i in range(3)]
+        self.entries = []
+        for i in range(5):
+            user = User.objects.create_user(username=f'group{i}', password='pass')
+            voter = Voter.objects.create(user=user, control_number=f'GRP{i}')
+            vote = Vote.objects.create(voter=voter, candidate=self.candidates[i % 3], election=self.election)
+            self.entries.append(outbox.enqueue_vote(vote))
+
+    def test_group_txids_map_back_to_each_vote(self):
+        from algosdk import account, transaction
+
+        private_key, address = account.generate_account()
+        sent = {}
+
+        class FakeClient:
+            def suggested_params(self):
+                return transaction.SuggestedParams(fee=1000, first=1, last=1001, gen='sandnet-v1',
+                                                   gh='SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=', flat_fee=True)
+
+            def send_transactions(self, signed):
+                for stx in signed:
+                    sent[stx.get_txid()] = vote_notes.decode(stx.transaction.note)
+                return signed[0].get_txid()
+
+            def status(self):
+                return {'last-round': 1}
+
+            def status_after_block(self, round_num):
+                return {'last-round': round_num + 1}
+
+            def pending_transaction_info(self, txid):
+                return {'confirmed-round': 2}
+
+            def account_info(self, address):
+                return {'amount': 10_000_000}
+
+        ctx = algorand_integration.SignerContext(FakeClient(), [(address, private_key)])
+        with mock.patch.object(algorand_integration, 'get_signer_context', return_value=ctx):
+            summary = outbox.process_due_entries(group_size=16)
+
+        self.assertEqual(summary['confirmed'], 5)
+        self.assertEqual(len(sent), 5)
+        for i, entry in enumerate(self.entries):
+            entry.refresh_from_db()
+            self.assertEqual(entry.status, VoteOutbox.STATUS_CONFIRMED)
+            self.assertEqual(sent[entry.txid]['candidate_id'], self.candidates[i % 3].id)
+            self.assertTrue(OnChainRecord.objects.filter(txid=entry.txid, candidate=self.candidates[i % 3]).exists())
+
+    def test_pass_sends_every_group_before_waiting(self):
+        from algosdk import account, transaction
+
+        private_key, address = account.generate_account()
+        events = []
+
+        class FakeClient:
+            def suggested_params(self):
+                return transaction.SuggestedParams(fee=1000, first=1, last=1001, gen='sandnet-v1',
+                                                   gh='SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=', flat_fee=True)
+
+            def send_transaction(self, signed):
+                events.append('send')
+
+            def send_transactions(self, signed):
+                events.append('send')
+
+            def account_info(self, address):
+                return {'amount': 10_000_000}
+
+        ctx = algorand_integration.SignerContext(FakeClient(), [(address, private_key)])
+        with mock.patch.object(algorand_integration, 'get_signer_context', return_value=ctx), \
+                mock.patch.object(confirmation, 'wait_for_confirmations',
+                                  side_effect=lambda client, txids: events.append(('wait', len(txids))) or {}):
+            summary = outbox.process_due_entries(group_size=2)
+
+        self.assertEqual(summary['confirmed'], 5)
+        # one wait for the whole pass, on one txid per group
+        self.assertEqual(events, ['send'] * 3 + [('wait', 3)])
+
+    def test_unconfirmed_group_is_resent_not_rebuilt(self):
+        from algosdk import account, transaction
+
+        private_key, address = account.generate_account()
+        broadcasts, resent = [], []
+
+        class FakeClient:
+            def suggested_params(self):
+                return transaction.SuggestedParams(fee=1000, first=1, last=1001, gen='sandnet-v1',
+                                                   gh='SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=', flat_fee=True)
+
+            def send_transactions(self, signed):
+                broadcasts.append([stx.get_txid() for stx in signed])
+
+            def send_raw_transaction(self, signed_txns):
+                resent.append(signed_txns)
+
+            def account_info(self, address):
+                return {'amount': 10_000_000}
+
+        ctx = algorand_integration.SignerContext(FakeClient(), [(address, private_key)])
+        with mock.patch.object(algorand_integration, 'get_signer_context', return_value=ctx):
+            # broadcast, but the confirmation wait times out: the outcome is unknown
+            with mock.patch.object(confirmation, 'wait_for_confirmations',
+                                   side_effect=lambda client, txids: {txid: TimeoutError('slow') for txid in txids}):
+                self.assertEqual(outbox.process_due_entries(group_size=16)['failed'], 5)
+            pending = {e.pk: e for e in VoteOutbox.objects.all()}
+            self.assertEqual(len({e.send_id for e in pending.values()}), 1)
+            self.assertEqual({e.txid for e in pending.values()}, set(broadcasts[0]))
+
+            VoteOutbox.objects.update(next_attempt_at=timezone.now())
+            with mock.patch.object(confirmation, 'wait_for_confirmations', return_value={}) as wait:
+                self.assertEqual(outbox.process_due_entries(group_size=16)['confirmed'], 5)
+
+        # the same signed group went out again; nothing new was signed
+        self.assertEqual(len(broadcasts), 1)
+        self.assertEqual(resent, [pending[self.entries[0].pk].signed_txns])
+        self.assertEqual(sorted(wait.call_args.args[1]), sorted(broadcasts[0]))
+        for entry in VoteOutbox.objects.all():
+            self.assertEqual((entry.status, entry.txid, entry.signed_txns), (VoteOutbox.STATUS_CONFIRMED, pending[entry.pk].txid, ''))
+        self.assertEqual(OnChainRecord.objects.count(), 5)
+
+    def test_expired_send_is_signed_again(self):
+        VoteOutbox.objects.update(send_id='6f1e3d1c-0d6b-4f73-9a57-1a2e3b4c5d6e', txid='OLD', signed_txns='c2lnbmVk')
+        with mock.patch.object(algorand_integration, 'resend_signed', return_value=algorand_integration.EXPIRED), \
+                mock.patch.object(algorand_integration, 'send_vote_group', return_value=[f'NEW{i}' for i in range(5)]):
+            self.assertEqual(outbox.process_due_entries(group_size=16)['confirmed'], 5)
+        self.assertEqual(sorted(VoteOutbox.objects.values_list('txid', flat=True)), [f'NEW{i}' for i in range(5)])
+
+    def test_failed_group_retries_every_entry(self):
+        with mock.patch.object(algorand_integration, 'send_vote_group', side_effect=RuntimeError('pool full')):
+            summary = outbox.process_due_entries(group_size=16)
+        self.assertEqual(summary['failed'], 5)
+        self.assertEqual(VoteOutbox.objects.filter(attempts=1, status=VoteOutbox.STATUS_PENDING).count(), 5)
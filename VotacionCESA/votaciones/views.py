@@ -1,15 +1,26 @@
 from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponse
 import logging
+import base64
 import io
-from datetime import datetime
+import json
+import uuid
+from datetime import datetime, timedelta
 
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_GET
 from django.shortcuts import get_object_or_404
-from .models import Candidate, Voter, Vote, CandidateMember, Election, OnChainRecord, PDFReport
-from . import algorand_reader
-from django.db.models import Q
+from .models import Candidate, CandidateTally, Voter, Vote, CandidateMember, Election, ElectionTally, OnChainRecord, PDFReport, VoteOutbox, MerkleBatch
+from . import merkle
+from . import metrics
+from . import admission
+from . import final_results
+from . import idempotency
+from . import outbox
+from . import reference_data
+from . import results_cache
+from . import tallies
+from django.db.models import F, Q, Sum
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import user_passes_test
 from django.urls import reverse_lazy
@@ -17,12 +28,14 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from .forms import FrontendUserCreationForm, VoterForm, CandidateForm
 from django.urls import reverse
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.conf import settings
 from django.core.files.storage import default_storage
+from django.utils.dateparse import parse_datetime
 from django.utils.text import slugify
 import os
 from django.forms import inlineformset_factory
+from django.views.generic import TemplateView
 from .models import CandidateMember
 
 # PDF generation imports
@@ -37,40 +50,53 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 @require_GET
 def api_candidates(request):
     # optional: filter by election_id query param
-    election_id = request.GET.get('election_id')
-    qs = Candidate.objects.all().order_by('-votes_count')
+    election_id = _election_param(request)
+    if election_id is False:
+        return JsonResponse({'error': 'invalid election_id'}, status=400)
+    return results_cache.json_response(request, 'candidates', str(election_id), results_cache.scopes_for(election_id),
+                                       lambda: _candidates_payload(election_id))
+
+
+def _election_param(request):
+    """The `election_id` query parameter as an int, None when absent, False when invalid."""
+    value = request.GET.get('election_id')
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return False
+
+
+def _candidates_payload(election_id):
+    # closed elections are served from their frozen final results
+    final = final_results.for_election(election_id) if election_id else None
+    if final is not None:
+        return {'candidates': final.candidates}
+    return _live_candidates_payload(election_id)
+
+
+def _live_candidates_payload(election_id):
+    # candidates and members come from the in-process reference cache, so the only
+    # query is the one for the tallies, whatever the number of candidates
     if election_id:
         # include candidates explicitly assigned to the election
         # and also candidates without an election (fallback for admin-created candidates)
-        qs = qs.filter(Q(election_id=election_id) | Q(election__isnull=True))
+        candidates = reference_data.candidates(election_id, include_unassigned=True)
     else:
         # try to use the active election if present
-        from django.utils import timezone
-        now = timezone.now()
-        active = Election.objects.filter(start_date__lte=now, end_date__gte=now).first()
-        if active:
-            qs = qs.filter(election=active)
-    data = [
-        {
-            'id': c.id,
-            'name': c.name,
-            'list_name': c.list_name,
-            'image_url': (c.image_url.url if getattr(c, 'image_url') and hasattr(c.image_url, 'url') else ''),
-            'manifesto': c.manifesto,
-            # Prefer indexer-derived counts when available, otherwise prefer local on-chain mirror,
-            # and finally fall back to DB count.
-            'votes_count': (algorand_reader.get_counts_for_election(c.election) or {}).get(c.id)
-                           or OnChainRecord.objects.filter(candidate=c).count()
-                           or c.votes_count,
-            'members': [
-                {
-                    'full_name': m.full_name,
-                    'role': m.role,
-                } for m in c.members.all()
-            ],
-        } for c in qs
-    ]
-    return JsonResponse({'candidates': data})
+        active = reference_data.active_election()
+        candidates = reference_data.candidates(active.id if active else None)
+    return _ranked_candidates_payload(candidates, dict(_candidate_votes(candidates)))
+
+
+def _candidate_votes(candidates):
+    return CandidateTally.objects.filter(candidate_id__in=[c.id for c in candidates]).values_list('candidate_id', 'votes')
+
+
+def _ranked_candidates_payload(candidates, votes):
+    ranked = sorted(candidates, key=lambda c: (-votes.get(c.id, 0), c.id))
+    return {'candidates': [c.data(votes.get(c.id, 0)) for c in ranked]}
 
 
 def csrf_failure(request, reason=""):
@@ -108,6 +134,8 @@ def csrf_failure(request, reason=""):
 
 
 @require_POST
+@admission.admit
+@idempotency.idempotent
 def api_vote(request):
     logger = logging.getLogger(__name__)
     if not request.user.is_authenticated:
@@ -119,14 +147,13 @@ def api_vote(request):
         logger.warning('api_vote: candidate_id missing in POST data')
         return JsonResponse({'error': 'candidate_id required'}, status=400)
 
-    candidate = get_object_or_404(Candidate, pk=candidate_id)
+    # one query: the candidate, its election and both of their tallies
+    candidate = get_object_or_404(Candidate.objects.select_related('election__tally', 'tally'), pk=candidate_id)
     # determine election (either provided or from candidate)
     election_id = request.POST.get('election_id')
-    election = None
-    if election_id:
+    election = candidate.election
+    if election_id and str(election_id) != str(candidate.election_id):
         election = get_object_or_404(Election, pk=election_id)
-    else:
-        election = candidate.election
     # Ensure the logged user has a Voter profile
     try:
         voter = request.user.voter
@@ -141,124 +168,401 @@ def api_vote(request):
         logger.info('api_vote: election not active for election %s', getattr(election, 'id', None))
         return JsonResponse({'error': 'election not active'}, status=400)
 
-    # Check if voter already voted in this election
-    if Vote.objects.filter(voter=voter, election=election).exists():
+    try:
+        entry = _record_vote(voter, candidate, election)
+    except IntegrityError:
         logger.info('api_vote: user %s already voted in election %s', getattr(request.user, 'username', None), getattr(election, 'id', None))
         return JsonResponse({'error': 'user already voted in this election'}, status=400)
 
-    vote = Vote.objects.create(voter=voter, candidate=candidate, election=election)
-    # attempt to register the vote on-chain (this function will mark vote.valid and
-    # populate vote.hash_block on success)
-    txid = None
+    return JsonResponse(_vote_accepted_data(entry, candidate, election), status=202)
+
+
+@require_POST
+@admission.admit
+@idempotency.idempotent
+def api_ballot(request):
+    """Cast votes in several elections at once: one `candidate_id` per election.
+
+    All selections are validated and recorded in one transaction (all or
+    nothing), and the worker submits them together as one atomic group.
+    """
+    from .algorand_integration import MAX_GROUP_SIZE
+    from django.utils import timezone
+
+    logger = logging.getLogger(__name__)
+    if not request.user.is_authenticated:
+        logger.warning('api_ballot: unauthenticated request')
+        return JsonResponse({'error': 'authentication required'}, status=403)
+
     try:
-        txid = vote.register_on_blockchain()
-    except Exception:
-        txid = None
+        candidate_ids = [int(c) for c in request.POST.getlist('candidate_id')]
+    except ValueError:
+        return JsonResponse({'error': 'invalid candidate_id'}, status=400)
+    if not candidate_ids:
+        return JsonResponse({'error': 'candidate_id required'}, status=400)
+    if len(candidate_ids) > MAX_GROUP_SIZE:
+        return JsonResponse({'error': f'at most {MAX_GROUP_SIZE} selections per ballot'}, status=400)
+    if len(set(candidate_ids)) != len(candidate_ids):
+        return JsonResponse({'error': 'duplicate candidate_id'}, status=400)
 
-    # update counts locally (DB counts are a fallback; authoritative counts should come
-    # from the blockchain reader in a full implementation)
     try:
-        candidate.votes_count = Vote.objects.filter(candidate=candidate).count()
-        candidate.save()
+        voter = request.user.voter
     except Exception:
-        pass
+        logger.warning('api_ballot: user %s not registered as voter', getattr(request.user, 'username', None))
+        return JsonResponse({'error': 'user not registered as voter'}, status=400)
+
+    # one query for every selection, with their elections and tallies
+    candidates = Candidate.objects.select_related('election__tally', 'tally').in_bulk(candidate_ids)
+    now = timezone.now()
+    selections, elections = [], set()
+    for candidate_id in candidate_ids:
+        candidate = candidates.get(candidate_id)
+        if candidate is None:
+            return JsonResponse({'error': f'candidate {candidate_id} not found'}, status=404)
+        election = candidate.election
+        if election is None:
+            return JsonResponse({'error': f'candidate {candidate_id} is not part of an election'}, status=400)
+        if election.id in elections:
+            return JsonResponse({'error': f'more than one selection for election {election.id}'}, status=400)
+        if not (election.start_date <= now <= election.end_date):
+            return JsonResponse({'error': f'election {election.id} not active'}, status=400)
+        elections.add(election.id)
+        selections.append((candidate, election))
 
-    # mark voter as having voted (simple flag)
     try:
-        voter.has_voted = True
-        voter.save(update_fields=['has_voted'])
-    except Exception:
-        pass
+        ballot_id, entries = _record_ballot(voter, selections)
+    except IntegrityError:
+        logger.info('api_ballot: user %s already voted in one of elections %s',
+                    getattr(request.user, 'username', None), sorted(elections))
+        return JsonResponse({'error': 'user already voted in one of these elections'}, status=400)
+
+    return JsonResponse({
+        'status': 'accepted',
+        'ballot_id': str(ballot_id),
+        'votes': [dict(_vote_accepted_data(entry, candidate, election), election_id=election.id)
+                  for entry, (candidate, election) in zip(entries, selections)],
+    }, status=202)
+
+
+def _record_ballot(voter, selections):
+    """Record a multi-election ballot in one transaction; return (ballot_id, outbox entries)."""
+    from django.utils import timezone
+
+    ballot_id = uuid.uuid4()
+    due_at = timezone.now()
+    entries = []
+    with transaction.atomic():
+        for candidate, election in selections:
+            vote = Vote.objects.create(voter=voter, candidate=candidate, election=election)
+            entries.append(outbox.enqueue_vote(vote, ballot_id=ballot_id, due_at=due_at))
+            tallies.record_vote(election.id, candidate.id)
+    return ballot_id, entries
+
+
+def _record_vote(voter, candidate, election):
+    """Record the vote, its outbox entry and the bookkeeping in one short transaction.
 
-    # compute total votes across candidates
-    total_votes = Vote.objects.count()
+    Duplicate votes are rejected by the unique (voter, election) constraint
+    (`IntegrityError`). The on-chain submission is performed by the
+    `process_vote_outbox` worker, so the request never waits on algod.
+    """
+    with transaction.atomic():
+        vote = Vote.objects.create(voter=voter, candidate=candidate, election=election)
+        entry = outbox.enqueue_vote(vote)
+        # candidate and election tallies (two F() updates); one vote per voter and
+        # election, so `total_votes` replaces the former global `Voter.has_voted` flag
+        tallies.record_vote(election.id if election else None, candidate.id)
+    return entry
+
+
+def _vote_accepted_data(entry, candidate, election, status_view='api_vote_status'):
+    return {
+        'status': 'accepted',
+        'vote_id': entry.vote_id,
+        'receipt_id': str(entry.receipt_id),
+        'status_url': reverse(status_view, args=[entry.receipt_id]),
+        'candidate_votes': tallies.candidate_votes(candidate) + 1,
+        'total_votes': (tallies.election_tally(election).total_votes + 1) if election else None,
+        'txid': None,
+    }
+
+
+@require_GET
+def api_vote_status(request, receipt_id):
+    """Report the on-chain status of a vote receipt: pending, confirmed or failed."""
+    entry = get_object_or_404(VoteOutbox.objects.select_related('vote'), receipt_id=receipt_id)
+    return JsonResponse(_vote_status_data(entry))
 
-    resp = {
-        'status': 'ok',
-        'vote_id': vote.id,
-        'candidate_votes': candidate.votes_count,
-        'total_votes': total_votes,
-        'txid': txid,
+
+def _vote_status_data(entry):
+    data = {
+        'receipt_id': str(entry.receipt_id),
+        'status': entry.status,
+        'txid': entry.txid or None,
+        'attempts': entry.attempts,
+        'updated_at': entry.updated_at.isoformat(),
     }
+    if entry.status == VoteOutbox.STATUS_CONFIRMED and entry.vote.hash_block:
+        # Merkle-anchored votes also get their inclusion proof
+        record = (OnChainRecord.objects.select_related('merkle_batch')
+                  .filter(txid=entry.vote.hash_block, merkle_batch__isnull=False).first())
+        if record:
+            data['inclusion_receipt'] = record.inclusion_receipt()
+    return data
+
+
+@csrf_exempt
+@require_POST
+def api_verify_receipt(request):
+    """Verify a Merkle inclusion receipt against the anchored batch root.
+
+    Expects the `inclusion_receipt` as JSON body: `salt`, `election_id`,
+    `candidate_id` and `proof` (`leaf`, if sent, must match). The leaf is always
+    recomputed from the vote data, and the proof is checked against the root
+    stored for the batch of that election that was anchored on chain, never
+    against a root or leaf supplied by the client alone.
+    """
+    try:
+        receipt = json.loads(request.body or b'{}')
+        salt = str(receipt['salt'])
+        election_id = None if receipt['election_id'] is None else int(receipt['election_id'])
+        candidate_id = int(receipt['candidate_id'])
+        proof = receipt.get('proof') or []
+        if not isinstance(proof, list):
+            raise TypeError('proof must be a list')
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'JSON body with salt, election_id, candidate_id and proof required'}, status=400)
 
-    return JsonResponse(resp)
+    leaf = merkle.leaf_hash(election_id, candidate_id, salt)
+    if receipt.get('leaf') is not None and str(receipt['leaf']) != leaf:
+        return JsonResponse({'valid': False, 'error': 'leaf does not match the vote data'})
+
+    try:
+        root = merkle.root_from_proof(leaf, proof)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return JsonResponse({'error': 'malformed proof'}, status=400)
+    batch = MerkleBatch.objects.filter(root=root).first()
+    if batch is None or batch.election_id != election_id:
+        return JsonResponse({'valid': False, 'error': 'no anchored batch matches this proof'})
+    return JsonResponse({
+        'valid': True,
+        'root': batch.root,
+        'anchor_txid': batch.txid,
+        'election_id': batch.election_id,
+        'anchored_at': batch.anchored_at.isoformat(),
+    })
 
 
 @require_GET
 def api_elections(request):
+    return results_cache.json_response(request, 'elections', '', ('meta',), _elections_payload)
+
+
+def _elections_payload(elections=None):
     from django.utils import timezone
     now = timezone.now()
-    qs = Election.objects.all().order_by('-start_date')
-    data = []
-    for e in qs:
-        data.append({
-            'id': e.id,
-            'name': e.name,
-            'start_date': e.start_date.isoformat(),
-            'end_date': e.end_date.isoformat(),
-            'is_active': e.start_date <= now <= e.end_date,
-        })
-    return JsonResponse({'elections': data})
+    elections = sorted(reference_data.elections() if elections is None else elections, key=lambda e: e.start_date, reverse=True)
+    return {'elections': [_election_data(e, now) for e in elections]}
+
+
+def _election_data(e, now):
+    return {
+        'id': e.id,
+        'name': e.name,
+        'start_date': e.start_date.isoformat(),
+        'end_date': e.end_date.isoformat(),
+        'is_active': e.start_date <= now <= e.end_date,
+    }
+
+
+# The bootstrap payload depends on the active election, so every vote and every
+# change to elections, candidates or voters invalidates it.
+BOOTSTRAP_SCOPES = ('all', 'meta')
+
+
+@require_GET
+def api_bootstrap(request):
+    """Everything a public page needs on load: elections, the active election, its candidates and stats."""
+    return results_cache.json_response(request, 'bootstrap', '', BOOTSTRAP_SCOPES, _bootstrap_payload)
+
+
+def _bootstrap_payload(election_id=None):
+    elections = _elections_payload()['elections']
+    if election_id is not None:
+        active = next((e for e in elections if e['id'] == election_id), None)
+    else:
+        # same choice as the pages made client-side: the active election, else the latest one
+        active = next((e for e in elections if e['is_active']), elections[0] if elections else None)
+    election_id = active['id'] if active else None
+    return {
+        'elections': elections,
+        'active_election': active,
+        'candidates': _candidates_payload(election_id)['candidates'],
+        'stats': _stats_payload(election_id),
+    }
+
+
+class PublicPageView(TemplateView):
+    """A public page rendered with the bootstrap payload in its context.
+
+    Templates embed it with ``{{ bootstrap|json_script:"bootstrap-data" }}`` and
+    render their first paint from it, so no API round-trip is needed on load.
+    """
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['bootstrap'] = results_cache.get_or_build('bootstrap', '', BOOTSTRAP_SCOPES, _bootstrap_payload)
+        return context
 
 
 @require_GET
 def api_stats(request):
     """Return simple statistics: total_votes, eligible_voters, participation (%) for an election (optional)."""
-    election_id = request.GET.get('election_id')
+    election_id = _election_param(request)
+    if election_id is False:
+        return JsonResponse({'error': 'invalid election_id'}, status=400)
+    return results_cache.json_response(request, 'stats', str(election_id), results_cache.scopes_for(election_id),
+                                       lambda: _stats_payload(election_id))
+
+
+def _stats_payload(election_id):
     from django.utils import timezone
     now = timezone.now()
+    final = final_results.for_election(election_id) if election_id else None
+    if final is not None:
+        return _stats_data(final.total_votes, final.eligible_voters)
     # eligible voters
     eligible = Voter.objects.filter(is_eligible=True).count()
     if election_id:
-        # prefer indexer counts
-        idx_counts = None
-        try:
-            # attempt to use indexer counts for this election
-            idx_counts = algorand_reader.get_counts_from_indexer(int(election_id))
-        except Exception:
-            idx_counts = None
-
-        if idx_counts is not None:
-            total_votes = sum(idx_counts.values())
-        else:
-            total_votes = OnChainRecord.objects.filter(election_id=election_id).count() or Vote.objects.filter(election_id=election_id).count()
+        total_votes = ElectionTally.objects.filter(election_id=election_id).values_list('total_votes', flat=True).first() or 0
     else:
-        # if no election specified, count all votes
-        active = Election.objects.filter(start_date__lte=now, end_date__gte=now).first()
+        # if no election specified, use the active one, or all elections
+        active = reference_data.active_election(now)
         if active:
-            idx_counts = algorand_reader.get_counts_for_election(active)
-            if idx_counts is not None:
-                total_votes = sum(idx_counts.values())
-            else:
-                total_votes = OnChainRecord.objects.filter(election=active).count() or Vote.objects.filter(election=active).count()
+            total_votes = ElectionTally.objects.filter(election_id=active.id).values_list('total_votes', flat=True).first() or 0
         else:
-            total_votes = OnChainRecord.objects.count() or Vote.objects.count()
+            total_votes = ElectionTally.objects.aggregate(total=Sum('total_votes'))['total'] or 0
+    return _stats_data(total_votes, eligible)
 
+
+def _stats_data(total_votes, eligible):
     participation = 0.0
     if eligible:
         participation = round((total_votes / eligible) * 100, 1)
-
-    return JsonResponse({'total_votes': total_votes, 'eligible_voters': eligible, 'participation': participation})
+    return {'total_votes': total_votes, 'eligible_voters': eligible, 'participation': participation}
 
 
 @require_GET
 def api_blockchain_records(request):
-    """Return recent on-chain records created by the application.
+    """Return on-chain records created by the application, one page at a time.
+
+    This endpoint is used by the frontend `blockchain.html` explorer. Pages are
+    keyset-paginated on (`timestamp`, `id`), so every page costs one indexed
+    range scan however deep it is:
 
-    This endpoint is used by the frontend `blockchain.html` explorer to show
-    recent transactions recorded via OnChainRecord.
+     - no cursor: the newest `limit` records, newest first;
+     - `cursor=<next_cursor>`: the page of older records after that one;
+     - `since=<since>`: the records added since that response, oldest first, so
+       a client that already has the list fetches just what was added. A record
+       is stamped when it is inserted but only shows once its transaction
+       commits, so the delta starts `BLOCKCHAIN_RECORDS_SINCE_OVERLAP` seconds
+       before `since`. Clients drop the records they already have (by `txid`).
+       While `has_more`, `since` plus `cursor=<next_cursor>` fetches the rest.
+
+    `election_id` restricts the records to one election.
     """
-    qs = OnChainRecord.objects.select_related('candidate', 'election').order_by('-timestamp')[:200]
-    data = []
-    for r in qs:
-        data.append({
-            'txid': r.txid,
-            'candidate': str(r.candidate) if r.candidate else None,
-            'election': str(r.election) if r.election else None,
-            'timestamp': r.timestamp.isoformat(),
-            'status': 'verified',
-        })
-    return JsonResponse({'records': data})
+    try:
+        qs, limit, since = _records_query(request)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(_records_payload(list(qs), limit, since))
+
+
+def _encode_cursor(record):
+    raw = f'{record.timestamp.isoformat()}|{record.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(value):
+    """(timestamp, id) of a cursor from `_encode_cursor`; ValueError when it is not one."""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+        stamp, pk = raw.rsplit('|', 1)
+        timestamp = parse_datetime(stamp)
+        pk = int(pk)
+    except ValueError:  # also binascii.Error and UnicodeDecodeError
+        timestamp = None
+    if timestamp is None:
+        raise ValueError('invalid cursor')
+    return timestamp, pk
+
+
+def _records_query(request):
+    """The (sliced) queryset, page size and `since` cursor of an `api_blockchain_records` request."""
+    election_id = _election_param(request)
+    if election_id is False:
+        raise ValueError('invalid election_id')
+    try:
+        limit = int(request.GET.get('limit') or getattr(settings, 'BLOCKCHAIN_RECORDS_PAGE_SIZE', 200))
+    except ValueError:
+        raise ValueError('invalid limit')
+    limit = max(1, min(limit, int(getattr(settings, 'BLOCKCHAIN_RECORDS_MAX_PAGE_SIZE', 1000))))
+    since = request.GET.get('since')
+    return _records_queryset(election_id, limit, request.GET.get('cursor'), since), limit, since
+
+
+def _records_queryset(election_id, limit, cursor=None, since=None):
+    """One page of records (plus one row to detect the next page); ValueError on a bad cursor."""
+    qs = OnChainRecord.objects.select_related('candidate', 'election', 'merkle_batch')
+    if election_id:
+        qs = qs.filter(election_id=election_id)
+    # `timestamp__gte/lte` keeps the condition an index range; the Q breaks timestamp ties by id
+    if since:
+        timestamp, pk = _decode_cursor(since)
+        if cursor:
+            # the next page of the same delta
+            timestamp, pk = _decode_cursor(cursor)
+        else:
+            # re-send the overlap window, for records that committed after a newer one
+            timestamp -= timedelta(seconds=float(getattr(settings, 'BLOCKCHAIN_RECORDS_SINCE_OVERLAP', 5)))
+        qs = qs.filter(timestamp__gte=timestamp).filter(Q(timestamp__gt=timestamp) | Q(pk__gt=pk)).order_by('timestamp', 'id')
+    else:
+        qs = qs.order_by('-timestamp', '-id')
+        if cursor:
+            timestamp, pk = _decode_cursor(cursor)
+            qs = qs.filter(timestamp__lte=timestamp).filter(Q(timestamp__lt=timestamp) | Q(pk__lt=pk))
+    # one extra row tells whether another page follows
+    return qs[:limit + 1]
+
+
+def _records_payload(records, limit, since):
+    has_more = len(records) > limit
+    records = records[:limit]
+    if since:
+        # the overlap may end before `since`: never move the client's cursor back
+        newest = records[-1] if records and (records[-1].timestamp, records[-1].pk) > _decode_cursor(since) else None
+        next_cursor = _encode_cursor(records[-1]) if has_more else None
+    else:
+        newest = records[0] if records else None
+        next_cursor = _encode_cursor(records[-1]) if has_more else None
+    return {
+        'records': [_record_data(r) for r in records],
+        'next_cursor': next_cursor,
+        'since': _encode_cursor(newest) if newest else since,
+        'has_more': has_more,
+    }
+
+
+def _record_data(r):
+    return {
+        'txid': r.txid,
+        'candidate': str(r.candidate) if r.candidate else None,
+        'election': str(r.election) if r.election else None,
+        'timestamp': r.timestamp.isoformat(),
+        'status': 'verified',
+        # Merkle-anchored records: `txid` is the leaf hash, the chain tx is the batch's
+        'anchor_txid': r.merkle_batch.txid if r.merkle_batch else None,
+    }
 
 
 # --- Admin frontend forms (staff-only) -------------------------------------------------
@@ -267,6 +571,13 @@ def staff_required(view_func):
     return user_passes_test(lambda u: u.is_active and u.is_staff, login_url=reverse_lazy('login'))(view_func)
 
 
+@staff_required
+@require_GET
+def api_metrics(request):
+    """Return the in-process metrics of the worker serving this request (staff only)."""
+    return JsonResponse(metrics.snapshot())
+
+
 @staff_required
 def create_user_view(request):
     if request.method == 'POST':
@@ -371,10 +682,9 @@ def generate_election_pdf(request, election_id=None):
         election = get_object_or_404(Election, pk=election_id)
     else:
         # Usar la elección activa o la más reciente
-        now = timezone.now()
-        election = Election.objects.filter(start_date__lte=now, end_date__gte=now).first()
-        if not election:
-            election = Election.objects.order_by('-end_date').first()
+        elections = reference_data.elections()
+        ref = reference_data.active_election() or max(elections, key=lambda e: e.end_date, default=None)
+        election = Election.objects.filter(pk=ref.id).first() if ref else None
     
     if not election:
         return HttpResponse('No hay elecciones disponibles.', status=404)
@@ -477,18 +787,30 @@ def generate_election_pdf(request, election_id=None):
     # === ESTADÍSTICAS DE PARTICIPACIÓN ===
     elements.append(Paragraph("ESTADÍSTICAS DE PARTICIPACIÓN", subtitle_style))
     
-    eligible_voters = Voter.objects.filter(is_eligible=True).count()
-    total_votes = OnChainRecord.objects.filter(election=election).count() or Vote.objects.filter(election=election).count()
+    # una elección cerrada se reporta desde sus resultados finales congelados
+    final = final_results.for_election(election.id)
+    if final is not None:
+        eligible_voters = final.eligible_voters
+        total_votes = final.total_votes
+    else:
+        eligible_voters = Voter.objects.filter(is_eligible=True).count()
+        election_tally = tallies.election_tally(election)
+        total_votes = election_tally.total_votes
     participation = round((total_votes / eligible_voters) * 100, 2) if eligible_voters > 0 else 0
-    voters_who_voted = Voter.objects.filter(has_voted=True).count()
     
     stats_data = [
         ['Métrica', 'Valor'],
         ['Votantes Elegibles', str(eligible_voters)],
         ['Total de Votos Registrados', str(total_votes)],
-        ['Votantes que han Votado', str(voters_who_voted)],
+        ['Votantes que han Votado', str(total_votes)],
         ['Participación', f'{participation}%'],
     ]
+    if final is not None:
+        stats_data += [
+            ['Registros en Blockchain', str(final.record_count)],
+            ['Huella de Registros (SHA-256)', Paragraph(final.records_digest, ParagraphStyle('Digest', parent=styles['Normal'], fontSize=7))],
+            ['Resultados Congelados', final.frozen_at.strftime('%d/%m/%Y %H:%M')],
+        ]
     
     stats_table = Table(stats_data, colWidths=[250, 200])
     stats_table.setStyle(TableStyle([
@@ -514,7 +836,11 @@ def generate_election_pdf(request, election_id=None):
     # === RESULTADOS POR CANDIDATO ===
     elements.append(Paragraph("RESULTADOS POR CANDIDATO/PLANILLA", subtitle_style))
     
-    candidates = Candidate.objects.filter(election=election).order_by('-votes_count')
+    if final is not None:
+        results_rows = [(c['list_name'], c['name'], c['votes_count']) for c in final.candidates]
+    else:
+        candidates = Candidate.objects.filter(election=election).select_related('tally').order_by(F('tally__votes').desc(nulls_last=True), 'id')
+        results_rows = [(c.list_name, c.name, tallies.candidate_votes(c)) for c in candidates]
     
     # Estilo para las celdas con texto largo
     cell_style = ParagraphStyle(
@@ -524,7 +850,7 @@ def generate_election_pdf(request, election_id=None):
         leading=11,
     )
     
-    if candidates.exists():
+    if results_rows:
         # Usar Paragraph para permitir saltos de línea automáticos
         results_data = [[
             Paragraph('<b>#</b>', cell_style),
@@ -534,15 +860,13 @@ def generate_election_pdf(request, election_id=None):
             Paragraph('<b>% del Total</b>', cell_style)
         ]]
         
-        for idx, candidate in enumerate(candidates, 1):
-            # Obtener conteo de votos (preferir blockchain)
-            vote_count = OnChainRecord.objects.filter(candidate=candidate).count() or candidate.votes_count
+        for idx, (list_name, name, vote_count) in enumerate(results_rows, 1):
             percentage = round((vote_count / total_votes) * 100, 2) if total_votes > 0 else 0
             
             results_data.append([
                 Paragraph(str(idx), cell_style),
-                Paragraph(candidate.list_name or 'N/A', cell_style),
-                Paragraph(candidate.name, cell_style),
+                Paragraph(list_name or 'N/A', cell_style),
+                Paragraph(name, cell_style),
                 Paragraph(str(vote_count), cell_style),
                 Paragraph(f'{percentage}%', cell_style)
             ])
@@ -578,7 +902,7 @@ def generate_election_pdf(request, election_id=None):
     # === REGISTROS EN BLOCKCHAIN ===
     elements.append(Paragraph("REGISTROS EN BLOCKCHAIN (Últimos 20)", subtitle_style))
     
-    onchain_records = OnChainRecord.objects.filter(election=election).order_by('-timestamp')[:20]
+    onchain_records = OnChainRecord.objects.filter(election=election).select_related('candidate').order_by('-timestamp')[:20]
     
     # Estilo para celdas de blockchain
     blockchain_cell_style = ParagraphStyle(
@@ -0,0 +1,105 @@
+"""Binary encoding of the notes written on chain for votes and Merkle anchors.
+
+Layout (big-endian), version 1:
+
+    magic b'CESA' | version u8 | election_id u64 | kind u8 | payload
+
+ - kind 1, vote:   candidate_id u64 | nonce 4 bytes
+ - kind 2, anchor: merkle root 32 bytes | (candidate_id u64, count u32) per candidate
+
+The magic, version and election id come first, so `election_prefix(id)` is a
+fixed prefix shared by every note of one election: the indexer filters on it
+server side (`note-prefix`) and decoding is a fixed-offset unpack. The random
+nonce keeps identical votes sent in the same round (or atomic group) from
+producing identical, and therefore rejected, transactions.
+
+Votes and anchors without an election (candidates created without one) are
+written with election id `NO_ELECTION` (0, never a primary key) and decode
+back to ``election_id: None``.
+
+Notes written before this format are JSON objects starting with
+``{"election_id": <id>,``; `decode` still reads them and `legacy_prefix(id)`
+finds them on the indexer.
+"""
+from typing import Dict, Optional
+import json
+import secrets
+import struct
+
+MAGIC = b'CESA'
+VERSION = 1
+
+KIND_VOTE = 1
+KIND_ANCHOR = 2
+
+# election id written for a vote or anchor that belongs to no election
+NO_ELECTION = 0
+
+_HEADER = struct.Struct('>4sBQB')
+_VOTE = struct.Struct('>Q4s')
+_ROOT_SIZE = 32
+_COUNT = struct.Struct('>QI')
+
+
+def _election_field(election_id: Optional[int]) -> int:
+    return NO_ELECTION if election_id is None else election_id
+
+
+def election_prefix(election_id: Optional[int]) -> bytes:
+    """Note prefix shared by every binary vote and anchor note of `election_id`."""
+    return _HEADER.pack(MAGIC, VERSION, _election_field(election_id), 0)[:-1]
+
+
+def legacy_prefix(election_id: int) -> bytes:
+    """Note prefix of the JSON notes written by earlier versions for `election_id`."""
+    return ('{"election_id": %d,' % election_id).encode('utf-8')
+
+
+def encode_vote(election_id: Optional[int], candidate_id: int) -> bytes:
+    return _HEADER.pack(MAGIC, VERSION, _election_field(election_id), KIND_VOTE) + _VOTE.pack(candidate_id, secrets.token_bytes(4))
+
+
+def encode_anchor(election_id: Optional[int], merkle_root: str, counts: Dict[int, int]) -> bytes:
+    root = bytes.fromhex(merkle_root)
+    if len(root) != _ROOT_SIZE:
+        raise ValueError('merkle root must be a 32-byte hex digest')
+    return (_HEADER.pack(MAGIC, VERSION, _election_field(election_id), KIND_ANCHOR) + root
+            + b''.join(_COUNT.pack(int(cid), int(n)) for cid, n in sorted(counts.items())))
+
+
+def decode(note: bytes) -> Optional[dict]:
+    """Decode a vote or anchor note (binary or legacy JSON); None when it is not ours.
+
+    Votes decode to ``{'election_id', 'candidate_id'}`` and anchors to
+    ``{'election_id', 'merkle_root', 'counts'}`` with int candidate ids.
+    """
+    if note.startswith(MAGIC):
+        return _decode_binary(note)
+    try:
+        data = json.loads(note.decode('utf-8'))
+    except Exception:
+        return None
+    if not isinstance(data, dict) or 'election_id' not in data:
+        return None
+    if 'merkle_root' in data:
+        return {'election_id': data['election_id'], 'merkle_root': data['merkle_root'],
+                'counts': {int(cid): int(n) for cid, n in (data.get('counts') or {}).items()}}
+    return {'election_id': data['election_id'], 'candidate_id': data.get('candidate_id')}
+
+
+def _decode_binary(note: bytes) -> Optional[dict]:
+    if len(note) < _HEADER.size:
+        return None
+    _, version, election_id, kind = _HEADER.unpack_from(note)
+    if version != VERSION:
+        return None
+    body = note[_HEADER.size:]
+    if election_id == NO_ELECTION:
+        election_id = None
+    if kind == KIND_VOTE and len(body) == _VOTE.size:
+        candidate_id, _ = _VOTE.unpack(body)
+        return {'election_id': election_id, 'candidate_id': candidate_id}
+    if kind == KIND_ANCHOR and len(body) >= _ROOT_SIZE and (len(body) - _ROOT_SIZE) % _COUNT.size == 0:
+        counts = dict(_COUNT.iter_unpack(body[_ROOT_SIZE:]))
+        return {'election_id': election_id, 'merkle_root': body[:_ROOT_SIZE].hex(), 'counts': counts}
+    return None